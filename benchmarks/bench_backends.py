@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Measures the cold start and per-deal cost of each ``CardRepo`` backend
+
+Each backend is measured in a fresh process, since the ORM backends bind the
+process-global database.
+
+Run from the repository root with ``python -m benchmarks.bench_backends``
+"""
+
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+DEALS = 50
+
+
+def measure(kind: str, path: str) -> tuple:
+    from realms.cardrepo import CardRepo, JSONBackend, MemoryBackend, SQLiteBackend
+    backends = {'sqlite': lambda: SQLiteBackend(path),
+                'sqlite (generate)': lambda: SQLiteBackend(path),
+                'memory': MemoryBackend,
+                'json': JSONBackend}
+    start = time.perf_counter()
+    repo = CardRepo(backend=backends[kind]())
+    repo.player_deck_cards()
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(DEALS):
+        repo.main_deck_cards()
+    main = (time.perf_counter() - start) / DEALS
+    start = time.perf_counter()
+    for _ in range(DEALS):
+        repo.player_deck_cards()
+    player = (time.perf_counter() - start) / DEALS
+    return cold, main, player
+
+
+def main():
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        generated = os.path.join(tmp, 'cards.sqlite')
+        cases = [('sqlite (generate)', generated), ('sqlite', generated),
+                 ('memory', ''), ('json', '')]
+        print(f"{'backend':<18} {'cold start ms':>14} {'main deck ms':>13} {'player deck ms':>15}")
+        for kind, path in cases:
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                cold, main, player = pool.submit(measure, kind, path).result()
+            print(f"{kind:<18} {cold * 1e3:>14.1f} {main * 1e3:>13.2f} {player * 1e3:>15.3f}")
+
+
+if __name__ == '__main__':
+    main()
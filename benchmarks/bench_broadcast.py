@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Measures the cost of publishing a game's public state to a growing number of
+spectators, against encoding the state separately for each of them
+
+Run from the repository root with ``python -m benchmarks.bench_broadcast``
+"""
+
+import json
+import time
+from benchmarks.bench_payloads import card_dict
+from realms.cardrepo import CardRepo
+from realms.catalog import local_catalog
+from realms.server import GameSession
+
+UPDATES = 200
+
+
+def per_spectator(session: GameSession, spectators: int) -> None:
+    """Builds and encodes the public state separately for each spectator
+    """
+    for _ in range(spectators):
+        state = {'row': [card_dict(c) for c in session.traderow.available],
+                 'players': [{'health': p.health,
+                              'bases': [[c.template_id, c.uuid] for c in p._bases],
+                              'undrawn': len(d._undrawn),
+                              'discards': len(d._discards),
+                              'hand': len(hand)}
+                             for p, d, hand in zip(session.game.players,
+                                                   session.decks, session.hands)]}
+        json.dumps(state, separators=(',', ':')).encode()
+
+
+def main():
+    CardRepo()
+    session = GameSession(local_catalog(), 2)
+    print(f"{'spectators':>10} {'per client us/update':>22} {'shared us/update':>18}"
+          f" {'shared us/spectator':>20}")
+    for spectators in (1, 10, 100, 1000, 10000):
+        subscriptions = [session.spectators.subscribe() for _ in range(spectators)]
+        naive_updates = max(1, UPDATES // spectators)
+        start = time.perf_counter()
+        for _ in range(naive_updates):
+            per_spectator(session, spectators)
+        naive = (time.perf_counter() - start) / naive_updates
+        start = time.perf_counter()
+        for _ in range(UPDATES):
+            session.spectators.publish(session.public_frame())
+        shared = (time.perf_counter() - start) / UPDATES
+        print(f"{spectators:>10} {naive * 1e6:>22.1f} {shared * 1e6:>18.1f}"
+              f" {shared * 1e6 / spectators:>20.3f}")
+        dropped = sum(s.dropped for s in subscriptions)
+        session.spectators.close()
+    print(f"(slow spectators dropped {dropped} stale frames in the last round)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Compares regenerating the card database from scratch with an incremental
+``sync_db`` after editing a few cards
+
+Runs in a fresh process with a temporary database, since the card database is
+bound once per process.
+
+Run from the repository root with ``python -m benchmarks.bench_catalog_sync``
+"""
+
+import copy
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+def measure(path: str) -> list:
+    from realms.cardrepo import CardRepo, SQLiteBackend, _read_cards_json, sync_db
+    results = []
+    start = time.perf_counter()
+    CardRepo(backend=SQLiteBackend(path))
+    results.append(('generate the database', time.perf_counter() - start, None))
+    cards = _read_cards_json()
+    for edits in (0, 1, 5, 20):
+        edited = copy.deepcopy(cards)
+        for card in edited[-edits:] if edits else []:
+            card['cost'] = int(card['cost']) + 1
+        start = time.perf_counter()
+        report = sync_db(edited)
+        results.append((f"sync, {edits} edited", time.perf_counter() - start, report))
+        sync_db(cards)
+    return results
+
+
+def main():
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            results = pool.submit(measure, os.path.join(tmp, 'cards.sqlite')).result()
+    for label, seconds, report in results:
+        changed = f"  ({len(report.updated)} cards rewritten)" if report is not None else ''
+        print(f"{label:<24} {seconds * 1e3:8.2f} ms{changed}")
+
+
+if __name__ == '__main__':
+    main()
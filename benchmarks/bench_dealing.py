@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""Compares dealing the starting decks of an 8-player table one player at a time with
+dealing them in a single call, from the repository and from the catalog
+
+Run from the repository root with ``python -m benchmarks.bench_dealing``
+"""
+
+import time
+from realms.cardrepo import CardRepo
+from realms.catalog import local_catalog
+
+PLAYERS = 8
+TABLES = 200
+
+
+def measure(deal):
+    start = time.perf_counter()
+    for _ in range(TABLES):
+        deal()
+    return (time.perf_counter() - start) / TABLES
+
+
+def main():
+    repo = CardRepo()
+    catalog = local_catalog()
+    for name, cards in (('repo', repo), ('catalog', catalog)):
+        single = measure(lambda: [cards.player_deck_cards() for _ in range(PLAYERS)])
+        batched = measure(lambda: cards.player_deck_cards(PLAYERS))
+        print(f"{name:8} one call per player {single * 1e6:9.1f} us   "
+              f"one call per table {batched * 1e6:9.1f} us")
+
+
+if __name__ == '__main__':
+    main()
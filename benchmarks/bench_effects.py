@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Compares resolving hands by dispatching on every effect with applying the compiled
+effects of each card
+
+Run from the repository root with ``python -m benchmarks.bench_effects``
+"""
+
+import random
+import time
+from realms.cardrepo import CardRepo
+from realms.catalog import local_catalog
+from realms.decks import Hand, PlayerDeck
+from realms.effects import PlayerState
+
+HANDS = 200
+ROUNDS = 100
+
+
+def main():
+    repo = CardRepo()
+    local_catalog()
+    rng = random.Random(0)
+    cards = repo.main_deck_cards()
+    deck = PlayerDeck(repo.player_deck_cards())
+    hands = []
+    for _ in range(HANDS):
+        deck._undrawn = rng.sample(cards, 5)
+        hands.append(Hand(5, [], deck))
+    state = PlayerState()
+    for hand in hands:
+        hand.resolve(state)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for hand in hands:
+            hand.effect_totals()
+    interpreted = (time.perf_counter() - start) / (ROUNDS * HANDS)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for hand in hands:
+            state.reset()
+            hand.resolve(state)
+    compiled = (time.perf_counter() - start) / (ROUNDS * HANDS)
+    print(f"effect records + totals  {interpreted * 1e6:8.2f} us per hand")
+    print(f"compiled effects         {compiled * 1e6:8.2f} us per hand")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Measures the effect totals of every 5-card hand of a deck, computed one hand at a
+time with ``Hand.effect_totals`` and all at once with ``Hand.batch_totals``
+
+Run from the repository root with ``python -m benchmarks.bench_hands``
+"""
+
+import random
+import time
+from itertools import combinations
+from realms.cardrepo import CardRepo
+from realms.catalog import local_catalog
+from realms.decks import Hand
+
+DECK = 20
+ROUNDS = 3
+
+
+def main():
+    CardRepo()
+    catalog = local_catalog()
+    rng = random.Random(0)
+    deck = [catalog.new_card(rng.choice(catalog.templates).id) for _ in range(DECK)]
+    hands = list(combinations(deck, 5))
+    ids = [[c.template_id for c in h] for h in hands]
+    hand = Hand.__new__(Hand)
+    scalar = batch = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        expected = []
+        for cards in hands:
+            hand.cards = list(cards)
+            expected.append(hand.effect_totals())
+        scalar = min(scalar, time.perf_counter() - start)
+        start = time.perf_counter()
+        totals = Hand.batch_totals(ids)
+        batch = min(batch, time.perf_counter() - start)
+    assert [totals[i] for i in range(len(hands))] == expected
+    print(f"{len(hands)} hands of a {DECK}-card deck: "
+          f"scalar {scalar * 1e3:.1f} ms ({scalar / len(hands) * 1e6:.2f} us per hand), "
+          f"batch {batch * 1e3:.1f} ms ({batch / len(hands) * 1e6:.2f} us per hand), "
+          f"{scalar / batch:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
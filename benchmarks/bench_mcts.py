@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""Measures the rollouts per second of the MCTS bot, searching in this process and
+over worker processes, and its results against the default policy
+
+Run from the repository root with ``python -m benchmarks.bench_mcts``
+"""
+
+import time
+from realms.cardrepo import CardRepo
+from realms.catalog import local_catalog
+from realms.game import Game
+from realms.mcts import MCTSPolicy
+
+DECISIONS = 20
+ROLLOUTS = 128
+GAMES = 10
+
+
+def rollout_rate(catalog, workers: int) -> dict:
+    bot = MCTSPolicy(rollouts=ROLLOUTS, workers=workers, seed=0)
+    try:
+        game = Game(catalog, policies=[bot, None])
+        while bot.stats.decisions < DECISIONS and not game.over:
+            game.step()
+    finally:
+        bot.close()
+    return bot.stats.as_dict()
+
+
+def main():
+    CardRepo()
+    catalog = local_catalog()
+    for workers in (0, 2, 4):
+        print(f"workers={workers}: {rollout_rate(catalog, workers)}")
+    wins = 0
+    start = time.perf_counter()
+    for g in range(GAMES):
+        bot = MCTSPolicy(rollouts=ROLLOUTS, seed=g)
+        policies = [bot, None] if g % 2 == 0 else [None, bot]
+        winner = Game(catalog, policies=policies).run(max_turns=400)
+        wins += winner is not None and winner.policy is bot
+    print(f"MCTS ({ROLLOUTS} rollouts per decision) won {wins} of {GAMES} games "
+          f"against TurnPolicy in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Compares encoding card payloads with ``json.dumps`` of dicts against splicing
+UUIDs into the catalog's precomputed JSON fragments, for single responses and for
+a trade row sent to many clients
+
+Run from the repository root with ``python -m benchmarks.bench_payloads``
+"""
+
+import json
+import time
+from realms.cardrepo import CardRepo
+from realms.catalog import local_catalog
+from realms.server import GameSession
+
+ROUNDS = 20000
+WATCHERS = 500
+
+
+def card_dict(card) -> dict:
+    def effects(slot) -> list:
+        return [[e.target.name, e.action.name, e.value] for e in slot]
+
+    return {'template': card.template_id,
+            'name': card.name,
+            'faction': card.faction.value,
+            'base': card.base,
+            'outpost': card.outpost,
+            'defense': card.defense,
+            'cost': card.cost,
+            'effects': {'basic': effects(card.effects_basic),
+                        'ally': effects(card.effects_ally),
+                        'scrap': effects(card.effects_scrap)},
+            'uuid': card.uuid}
+
+
+def timed(label: str, func, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {n / elapsed:12,.0f} /s")
+    return elapsed
+
+
+def main():
+    CardRepo()
+    catalog = local_catalog()
+    session = GameSession(catalog, 2)
+    row = session.traderow.available
+    hand = session.deck(0).draw(5)
+
+    def naive_hand():
+        return json.dumps([card_dict(c) for c in hand], separators=(',', ':'))
+
+    print('hand of 5 cards')
+    naive = timed('  json.dumps of dicts', naive_hand, ROUNDS)
+    fast = timed('  precomputed fragments', lambda: catalog.cards_json(hand), ROUNDS)
+    print(f"  speedup {naive / fast:.1f}x")
+
+    print(f"trade row to {WATCHERS} clients")
+
+    def naive_fan_out():
+        for _ in range(WATCHERS):
+            json.dumps([card_dict(c) for c in row], separators=(',', ':'))
+
+    def shared_fan_out():
+        for _ in range(WATCHERS):
+            session.row_json()
+
+    naive = timed('  json.dumps per client', naive_fan_out, ROUNDS // WATCHERS)
+    fast = timed('  encoded once', shared_fan_out, ROUNDS // WATCHERS)
+    print(f"  speedup {naive / fast:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Compares request latency with no persistence, with write-behind persistence
+and with a synchronous write after every request
+
+Run from the repository root with ``python -m benchmarks.bench_persistence``
+"""
+
+import os
+import tempfile
+import time
+from realms.cardrepo import CardRepo
+from realms.catalog import local_catalog
+from realms.persistence import GameStore
+from realms.server import GameService
+
+GAMES = 200
+TURNS = 10
+
+
+def run(service: GameService, sync: bool = False) -> float:
+    games = [service.handle({'op': 'new_game'})['game'] for _ in range(GAMES)]
+    requests = 0
+    start = time.perf_counter()
+    for turn in range(TURNS):
+        for game in games:
+            player = turn % 2
+            service.handle({'op': 'draw', 'game': game, 'player': player})
+            row = service.handle({'op': 'trade_row', 'game': game})['cards']
+            service.handle({'op': 'acquire', 'game': game, 'player': player,
+                            'uuid': row[-1]['uuid']})
+            service.handle({'op': 'end_turn', 'game': game, 'player': player})
+            requests += 4
+            if sync:
+                service.store.flush()
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    CardRepo()
+    catalog = local_catalog()
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = run(GameService(catalog))
+        behind = GameService(catalog, GameStore(os.path.join(tmp, 'behind.sqlite')))
+        write_behind = run(behind)
+        start = time.perf_counter()
+        behind.close()
+        final_flush = time.perf_counter() - start
+        synchronous = GameService(catalog, GameStore(os.path.join(tmp, 'sync.sqlite'),
+                                                     interval=3600))
+        sync = run(synchronous, sync=True)
+        synchronous.close()
+    print(f"{GAMES} games, {TURNS} turns")
+    print(f"no persistence      {plain * 1e6:8.1f} us/request")
+    print(f"write-behind        {write_behind * 1e6:8.1f} us/request"
+          f"  (final flush {final_flush * 1e3:.1f} ms)")
+    print(f"write every turn    {sync * 1e6:8.1f} us/request")
+
+
+if __name__ == '__main__':
+    main()
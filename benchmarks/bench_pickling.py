@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Compares the payload size and round-trip time of the compact pickling of
+cards and decks against the default pickling of their attributes
+
+Run from the repository root with ``python -m benchmarks.bench_pickling``
+"""
+
+import copyreg
+import io
+import pickle
+import timeit
+from realms.cardrepo import CardRepo
+from realms.cards import Card, CardEffect
+from realms.catalog import local_catalog
+from realms.decks import MainDeck, PlayerDeck, TradeRow, Hand
+
+
+def _restore(cls, state):
+    obj = cls.__new__(cls)
+    obj.__dict__.update(state)
+    return obj
+
+
+def _default_reduce(obj):
+    """Mimics the default pickling of an object, minus any unpicklable repository"""
+    state = {k: v for k, v in obj.__dict__.items() if k != '_repo'}
+    return _restore, (type(obj), state)
+
+
+class _DefaultPickler(pickle.Pickler):
+    dispatch_table = copyreg.dispatch_table.copy()
+    for cls in (Card, CardEffect, PlayerDeck, MainDeck, TradeRow, Hand):
+        dispatch_table[cls] = _default_reduce
+
+
+def default_dumps(obj) -> bytes:
+    buffer = io.BytesIO()
+    _DefaultPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(obj)
+    return buffer.getvalue()
+
+
+def compact_dumps(obj) -> bytes:
+    return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def round_trip_seconds(dumps, obj, number: int) -> float:
+    """Best mean time for one dumps/loads round trip"""
+    timer = timeit.Timer(lambda: pickle.loads(dumps(obj)))
+    return min(timer.repeat(repeat=5, number=number)) / number
+
+
+def main():
+    repo = CardRepo()
+    local_catalog()
+    maindeck = MainDeck(repo)
+    traderow = TradeRow(maindeck, repo)
+    traderow.available
+    playerdeck = PlayerDeck(repo.player_deck_cards())
+    hand = Hand(5, [], playerdeck)
+    subjects = [('Card', maindeck._cards[0], 2000),
+                ('PlayerDeck', playerdeck, 500),
+                ('Hand', hand, 500),
+                ('MainDeck', maindeck, 50),
+                ('TradeRow', traderow, 50)]
+    print(f"{'object':<12}{'default B':>12}{'compact B':>12}{'default us':>12}{'compact us':>12}")
+    for name, obj, number in subjects:
+        default_size = len(default_dumps(obj))
+        compact_size = len(compact_dumps(obj))
+        default_time = round_trip_seconds(default_dumps, obj, number) * 1e6
+        compact_time = round_trip_seconds(compact_dumps, obj, number) * 1e6
+        print(f"{name:<12}{default_size:>12}{compact_size:>12}"
+              f"{default_time:>12.1f}{compact_time:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
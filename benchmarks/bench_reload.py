@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Measures the cost of reloading the catalog while games are being created, split
+into building the new version and swapping it in
+
+Run from the repository root with ``python -m benchmarks.bench_reload``
+"""
+
+import time
+from realms.cardrepo import CardRepo
+from realms.catalog import CardCatalog, install_catalog, live_versions, local_catalog
+from realms.cardrepo import _read_cards_json
+from realms.server import GameService
+
+RELOADS = 50
+LOOKUPS = 1000000
+
+
+def main():
+    CardRepo()
+    original = local_catalog()
+    cards = _read_cards_json()
+    service = GameService()
+    build = swap = 0.0
+    for _ in range(RELOADS):
+        service.handle({'op': 'new_game'})
+        start = time.perf_counter()
+        catalog = CardCatalog.from_json(cards)
+        build += time.perf_counter() - start
+        start = time.perf_counter()
+        install_catalog(catalog)
+        swap += time.perf_counter() - start
+    print(f"build a version    {build / RELOADS * 1e3:8.3f} ms")
+    print(f"swap it in         {swap / RELOADS * 1e6:8.3f} us")
+    start = time.perf_counter()
+    for _ in range(LOOKUPS):
+        local_catalog()
+    print(f"local_catalog()    {(time.perf_counter() - start) / LOOKUPS * 1e9:8.1f} ns")
+    print(f"live versions with {len(service.games)} games in progress: {len(live_versions())}")
+    service.games.clear()
+    del catalog
+    install_catalog(original)
+    print(f"live versions after the games end: {len(live_versions())}")
+
+
+if __name__ == '__main__':
+    main()
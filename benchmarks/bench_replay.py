@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Measures event-log overhead and replay speed, from the start of a game and
+from the nearest snapshot
+
+Run from the repository root with ``python -m benchmarks.bench_replay``
+"""
+
+import os
+import random
+import tempfile
+import timeit
+from realms.cardrepo import CardRepo
+from realms.decks import MainDeck, PlayerDeck, TradeRow, Hand
+from realms.events import ArchiveWriter, EventLog
+from realms.replay import ReplayEngine, verify_archive
+
+
+def new_zones(repo):
+    maindeck = MainDeck(repo)
+    return {'main': maindeck,
+            'row': TradeRow(maindeck, repo),
+            'p0': PlayerDeck(repo.player_deck_cards()),
+            'p1': PlayerDeck(repo.player_deck_cards())}
+
+
+def play(zones, turns: int, rng: random.Random) -> None:
+    row = zones['row']
+    decks = [zones['p0'], zones['p1']]
+    for turn in range(turns):
+        deck = decks[turn % 2]
+        hand = Hand(5, [], deck)
+        try:
+            bought = [row.acquire(rng.choice(row.available).uuid)]
+        except IndexError:
+            bought = []
+        for card in hand.cards + bought:
+            deck.discard(card)
+
+
+def main():
+    repo = CardRepo()
+    turns = 200
+    unlogged = new_zones(repo)
+    t_plain = timeit.timeit(lambda: play(unlogged, turns, random.Random(1)), number=1)
+    zones = new_zones(repo)
+    log = EventLog(snapshot_every=256)
+    log.attach(**zones)
+    t_logged = timeit.timeit(lambda: play(zones, turns, random.Random(1)), number=1)
+    engine = ReplayEngine.from_log(log)
+    full = ReplayEngine(log.events, log.snapshots[:1])
+    number = 20
+    t_full = min(timeit.repeat(lambda: full.replay(), number=number, repeat=3)) / number
+    t_skip = min(timeit.repeat(lambda: engine.replay(), number=number, repeat=3)) / number
+    print(f"events recorded:          {log.seq} ({len(log.snapshots)} snapshots)")
+    print(f"play {turns} turns, no log:   {t_plain * 1e3:8.2f} ms")
+    print(f"play {turns} turns, logged:   {t_logged * 1e3:8.2f} ms")
+    print(f"replay from start:        {t_full * 1e3:8.2f} ms "
+          f"({log.seq / t_full:,.0f} events/s)")
+    print(f"replay from snapshot:     {t_skip * 1e3:8.2f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'archive.jsonl')
+        with ArchiveWriter(path) as writer:
+            for n in range(64):
+                zones = new_zones(repo)
+                game_log = EventLog()
+                game_log.attach(**zones)
+                play(zones, 60, random.Random(n))
+                writer.write_game(str(n), game_log)
+        print(f"archive of 64 games, in process: {verify_archive(path, workers=0)}")
+        print(f"archive of 64 games, pool:       {verify_archive(path)}")
+
+
+if __name__ == '__main__':
+    main()
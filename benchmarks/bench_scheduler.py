@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Plays a thousand background bot games and a few live games on one event loop, and
+reports the turn throughput, the turn latency of each priority and how long the event
+loop was held up
+
+Run from the repository root with ``python -m benchmarks.bench_scheduler``
+"""
+
+import asyncio
+import time
+from realms.cardrepo import CardRepo
+from realms.catalog import local_catalog
+from realms.game import Game
+from realms.scheduler import GameScheduler, Priority
+from realms.server import LatencyStats
+
+BACKGROUND = 1000
+LIVE = 10
+
+
+async def probe(lag: LatencyStats, runner: asyncio.Future) -> None:
+    """Measures how late the event loop wakes a coroutine sleeping for 1 ms
+    """
+    while not runner.done():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lag.record(max(time.perf_counter() - start - 0.001, 0.0))
+
+
+async def run() -> None:
+    catalog = local_catalog()
+    scheduler = GameScheduler()
+    background = [scheduler.submit(Game(catalog)) for _ in range(BACKGROUND)]
+    live = [scheduler.submit(Game(catalog), Priority.LIVE) for _ in range(LIVE)]
+    lag = LatencyStats()
+    start = time.perf_counter()
+    runner = asyncio.ensure_future(scheduler.run())
+    probing = asyncio.ensure_future(probe(lag, runner))
+    live_done = await asyncio.gather(*(e.wait() for e in live))
+    live_elapsed = time.perf_counter() - start
+    await asyncio.gather(*(e.wait() for e in background))
+    elapsed = time.perf_counter() - start
+    scheduler.stop()
+    await runner
+    await probing
+    turns = sum(e.latency.count for e in background + live)
+    print(f"{turns} turns in {elapsed:.2f} s: {turns / elapsed:.0f} turns per second")
+    print(f"{len(live_done)} live games finished after {live_elapsed * 1e3:.1f} ms")
+    for name, entries in (('live', live), ('background', background)):
+        stats = LatencyStats()
+        for e in entries:
+            stats.merge(e.latency)
+        print(f"{name:10} turn latency {stats.as_dict()}")
+    print(f"event loop lag {lag.as_dict()}")
+
+
+def main():
+    CardRepo()
+    local_catalog()
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
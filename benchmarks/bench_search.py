@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Compares answering typical deck-builder queries with the card index, a scan of the
+catalog and a Pony query
+
+Run from the repository root with ``python -m benchmarks.bench_search``
+"""
+
+import time
+from pony.orm import db_session, select
+from realms.cardrepo import CardPrimitive, CardRepo
+from realms.cards import CardAction, CardFaction
+from realms.catalog import local_catalog
+from realms.search import CardIndex, card_index
+
+QUERIES = 100000
+PONY_QUERIES = 1000
+
+
+def query_index(index):
+    cheap_blob_ships = index.faction(CardFaction.BLOB) & index.ships() & index.cost(max=4)
+    return (cheap_blob_ships & index.effect(CardAction.ATTACK, slot='ally')).templates('cost')
+
+
+def query_scan(templates):
+    found = [t for t in templates if t.faction == CardFaction.BLOB and not t.base and t.cost <= 4
+             if any(e.action == CardAction.ATTACK for e in t.effects_ally)]
+    return sorted(found, key=lambda t: (t.cost, t.name, t.id))
+
+
+@db_session
+def query_pony():
+    return select(c for c in CardPrimitive
+                  if c.faction.name == 'Blob' and not c.base and c.cost <= 4
+                  for e in c.ally if e.action.name == 'ATTACK').order_by(
+                      lambda c: (c.cost, c.name))[:]
+
+
+def main():
+    CardRepo()
+    catalog = local_catalog()
+    start = time.perf_counter()
+    index = CardIndex(catalog)
+    print(f"build the index    {(time.perf_counter() - start) * 1e3:8.3f} ms")
+    index = card_index()
+    assert [t.id for t in query_index(index)] == [t.id for t in query_scan(catalog.templates)]
+    for name, query, n in (('index', lambda: query_index(index), QUERIES),
+                           ('scan', lambda: query_scan(catalog.templates), QUERIES),
+                           ('pony', query_pony, PONY_QUERIES)):
+        start = time.perf_counter()
+        for _ in range(n):
+            query()
+        print(f"query ({name:5})      {(time.perf_counter() - start) / n * 1e6:8.2f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Drives thousands of concurrent games through a single game server and reports
+request throughput and the server-side per-operation latency
+
+Run from the repository root with ``python -m benchmarks.bench_server``
+"""
+
+import asyncio
+import json
+import time
+from realms.cardrepo import CardRepo
+from realms.catalog import local_catalog
+from realms.server import GameServer, GameService
+
+GAMES = 2000
+CLIENTS = 50
+TURNS = 10
+
+
+async def client(port: int, games: int) -> int:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+
+    async def call(request: dict) -> dict:
+        writer.write(json.dumps(request).encode() + b'\n')
+        await writer.drain()
+        return json.loads(await reader.readline())
+
+    requests = 0
+    game_ids = [(await call({'op': 'new_game'}))['game'] for _ in range(games)]
+    requests += games
+    for turn in range(TURNS):
+        for game in game_ids:
+            player = turn % 2
+            await call({'op': 'draw', 'game': game, 'player': player})
+            row = (await call({'op': 'trade_row', 'game': game}))['cards']
+            await call({'op': 'acquire', 'game': game, 'player': player, 'uuid': row[-1]['uuid']})
+            await call({'op': 'end_turn', 'game': game, 'player': player})
+            requests += 4
+    writer.close()
+    return requests
+
+
+async def run() -> None:
+    CardRepo()
+    server = GameServer(GameService(local_catalog()))
+    await server.start(port=0)
+    start = time.perf_counter()
+    counts = await asyncio.gather(*(client(server.port, GAMES // CLIENTS)
+                                    for _ in range(CLIENTS)))
+    elapsed = time.perf_counter() - start
+    stats = server.service.handle({'op': 'stats'})
+    await server.close()
+    print(f"{stats['games']} games, {sum(counts)} requests in {elapsed:.2f} s "
+          f"({sum(counts) / elapsed:,.0f} requests/s over {CLIENTS} connections)")
+    for op, s in sorted(stats['latency'].items()):
+        print(f"  {op:<10} n={s['count']:<7} mean={s['mean_us']:>7.1f}us "
+              f"p50<={s['p50_us']:>7.1f}us p99<={s['p99_us']:>7.1f}us max={s['max_us']:>8.1f}us")
+
+
+if __name__ == '__main__':
+    asyncio.run(run())
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""Measures a card-balance sweep with and without early stopping: the games played,
+the time taken, and how soon the first result streams in
+
+Run from the repository root with ``python -m benchmarks.bench_sweep``
+"""
+
+import time
+from realms.cardrepo import CardRepo
+from realms.sweep import Sweep, VariantStatus
+
+GRID = {'Blob Fighter': {'effects.0.value': [0, 1, 2, 3, 5, 8, 12]}}
+MAX_GAMES = 400
+WORKERS = 2
+
+
+def sweep(min_games: int) -> None:
+    start = time.perf_counter()
+    first = None
+    final = {}
+    for result in Sweep(GRID, min_games=min_games, max_games=MAX_GAMES).run(WORKERS):
+        first = first or time.perf_counter() - start
+        if result.status != VariantStatus.RUNNING:
+            final[result.variant.index] = result
+    seconds = time.perf_counter() - start
+    games = sum(r.games for r in final.values())
+    label = 'early stopping' if min_games < MAX_GAMES else 'every game'
+    print(f"{label}: {games} games in {seconds:.1f} s, first result after {first:.2f} s")
+    for i in sorted(final):
+        print(f"  {final[i]}")
+
+
+def main():
+    CardRepo()
+    sweep(min_games=40)
+    sweep(min_games=MAX_GAMES)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Compares encoding the full state for every client on every poll against
+delta frames that are encoded once per update and shared by every client
+
+Run from the repository root with ``python -m benchmarks.bench_sync``
+"""
+
+import json
+import time
+from realms.cardrepo import CardRepo
+from realms.decks import MainDeck, PlayerDeck, TradeRow, Hand
+from realms.sync import ViewSync, observe
+
+WATCHERS = 200
+TURNS = 40
+
+
+def full_state(view) -> bytes:
+    return json.dumps({'row': view.row, 'hand': view.hand, 'piles': view.piles,
+                       'totals': view.totals}).encode()
+
+
+def main():
+    repo = CardRepo()
+    maindeck = MainDeck(repo)
+    traderow = TradeRow(maindeck, repo)
+    playerdeck = PlayerDeck(repo.player_deck_cards())
+    sync = ViewSync()
+    full_bytes = delta_bytes = 0
+    full_time = delta_time = 0.0
+    hand = Hand(5, [], playerdeck)
+    sync.update(observe(traderow, hand, playerdeck, maindeck))
+    updates = 0
+    for turn in range(TURNS):
+        for step in range(3):
+            if step == 0:
+                playerdeck.discard(traderow.acquire(traderow.available[-1].uuid))
+            elif step == 1:
+                traderow.scrap(traderow.cards[0].uuid)
+            else:
+                for card in hand.cards:
+                    playerdeck.discard(card)
+                hand = Hand(5, [], playerdeck)
+            view = observe(traderow, hand, playerdeck, maindeck)
+            updates += 1
+
+            start = time.perf_counter()
+            frames = [full_state(view) for _ in range(WATCHERS)]
+            full_time += time.perf_counter() - start
+            full_bytes += sum(len(f) for f in frames)
+
+            start = time.perf_counter()
+            client_seq = sync.seq
+            sync.update(view)
+            frames = [sync.frame_for(client_seq) for _ in range(WATCHERS)]
+            delta_time += time.perf_counter() - start
+            delta_bytes += sum(len(f) for f in frames)
+    print(f"{WATCHERS} watchers, {updates} updates")
+    print(f"full state per client: {full_bytes / 1024:10.1f} kB  {full_time * 1e3:8.2f} ms")
+    print(f"shared delta frames:   {delta_bytes / 1024:10.1f} kB  {delta_time * 1e3:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
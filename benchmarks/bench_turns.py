@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Measures the throughput of the turn engine, in turns per second, on games between
+default policies, and where the time of a turn is spent
+
+Run from the repository root with ``python -m benchmarks.bench_turns``
+"""
+
+import time
+from realms.cardrepo import CardRepo
+from realms.catalog import local_catalog
+from realms.game import Game, PhaseTimings
+
+GAMES = 200
+MAX_TURNS = 200
+
+
+def play_games(catalog, players, timings=None):
+    turns = 0
+    for _ in range(GAMES):
+        game = Game(catalog, [f"p{i}" for i in range(players)])
+        if timings is not None:
+            game.add_hook(timings)
+        game.run(MAX_TURNS)
+        turns += game.turn
+    return turns
+
+
+def main():
+    CardRepo()
+    catalog = local_catalog()
+    for players in (2, 4):
+        start = time.perf_counter()
+        turns = play_games(catalog, players)
+        elapsed = time.perf_counter() - start
+        print(f"{players} players: {GAMES} games, {turns / GAMES:.1f} turns per game, "
+              f"{turns / elapsed:.0f} turns per second ({elapsed / turns * 1e6:.1f} us per turn)")
+    timings = PhaseTimings()
+    play_games(catalog, 2, timings)
+    for phase, stats in timings.as_dict().items():
+        print(f"{phase:8} {stats['mean_us']:8.1f} us  {stats['share']:6.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Compares worker startup time and resident memory for three ways of giving
+pool workers the card catalog: building it from the database, receiving a
+pickled copy, and mapping the shared-memory arrays
+
+Resident memory is dominated by the interpreter and the imported modules, so the
+Python heap allocated for the catalog is also traced, once after the worker's
+initializer and once after dealing a main deck, which touches every template.
+
+Run from the repository root with ``python -m benchmarks.bench_workers``
+"""
+
+import multiprocessing
+import os
+import pickle
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from realms.catalog import install_catalog, local_catalog
+from realms.sharedcatalog import SharedCatalog, attach_catalog
+
+WORKERS = 4
+
+_initialized = 0
+
+
+def _unpickle(data: bytes) -> None:
+    install_catalog(pickle.loads(data))
+
+
+def _traced(initializer, *args) -> None:
+    global _initialized
+    tracemalloc.start()
+    initializer(*args)
+    _initialized = tracemalloc.get_traced_memory()[0]
+
+
+def _from_db() -> None:
+    install_catalog(None)
+    local_catalog()
+
+
+def _memory(_) -> dict:
+    """The catalog heap and resident memory of the worker, in kB"""
+    fields = {'initialized': _initialized / 1024}
+    local_catalog().main_deck_cards()
+    fields['dealt'] = tracemalloc.get_traced_memory()[0] / 1024
+    with open('/proc/self/status') as status:
+        for line in status:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'RssAnon', 'RssShmem'):
+                fields[key] = int(value.split()[0])
+    fields['pid'] = os.getpid()
+    return fields
+
+
+def measure(label: str, initializer, initargs=()) -> None:
+    context = multiprocessing.get_context('spawn')
+    start = time.perf_counter()
+    with ProcessPoolExecutor(WORKERS, mp_context=context, initializer=_traced,
+                             initargs=(initializer,) + tuple(initargs)) as pool:
+        samples = list(pool.map(_memory, range(WORKERS * 4)))
+        startup = time.perf_counter() - start
+    per_worker = {s['pid']: s for s in samples}.values()
+    rss = sum(s['VmRSS'] for s in per_worker) / len(per_worker)
+    anon = sum(s['RssAnon'] for s in per_worker) / len(per_worker)
+    initialized = sum(s['initialized'] for s in per_worker) / len(per_worker)
+    dealt = sum(s['dealt'] for s in per_worker) / len(per_worker)
+    print(f"{label:<10} startup {startup * 1e3:8.1f} ms   "
+          f"RSS/worker {rss:8.0f} kB   private {anon:8.0f} kB   "
+          f"catalog heap {initialized:7.1f} kB, {dealt:7.1f} kB after dealing")
+
+
+def main():
+    catalog = local_catalog()
+    measure('database', _from_db)
+    measure('pickled', _unpickle, (pickle.dumps(catalog),))
+    with SharedCatalog(catalog) as shared:
+        print(f"(shared block: {shared.size} bytes)")
+        measure('shared', attach_catalog, (shared.name,))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Measures the cost of hashing game states incrementally against rehashing every
+pile after each change, and the hit rate of a transposition table shared by MCTS bots
+
+Bots playing each other rarely meet the same position twice, since authority and
+the trade row keep changing; the table pays off when positions are searched again,
+as when a game is replayed for analysis, which the second pass of each series does.
+
+Run from the repository root with ``python -m benchmarks.bench_zobrist``
+"""
+
+import random
+import time
+from typing import List
+from realms.cardrepo import CardRepo
+from realms.catalog import local_catalog
+from realms.game import Game
+from realms.mcts import MCTSPolicy
+from realms.zobrist import Replacement, TranspositionTable, ZobristKeys
+
+GAMES = 20
+TURNS = 200
+ROLLOUTS = 32
+SERIES = 4
+
+
+class Counter(object):
+    """Counts the deck events that a hash passes on, standing in for a log"""
+    def __init__(self):
+        self.events = 0
+
+    def record(self, kind, zone, *args):
+        self.events += 1
+
+
+def play(catalog, keys, counter=None) -> float:
+    start = time.perf_counter()
+    for g in range(GAMES):
+        game = Game(catalog, ['a', 'b', 'c'], zobrist=keys)
+        if counter is not None:
+            game.zobrist._log = counter
+        game.run(max_turns=TURNS)
+    return time.perf_counter() - start
+
+
+def rehash_cost(catalog, keys) -> float:
+    """The time of a full rehash, in seconds, averaged over a game's positions"""
+    game = Game(catalog, ['a', 'b', 'c'], zobrist=keys)
+    seconds, n = 0.0, 0
+    while not game.over and game.turn < TURNS:
+        game.step()
+        start = time.perf_counter()
+        game.zobrist.full()
+        seconds += time.perf_counter() - start
+        n += 1
+    return seconds / n
+
+
+def table_hits(catalog, replacement: Replacement) -> List[dict]:
+    """Plays a series of bot games sharing a table, then replays the series"""
+    table = TranspositionTable(size=1 << 14, replacement=replacement)
+    passes = []
+    for _ in range(2):
+        table.hits = table.misses = 0
+        bots = [MCTSPolicy(rollouts=ROLLOUTS, horizon=4, seed=s, table=table) for s in (0, 1)]
+        start = time.perf_counter()
+        for g in range(SERIES):
+            random.seed(g)
+            Game(catalog, policies=bots, zobrist=ZobristKeys()).run(max_turns=40)
+        passes.append({'seconds': round(time.perf_counter() - start, 2),
+                       'hit_rate': round(table.hit_rate, 3),
+                       'reused': sum(b.stats.reused for b in bots),
+                       'rollouts': sum(b.stats.rollouts for b in bots)})
+    passes[-1]['replaced'] = table.replaced
+    return passes
+
+
+def main():
+    CardRepo()
+    catalog = local_catalog()
+    keys = ZobristKeys()
+    counter = Counter()
+    play(catalog, None)
+    plain = min(play(catalog, None) for _ in range(3))
+    hashed = min(play(catalog, keys, counter) for _ in range(3))
+    counter.events //= 3
+    per_event = (hashed - plain) / counter.events
+    full = rehash_cost(catalog, keys)
+    print(f"{GAMES} games: {plain * 1e3:.0f} ms unhashed, {hashed * 1e3:.0f} ms hashed, "
+          f"{counter.events} deck events")
+    print(f"incremental hashing: {per_event * 1e6:.2f} us per event; "
+          f"full rehash: {full * 1e6:.1f} us "
+          f"({full * counter.events * 1e3:.0f} ms if done after every event)")
+    for replacement in Replacement:
+        first, replay = table_hits(catalog, replacement)
+        print(f"{replacement.name}: first pass {first}")
+        print(f"{' ' * len(replacement.name)}  replay     {replay}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,26 @@
 # -*- coding: utf-8 -*-
 
+import argparse
+import asyncio
+
 
 def main(args=None):
     """The main routine."""
+    parser = argparse.ArgumentParser(prog='realms', description='Host Realms games')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='the address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765,
+                        help='the TCP port to listen on (default: 8765)')
+    parser.add_argument('--unix', metavar='PATH', default=None,
+                        help='listen on a Unix socket instead of a TCP port')
+    parser.add_argument('--store', metavar='PATH', default=None,
+                        help='persist games in progress to a SQLite file')
+    options = parser.parse_args(args)
+    from .server import serve
+    try:
+        asyncio.run(serve(options.host, options.port, options.unix, options.store))
+    except KeyboardInterrupt:
+        pass
     return
 
 
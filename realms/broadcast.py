@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: broadcast
+    :synopsis: Fan-out of encoded frames to many subscribers with bounded queues
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+"""
+
+import asyncio
+from collections import deque
+from typing import Deque, Optional, Set
+
+
+class Subscription(object):
+    """The queue of frames waiting to be sent to a single subscriber
+
+    The queue holds at most ``maxsize`` frames. Frames are complete states rather
+    than deltas, so a subscriber that falls that far behind loses every pending
+    frame except the newest one instead of slowing down the publisher.
+
+    Parameters
+    ----------
+    broadcaster : Broadcaster
+        The broadcaster the subscription belongs to
+    maxsize : int
+        The maximum number of pending frames
+
+    Attributes
+    ----------
+    dropped : int
+        The number of frames discarded because the subscriber was too slow
+    """
+    def __init__(self, broadcaster: 'Broadcaster', maxsize: int):
+        self.maxsize: int = maxsize
+        self.dropped: int = 0
+        self.closed: bool = False
+        self._broadcaster: Broadcaster = broadcaster
+        self._frames: Deque[bytes] = deque()
+        self._ready: asyncio.Event = asyncio.Event()
+        return
+
+    def put(self, frame: bytes) -> None:
+        """Queues a frame, discarding the pending ones if the queue is full
+        """
+        if self.closed:
+            return
+        if len(self._frames) >= self.maxsize:
+            self.dropped += len(self._frames)
+            self._frames.clear()
+        self._frames.append(frame)
+        self._ready.set()
+        return
+
+    def pending(self) -> int:
+        return len(self._frames)
+
+    async def get(self) -> Optional[bytes]:
+        """Waits for the next frame
+
+        Returns
+        -------
+        bytes
+            The next frame, or ``None`` once the subscription is closed
+        """
+        while not self._frames:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        return self._frames.popleft()
+
+    def close(self) -> None:
+        """Stops the subscription; pending frames are discarded
+        """
+        self.closed = True
+        self._frames.clear()
+        self._ready.set()
+        self._broadcaster._subscribers.discard(self)
+        return
+
+
+class Broadcaster(object):
+    """Hands each published frame to every subscriber
+
+    A frame is encoded once by the publisher and the same ``bytes`` object is queued
+    for every subscriber, so the cost of publishing an update is one append per
+    subscriber regardless of the size of the frame.
+
+    Parameters
+    ----------
+    maxsize : int (Optional)
+        The default maximum number of pending frames per subscriber (Default is 8)
+
+    Note
+    ----
+    The broadcaster is not thread-safe; publish and subscribe from the event loop.
+    """
+    def __init__(self, maxsize: int = 8):
+        self.maxsize: int = maxsize
+        self.published: int = 0
+        self._subscribers: Set[Subscription] = set()
+        return
+
+    def subscribe(self, maxsize: Optional[int] = None) -> Subscription:
+        """Adds a subscriber
+
+        Parameters
+        ----------
+        maxsize : int (Optional)
+            The maximum number of pending frames (Default is the broadcaster's)
+        """
+        subscription = Subscription(self, maxsize or self.maxsize)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def publish(self, frame: bytes) -> None:
+        """Queues an encoded frame for every subscriber
+        """
+        self.published += 1
+        for subscription in self._subscribers:
+            subscription.put(frame)
+        return
+
+    def close(self) -> None:
+        """Closes every subscription
+        """
+        for subscription in list(self._subscribers):
+            subscription.close()
+        return
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
@@ -15,28 +15,277 @@ from pony.orm import (
     db_session
 )
 from .cards import CardFaction, CardAction, CardTarget, Card
+from .conditions import Condition, compile_condition
+from .exceptions import CardBackendError
+import asyncio
 import json
-from pkg_resources import resource_string, resource_exists
+from abc import ABC, abstractmethod
+import os
+import sqlite3
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pkg_resources import resource_string
+from hashlib import sha1
 from uuid import uuid4
-from typing import List, Tuple
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 CardList = List[Card]
 
 db = Database()
+_bind_lock = threading.Lock()
+_bound_backend = None
+_process_backend = None
+_repos = weakref.WeakSet()
 
+DEFAULT_DB_PATH: str = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    'realms-cards.sqlite')
+"""The card database used when neither a path nor ``REALMS_CARD_DB`` is given"""
 
-class CardRepo(object):
-    """Provides an interface for the card-loading mechanisms
+
+class CardBackend(ABC):
+    """The source a ``CardRepo`` reads card definitions from
+
+    Backends that use the ORM bind the process-global database; only one of them
+    can be bound per process, and every repository shares it.
+
+    Attributes
+    ----------
+    uses_orm : bool
+        Whether the backend serves cards through the Pony entities
     """
-    def __init__(self):
-        self.db: Database = db
-        if not resource_exists(__package__, 'realms-cards.sqlite'):
-            db.bind('sqlite', 'realms-cards.sqlite', create_db=True)
+    uses_orm: bool = True
+
+    @abstractmethod
+    def bind(self) -> None:
+        """Prepares the backend for use; called by every ``CardRepo`` constructed with it
+        """
+
+    def catalog(self):
+        """Builds a ``CardCatalog`` holding every card definition of the backend
+        """
+        from .catalog import CardCatalog
+        return CardCatalog.from_db()
+
+    def reload(self):
+        """Builds a ``CardCatalog`` from the current contents of the backend
+        """
+        return self.catalog()
+
+
+class SQLiteBackend(CardBackend):
+    """Serves cards from a SQLite file, generated from ``cards.json`` if it is missing
+
+    An existing file is brought up to date with ``cards.json`` by ``sync_db`` when
+    it is bound, which only touches the cards that changed.
+
+    Parameters
+    ----------
+    path : str (Optional)
+        The path of the database file (Default is the ``REALMS_CARD_DB`` environment
+        variable if set, otherwise ``DEFAULT_DB_PATH``). Relative paths are resolved
+        against the working directory when the backend is created.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path: str = os.path.abspath(path or os.environ.get('REALMS_CARD_DB',
+                                                                DEFAULT_DB_PATH))
+        return
+
+    def bind(self) -> None:
+        _bind_db(self, self._bind)
+        return
+
+    def _bind(self) -> None:
+        if not os.path.exists(self.path):
+            db.bind('sqlite', self.path, create_db=True)
             db.generate_mapping(create_tables=True)
             _populate_db()
         else:
-            db.bind('sqlite', 'realms-cards.sqlite')
-            db.generate_mapping()
+            _add_missing_columns(self.path)
+            db.bind('sqlite', self.path)
+            db.generate_mapping(create_tables=True)
+            sync_db()
+        return
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, SQLiteBackend) and other.path == self.path
+
+    def __repr__(self) -> str:
+        return f"SQLiteBackend({self.path!r})"
+
+
+class MemoryBackend(CardBackend):
+    """Serves cards from an in-memory SQLite database populated from ``cards.json``
+
+    Nothing is written to disk, which suits tests and simulations. The database is
+    populated once per process, when the first repository is created, and is
+    shared by every thread of the process.
+    """
+    def bind(self) -> None:
+        _bind_db(self, self._bind)
+        return
+
+    def _bind(self) -> None:
+        db.bind('sqlite', ':sharedmemory:')
+        db.generate_mapping(create_tables=True)
+        _populate_db()
+        return
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, MemoryBackend)
+
+    def __repr__(self) -> str:
+        return 'MemoryBackend()'
+
+
+class JSONBackend(CardBackend):
+    """Serves cards straight from ``cards.json``, without the ORM or a database
+
+    The file is parsed once into a ``CardCatalog`` that deals every card, so a
+    repository using this backend never opens a database. Template ids match
+    those of the database backends.
+
+    Parameters
+    ----------
+    path : str (Optional)
+        The path of a JSON file in the format of ``realms/resources/cards.json``
+        (Default is the file shipped with the package)
+    """
+    uses_orm: bool = False
+
+    def __init__(self, path: Optional[str] = None):
+        self.path: Optional[str] = path
+        self._catalog = None
+        self._lock = threading.Lock()
+        return
+
+    def bind(self) -> None:
+        self.catalog()
+        return
+
+    def catalog(self):
+        if self._catalog is None:
+            with self._lock:
+                if self._catalog is None:
+                    from .catalog import CardCatalog
+                    self._catalog = CardCatalog.from_json(_read_cards_json(self.path))
+        return self._catalog
+
+    def reload(self):
+        from .catalog import CardCatalog
+        catalog = CardCatalog.from_json(_read_cards_json(self.path))
+        self._catalog = catalog
+        return catalog
+
+    def __repr__(self) -> str:
+        return f"JSONBackend({self.path!r})"
+
+
+_DEALING_METHODS = ('new_viper', 'new_scout', 'new_explorer', '_named_card',
+                    'main_deck_cards', 'player_deck_cards')
+
+
+class CardRepo(object):
+    """Provides an interface for the card-loading mechanisms
+
+    Any number of repositories may be created, from any thread. The process-global
+    database is bound by whichever is created first, and the rest share it.
+
+    Every method has an awaitable counterpart prefixed with ``a`` (e.g.
+    ``amain_deck_cards``) that runs the database work on a bounded thread pool, so
+    that the event loop is never blocked by Pony. Pony keeps one ``db_session`` and
+    connection per thread, so each worker thread has its own session.
+
+    Repositories are fork-safe: a child process created with ``fork`` drops the
+    thread pool inherited from its parent, and Pony opens a new connection in the
+    child on first use.
+
+    Parameters
+    ----------
+    max_workers : int (Optional)
+        The maximum number of threads used by the awaitable methods (Default is 4)
+    backend : CardBackend (Optional)
+        Where the cards are read from (Default is ``process_backend()``)
+
+    Raises
+    ------
+    CardBackendError
+        Raised when ``backend`` uses the ORM and the process-global database is
+        already bound to a different backend
+    """
+    def __init__(self, max_workers: int = 4, backend: Optional[CardBackend] = None):
+        global _process_backend
+        if backend is None:
+            backend = process_backend()
+        self.db: Database = db
+        self.backend: CardBackend = backend
+        self.max_workers: int = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        backend.bind()
+        if _process_backend is None:
+            _process_backend = backend
+        if not backend.uses_orm:
+            # Deal from the backend's catalog instead of the ORM
+            catalog = backend.catalog()
+            for name in _DEALING_METHODS:
+                setattr(self, name, getattr(catalog, name))
+        _repos.add(self)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Produces the thread pool used by the awaitable methods, creating it on first use
+        """
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='cardrepo')
+        return self._executor
+
+    async def _run(self, method, *args):
+        """Runs a synchronous method on the thread pool and waits for its result
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), partial(method, *args))
+
+    def close(self) -> None:
+        """Shuts down the thread pool used by the awaitable methods, if it was started
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        return
+
+    async def anew_viper(self) -> Card:
+        """Awaitable version of ``new_viper``
+        """
+        return await self._run(self.new_viper)
+
+    async def anew_scout(self) -> Card:
+        """Awaitable version of ``new_scout``
+        """
+        return await self._run(self.new_scout)
+
+    async def anew_explorer(self) -> Card:
+        """Awaitable version of ``new_explorer``
+        """
+        return await self._run(self.new_explorer)
+
+    async def anamed_card(self, cardname: str) -> Card:
+        """Awaitable version of ``_named_card``
+        """
+        return await self._run(self._named_card, cardname)
+
+    async def amain_deck_cards(self) -> CardList:
+        """Awaitable version of ``main_deck_cards``
+        """
+        return await self._run(self.main_deck_cards)
+
+    async def aplayer_deck_cards(self, n_players: Optional[int] = None):
+        """Awaitable version of ``player_deck_cards``
+        """
+        return await self._run(self.player_deck_cards, n_players)
 
     @db_session
     def new_viper(self) -> Card:
@@ -120,32 +369,35 @@ class CardRepo(object):
         return cards
 
     @db_session
-    def player_deck_cards(self) -> CardList:
-        """Produces the list of cards for a single player's starting deck
+    def player_deck_cards(self, n_players: Optional[int] = None):
+        """Produces the cards of players' starting decks
+
+        Both templates are read in a single query however many decks are dealt, so
+        setting up a table costs one call.
+
+        Parameters
+        ----------
+        n_players : int (Optional)
+            The number of decks to deal in one pass (Default is a single deck)
 
         Returns
         -------
-        [Card]
-            The list of cards for a player's starting deck
+        [Card] or [[Card]]
+            The cards of a single deck when ``n_players`` is not given, otherwise one
+            list of cards per player
 
         Note
         ----
-        The list of cards is not shuffled
+        The lists of cards are not shuffled
         """
-        scout_primitive: CardPrimitive = select(c for c in CardPrimitive
-                                                if c.name == 'Scout').first()
-        viper_primitive: CardPrimitive = select(c for c in CardPrimitive
-                                                if c.name == 'Viper').first()
-        cards: CardList = []
-        for i in range(8):
-            new_uuid: str = uuid4().hex
-            scout: Card = Card(scout_primitive, new_uuid)
-            cards.append(scout)
-        for i in range(2):
-            new_uuid: str = uuid4().hex
-            viper: Card = Card(viper_primitive, new_uuid)
-            cards.append(viper)
-        return cards
+        from .catalog import _deal_starting_decks, _template_from_primitive
+        primitives: Dict[str, CardPrimitive] = {
+            p.name: p for p in select(c for c in CardPrimitive if c.name in ('Scout', 'Viper'))}
+        decks: List[CardList] = _deal_starting_decks(
+            _template_from_primitive(primitives['Scout']),
+            _template_from_primitive(primitives['Viper']),
+            n_players or 1)
+        return decks[0] if n_players is None else decks
 
 
 class FactionPrimitive(db.Entity):
@@ -202,6 +454,9 @@ class EffectPrimitive(db.Entity):
     value = Required(int, size=8)
     """The value of the action (how many cards to draw, money provided, etc.)"""
 
+    condition = Required(str, default='{}')
+    """The condition under which the effect applies, as canonical JSON"""
+
     cards = Set('CardPrimitive', reverse='effects')
     """The set of cards providing this effect (not used)"""
 
@@ -212,6 +467,14 @@ class EffectPrimitive(db.Entity):
     """The set of cards that provide this effect when scrapped (not used)"""
 
 
+SyncReport = NamedTuple('SyncReport', [
+                        ('inserted', List[str]),
+                        ('updated', List[str]),
+                        ('deleted', List[str]),
+                        ('unchanged', int)])
+"""The names of the cards changed by ``sync_db``, and the number left untouched"""
+
+
 class CardPrimitive(db.Entity):
     """The ORM entity representing a ``Card``
     """
@@ -227,16 +490,16 @@ class CardPrimitive(db.Entity):
     simplified = Required(bool)
     """(bool) Denotes whether the card's effects have been simplified to ease implementation"""
 
-    base = Required(bool)
+    base = Required(bool, index=True)
     """(bool) Denotes whether the card is a base"""
 
-    outpost = Required(bool)
+    outpost = Required(bool, index=True)
     """(bool) If the card is a base, denotes whether it is also an outpost"""
 
     defense = Required(int, size=8)
     """(int) If the card is a base, denotes the damage required to destroy it"""
 
-    cost = Required(int, size=8)
+    cost = Required(int, size=8, index=True)
     """(int) The amount of trade required to acquire the card"""
 
     effects = Set(EffectPrimitive, reverse='cards')
@@ -253,6 +516,75 @@ class CardPrimitive(db.Entity):
     (0 if unlimited or provided in each player's starting deck)"""
 
 
+class CardDigest(db.Entity):
+    """The hash of the ``cards.json`` record a ``CardPrimitive`` was imported from
+    """
+    name = PrimaryKey(str)
+    """(str) The name of the card"""
+
+    digest = Required(str)
+    """(str) The SHA-1 of the card's JSON record"""
+
+
+def process_backend() -> CardBackend:
+    """The card backend of the process, which builds the process-local catalog
+
+    Returns
+    -------
+    CardBackend
+        The backend of the first ``CardRepo`` created in the process, or until then
+        a ``SQLiteBackend`` at its default path
+    """
+    return _process_backend or _bound_backend or SQLiteBackend()
+
+
+def _bind_db(backend: CardBackend, bind) -> None:
+    """Binds the process-global database and generates its mapping, exactly once
+
+    Safe to call from several threads at once; only the first call does any work.
+
+    Parameters
+    ----------
+    backend : CardBackend
+        The backend requesting the binding
+    bind : Callable[[], None]
+        Binds ``db`` and generates its mapping
+
+    Raises
+    ------
+    CardBackendError
+        Raised when the database is already bound to a different backend
+    """
+    global _bound_backend
+    with _bind_lock:
+        if db.provider is None:
+            bind()
+            _bound_backend = backend
+        elif backend != _bound_backend:
+            raise CardBackendError(f"The card database is already bound to {_bound_backend!r}")
+    return
+
+
+def _reset_after_fork() -> None:
+    """Recreates the locks and thread pools inherited from the parent
+
+    Runs in the child process after ``os.fork``. Pony already replaces a connection
+    opened by another process, but a lock held by another thread of the parent would
+    never be released in the child, and the threads of the pools do not survive the
+    fork, so work submitted to an inherited pool would never run.
+    """
+    global _bind_lock
+    _bind_lock = threading.Lock()
+    for repo in list(_repos):
+        repo._executor = None
+        repo._executor_lock = threading.Lock()
+    return
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
 @db_session
 def _populate_factions() -> List[FactionPrimitive]:
     """Populates the entries in the FactionPrimitives table
@@ -304,16 +636,108 @@ def _populate_enums() -> Tuple[List[ActionPrimitive],
     return action_entities, faction_entities, target_entities
 
 
+def _read_cards_json(path: Optional[str] = None) -> List[dict]:
+    """Reads the card definitions from ``cards.json``, or from the given file
+    """
+    if path is None:
+        return json.loads(resource_string('realms.resources', 'cards.json'))
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
 @db_session
 def _populate_db() -> None:
-    """Populates the tables in ``realms-cards.sqlite`` from the data in ``cards.json``
+    """Populates the tables of the card database from the data in ``cards.json``
     """
-    json_string: str = resource_string('realms.resources', 'cards.json')
-    json_cards = json.loads(json_string)
-    actions, factions, targets = _populate_enums()
-    for j in json_cards:
-        _populate_card(j, actions, factions, targets)
-        commit()
+    _populate_enums()
+    sync_db()
+    return
+
+
+@db_session
+def sync_db(json_cards: Optional[List[dict]] = None) -> SyncReport:
+    """Brings the card tables in line with a list of card records, in one transaction
+
+    Each record is hashed and compared with the hash stored when the card was last
+    imported, so only the ``CardPrimitive`` rows (and their ``EffectPrimitive`` rows)
+    of cards that were added, changed or removed are written. Cards are matched by
+    name, and a changed card keeps its id, i.e. its template id.
+
+    Parameters
+    ----------
+    json_cards : [dict] (Optional)
+        The card records (Default is the contents of ``cards.json``)
+
+    Returns
+    -------
+    SyncReport
+        The names of the inserted, updated and deleted cards
+    """
+    if json_cards is None:
+        json_cards = _read_cards_json()
+    actions: List[ActionPrimitive] = list(ActionPrimitive.select())
+    factions: List[FactionPrimitive] = list(FactionPrimitive.select())
+    targets: List[TargetPrimitive] = list(TargetPrimitive.select())
+    digests: Dict[str, CardDigest] = {d.name: d for d in CardDigest.select()}
+    primitives: Dict[str, CardPrimitive] = {p.name: p for p in CardPrimitive.select()}
+    inserted: List[str] = []
+    updated: List[str] = []
+    unchanged: int = 0
+    for card in json_cards:
+        name: str = card['name']
+        digest: str = _card_digest(card)
+        stored: Optional[CardDigest] = digests.pop(name, None)
+        primitive: Optional[CardPrimitive] = primitives.pop(name, None)
+        if primitive is not None and stored is not None and stored.digest == digest:
+            unchanged += 1
+            continue
+        if primitive is None:
+            _populate_card(card, actions, factions, targets)
+            inserted.append(name)
+        else:
+            _update_card(primitive, card, actions, factions, targets)
+            updated.append(name)
+        if stored is None:
+            CardDigest(name=name, digest=digest)
+        else:
+            stored.digest = digest
+    for primitive in primitives.values():
+        _delete_effects(primitive)
+        primitive.delete()
+    for stored in digests.values():
+        stored.delete()
+    return SyncReport(inserted=inserted, updated=updated, deleted=sorted(primitives),
+                      unchanged=unchanged)
+
+
+def _card_digest(card: dict) -> str:
+    """Hashes a card record independently of the order of its keys
+    """
+    return sha1(json.dumps(card, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _update_card(primitive: CardPrimitive, card, actions, factions, targets) -> None:
+    """Overwrites a CardPrimitive entity, and replaces its effects, from a JSON object
+    """
+    _delete_effects(primitive)
+    primitive.set(faction=next(f for f in factions if f.name == card['faction']),
+                  simplified=_str_to_bool(card['simplified']),
+                  base=_str_to_bool(card['base']),
+                  outpost=_str_to_bool(card['outpost']),
+                  defense=int(card['defense']),
+                  cost=int(card['cost']),
+                  count=int(card['count']),
+                  effects=_populate_effects(card['effects'], targets, actions),
+                  ally=_populate_effects(card['ally'], targets, actions),
+                  scrap=_populate_effects(card['scrap'], targets, actions))
+    return
+
+
+def _delete_effects(primitive: CardPrimitive) -> None:
+    """Deletes the EffectPrimitive entities belonging to a card
+    """
+    for effect in list(primitive.effects) + list(primitive.ally) + list(primitive.scrap):
+        effect.delete()
     return
 
 
@@ -357,13 +781,36 @@ def _populate_effects(effect_list, targets, actions) -> List[EffectPrimitive]:
     for effect in effect_list:
         e_target: TargetPrimitive = next(t for t in targets if t.name == effect['target'].upper())
         e_action: ActionPrimitive = next(a for a in actions if a.name == effect['action'].upper())
+        condition: Condition = compile_condition(effect.get('condition', {}))
         populated_effect: EffectPrimitive = EffectPrimitive(target=e_target,
                                                             action=e_action,
-                                                            value=int(effect['value']))
+                                                            value=int(effect['value']),
+                                                            condition=condition.source)
         effects.append(populated_effect)
     return effects
 
 
+def _add_missing_columns(path: str) -> None:
+    """Adds the columns introduced after a database file was generated
+
+    Pony creates missing tables and indexes but never alters an existing table. The
+    stored card hashes are cleared along with the change, so the next ``sync_db``
+    fills the new columns from ``cards.json``.
+    """
+    connection = sqlite3.connect(path)
+    try:
+        columns: List[str] = [row[1] for row in
+                              connection.execute('PRAGMA table_info(EffectPrimitive)')]
+        if columns and 'condition' not in columns:
+            connection.execute("ALTER TABLE EffectPrimitive "
+                               "ADD COLUMN condition TEXT NOT NULL DEFAULT '{}'")
+            connection.execute('DROP TABLE IF EXISTS CardDigest')
+            connection.commit()
+    finally:
+        connection.close()
+    return
+
+
 def _str_to_bool(string: str) -> bool:
     """Converts "true" to ``True`` and "false" to ``False``
     """
@@ -7,6 +7,7 @@
 
 from enum import Enum
 from functools import total_ordering
+from os import urandom
 from uuid import uuid4
 
 
@@ -24,6 +25,8 @@ class Card(object):
     ----------
     uuid : str
         A unique identifier for this instance of this card
+    template_id : int
+        The identifier of the card's template (shared by every instance of the card)
     name : str
         A display name for the card
     faction : CardFaction
@@ -47,9 +50,13 @@ class Card(object):
     ----
     Different instances of a single card i.e. different Vipers will have
     different UUIDs
+
+    When pickled, a card is reduced to its template id and UUID, and is rebuilt
+    from the process-local ``CardCatalog`` when unpickled.
     """
     def __init__(self, card_primitive, uuid):
         self.uuid: str = uuid
+        self.template_id: int = card_primitive.id
         self.name: str = card_primitive.name
         self.faction: CardFaction = CardFaction.from_primitive(card_primitive.faction)
         self.base: bool = card_primitive.base
@@ -61,6 +68,55 @@ class Card(object):
         self.effects_scrap: [CardEffect] = [CardEffect(e) for e in card_primitive.scrap]
         return
 
+    @classmethod
+    def from_template(cls, template, uuid) -> 'Card':
+        """Creates a card from a ``CardTemplate`` without touching the ORM
+
+        Parameters
+        ----------
+        template : CardTemplate
+            The template from the card catalog
+        uuid : str
+            A unique identifier to assign to the card
+
+        Returns
+        -------
+        Card
+            A new instance of the card
+        """
+        card: Card = cls.__new__(cls)
+        card.uuid = uuid
+        card.template_id = template.id
+        card.name = template.name
+        card.faction = template.faction
+        card.base = template.base
+        card.outpost = template.outpost
+        card.defense = template.defense
+        card.cost = template.cost
+        card.effects_basic = [CardEffect.from_template(e) for e in template.effects_basic]
+        card.effects_ally = [CardEffect.from_template(e) for e in template.effects_ally]
+        card.effects_scrap = [CardEffect.from_template(e) for e in template.effects_scrap]
+        return card
+
+    def __reduce__(self):
+        return _rebuild_card, (self.template_id, self.uuid)
+
+
+def random_hex() -> str:
+    """Produces a random 128-bit identifier formatted like ``uuid4().hex``
+
+    This skips the construction of a ``UUID`` object, which dominates the cost of
+    dealing cards from the catalog.
+    """
+    return urandom(16).hex()
+
+
+def _rebuild_card(template_id: int, uuid: str) -> Card:
+    """Rebuilds a pickled card from the process-local catalog
+    """
+    from .catalog import local_catalog
+    return local_catalog().new_card(template_id, uuid)
+
 
 class CardFaction(Enum):
     """The set of allowed card factions
@@ -127,14 +183,30 @@ class CardEffect(object):
         The type of action to apply
     value : int
         The value associated with the action
+    condition : Condition
+        The compiled condition under which the effect applies
     """
     def __init__(self, effect_primitive):
+        from .conditions import parse_condition
         self.target: CardTarget = CardTarget.from_primitive(effect_primitive.target)
         self.action: CardAction = CardAction.from_primitive(effect_primitive.action)
         self.value: int = effect_primitive.value
+        self.condition = parse_condition(effect_primitive.condition)
         self.uuid = uuid4().hex
         return
 
+    @classmethod
+    def from_template(cls, template) -> 'CardEffect':
+        """Creates an effect from an ``EffectTemplate``, assigning it a new UUID
+        """
+        effect: CardEffect = cls.__new__(cls)
+        effect.target = template.target
+        effect.action = template.action
+        effect.value = template.value
+        effect.condition = template.condition
+        effect.uuid = random_hex()
+        return effect
+
 
 class CardTarget(Enum):
     """The receiver of a card's effect
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: cardsets
+    :synopsis: Expansion card sets, loaded on first use and shared by every game
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+
+A card-set file is a JSON object holding the set's name, number and version, and
+its cards in the format of ``cards.json``::
+
+    {"set": "colony-wars", "number": 1, "version": "2018.1", "cards": [...]}
+
+The cards of set ``n`` receive the template ids ``n * SET_STRIDE + 1`` onwards, so
+a template id identifies its set without any lookup and ids stay stable whatever
+other sets are loaded. The cards of the database, i.e. ``cards.json``, form the
+``core`` set, number 0.
+"""
+
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+from .cards import Card
+from .catalog import CardCatalog, _template_from_json, local_catalog
+from .exceptions import CardSetNotFoundError, CatalogFormatError
+
+CardList = List[Card]
+
+SET_STRIDE: int = 1024
+"""The number of template ids reserved for each set"""
+
+CORE: str = 'core'
+"""The name of the set holding the cards of the card database"""
+
+_FILENAME = re.compile(r'^(\d+)-([\w-]+)\.json$')
+
+
+class CardSet(object):
+    """A loaded card set
+
+    Attributes
+    ----------
+    name : str
+        The name of the set
+    number : int
+        The number of the set, which determines its template ids
+    version : str
+        The version of the set's card data
+    catalog : CardCatalog
+        The templates of the set
+    """
+    def __init__(self, name: str, number: int, version: str, catalog: CardCatalog):
+        self.name: str = name
+        self.number: int = number
+        self.version: str = version
+        self.catalog: CardCatalog = catalog
+        return
+
+    def main_deck_cards(self) -> CardList:
+        """Produces the (unshuffled) main-deck cards contributed by the set
+        """
+        return self.catalog.main_deck_cards()
+
+    def __repr__(self) -> str:
+        return f"CardSet({self.name!r}, {self.number}, {self.version!r})"
+
+
+class CardSetRegistry(object):
+    """Knows where every card set lives and loads each one the first time it is used
+
+    Registering a set only records its file; nothing is read until the set is
+    requested, so games only pay for the sets they use. A loaded set is kept and
+    shared by every game in the process.
+    """
+    def __init__(self):
+        self._sources: Dict[str, Tuple[int, str]] = {}
+        self._names: Dict[int, str] = {0: CORE}
+        self._loaded: Dict[str, CardSet] = {}
+        self._lock = threading.Lock()
+        return
+
+    def register(self, name: str, number: int, path: str) -> None:
+        """Makes a card-set file available under the given name
+
+        Parameters
+        ----------
+        name : str
+            The name of the set
+        number : int
+            The number of the set, which must be unique and positive
+        path : str
+            The path of the card-set file
+
+        Raises
+        ------
+        ValueError
+            Raised when the name or number is already taken by another set, or when
+            the set was already loaded from another file
+        """
+        if not 0 < number < 0x10000 // SET_STRIDE:
+            raise ValueError(f"Set numbers range from 1 to {0x10000 // SET_STRIDE - 1}")
+        path = os.path.abspath(path)
+        with self._lock:
+            registered: Tuple[int, str] = self._sources.get(name, (number, path))
+            taken: bool = self._names.get(number, name) != name or registered[0] != number
+            if taken or name == CORE:
+                raise ValueError(f"Set number {number} or name {name!r} is already taken")
+            if name in self._loaded and registered[1] != path:
+                raise ValueError(f"Set {name!r} is already loaded from {registered[1]}")
+            self._sources[name] = (number, path)
+            self._names[number] = name
+        return
+
+    def discover(self, directory: str) -> List[str]:
+        """Registers every file named ``<number>-<name>.json`` in a directory
+
+        Returns
+        -------
+        [str]
+            The names of the sets that were registered
+        """
+        names: List[str] = []
+        for filename in sorted(os.listdir(directory)):
+            match = _FILENAME.match(filename)
+            if match is not None:
+                self.register(match.group(2), int(match.group(1)),
+                              os.path.join(directory, filename))
+                names.append(match.group(2))
+        return names
+
+    @property
+    def available(self) -> List[str]:
+        """The names of every known set, loaded or not
+        """
+        return [CORE] + sorted(self._sources)
+
+    @property
+    def loaded(self) -> List[str]:
+        """The names of the expansion sets loaded so far
+        """
+        return sorted(self._loaded)
+
+    def get(self, name: str) -> CardSet:
+        """Produces a set, loading it if this is the first time it is used
+
+        The ``core`` set always wraps the current process-local catalog, so it
+        follows ``reload_catalog`` and its version is the catalog's version.
+
+        Raises
+        ------
+        CardSetNotFoundError
+            Raised when no set has the given name
+        CatalogFormatError
+            Raised when the set's file does not describe the registered set
+        """
+        if name == CORE:
+            catalog: CardCatalog = local_catalog()
+            return CardSet(CORE, 0, str(catalog.version), catalog)
+        card_set: Optional[CardSet] = self._loaded.get(name)
+        if card_set is None:
+            with self._lock:
+                card_set = self._loaded.get(name)
+                if card_set is None:
+                    card_set = self._load(name)
+                    self._loaded[name] = card_set
+        return card_set
+
+    def for_template(self, template_id: int) -> CardSet:
+        """Produces the set a template id belongs to
+        """
+        try:
+            name: str = self._names[template_id // SET_STRIDE]
+        except KeyError:
+            raise CardSetNotFoundError(template_id // SET_STRIDE)
+        return self.get(name)
+
+    def _load(self, name: str) -> CardSet:
+        try:
+            number, path = self._sources[name]
+        except KeyError:
+            raise CardSetNotFoundError(name)
+        with open(path, encoding='utf-8') as f:
+            data: dict = json.load(f)
+        if data.get('set') != name or data.get('number') != number:
+            raise CatalogFormatError(f"{path} does not hold set {number} ({name})")
+        cards: List[dict] = data['cards']
+        if len(cards) >= SET_STRIDE:
+            raise CatalogFormatError(f"Set {name} has more than {SET_STRIDE - 1} cards")
+        first: int = number * SET_STRIDE
+        catalog = CardCatalog([_template_from_json(first + i, c) for i, c in enumerate(cards, 1)])
+        return CardSet(name, number, str(data['version']), catalog)
+
+
+_registry = CardSetRegistry()
+
+
+def card_sets() -> CardSetRegistry:
+    """Produces the registry of card sets belonging to the current process
+    """
+    return _registry
@@ -0,0 +1,524 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: catalog
+    :synopsis: An in-memory, process-local snapshot of the card templates
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+"""
+
+import json
+import threading
+import weakref
+from array import array
+from itertools import count
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from pony.orm import db_session, select
+from .cardrepo import CardPrimitive, CardRepo, _read_cards_json, process_backend
+from .cards import Card, CardAction, CardFaction, CardTarget, random_hex
+from .conditions import Condition, compile_condition, parse_condition
+from .exceptions import RealmsException, TemplateNotFoundError
+
+CardList = List[Card]
+
+PackedCards = Tuple[bytes, Tuple[str, ...]]
+"""A list of cards reduced to an array of template ids and a tuple of UUIDs"""
+
+
+EffectTemplate = NamedTuple('EffectTemplate', [
+                            ('target', CardTarget),
+                            ('action', CardAction),
+                            ('value', int),
+                            ('condition', Condition)])
+
+
+CardTemplate = NamedTuple('CardTemplate', [
+                          ('id', int),
+                          ('name', str),
+                          ('faction', CardFaction),
+                          ('base', bool),
+                          ('outpost', bool),
+                          ('defense', int),
+                          ('cost', int),
+                          ('count', int),
+                          ('effects_basic', Tuple[EffectTemplate, ...]),
+                          ('effects_ally', Tuple[EffectTemplate, ...]),
+                          ('effects_scrap', Tuple[EffectTemplate, ...])])
+
+
+class CardCatalog(object):
+    """An immutable, in-memory collection of card templates
+
+    The catalog is read from the database once and then produces new cards
+    without touching the ORM. It provides the same card-producing methods as
+    ``CardRepo``, so it can be handed to ``MainDeck`` and ``TradeRow`` in place
+    of a repository.
+
+    Parameters
+    ----------
+    templates : List[CardTemplate]
+        The templates that make up the catalog
+
+    Attributes
+    ----------
+    arrays : CatalogArrays
+        The flat array encoding of the catalog, if it was built from one (e.g. when
+        attached from shared memory), otherwise ``None``
+    version : int
+        The version number assigned when the catalog was installed as the
+        process-local catalog, otherwise 0
+    """
+    def __init__(self, templates: List[CardTemplate]):
+        self._templates: Dict[int, CardTemplate] = {t.id: t for t in templates}
+        self._by_name: Dict[str, CardTemplate] = {t.name: t for t in templates}
+        self._json: Dict[int, str] = {t.id: _json_prefix(t) for t in templates}
+        self._compiled: dict = {}
+        self._encoded: Optional[bytes] = None
+        self.arrays = None
+        self.version: int = 0
+        return
+
+    @classmethod
+    @db_session
+    def from_db(cls) -> 'CardCatalog':
+        """Builds a catalog from the ``CardPrimitive`` entities in the bound database
+
+        Returns
+        -------
+        CardCatalog
+            A catalog containing one template per ``CardPrimitive``
+        """
+        primitives = select(c for c in CardPrimitive).order_by(CardPrimitive.id)
+        return cls([_template_from_primitive(p) for p in primitives])
+
+    @classmethod
+    def from_json(cls, cards: List[dict]) -> 'CardCatalog':
+        """Builds a catalog from card definitions in the format of ``cards.json``
+
+        Templates are numbered from 1 in the order of the definitions, as they are
+        when the definitions are loaded into the database.
+        """
+        return cls([_template_from_json(i, c) for i, c in enumerate(cards, 1)])
+
+    @property
+    def templates(self) -> List[CardTemplate]:
+        """The templates in the catalog, ordered by id
+        """
+        return [self._templates[k] for k in sorted(self._templates)]
+
+    def template(self, template_id: int) -> CardTemplate:
+        """Produces the template with the given id
+
+        Templates of other card sets are looked up in the set they belong to, which
+        is loaded if needed, so cards from any set can be rebuilt from any catalog.
+
+        Raises
+        ------
+        TemplateNotFoundError
+            Raised when no template has the requested id
+        """
+        try:
+            return self._templates[template_id]
+        except KeyError:
+            pass
+        from .cardsets import card_sets
+        try:
+            owner: CardCatalog = card_sets().for_template(template_id).catalog
+        except RealmsException:
+            owner = self
+        if owner is self:
+            raise TemplateNotFoundError(template_id)
+        return owner.template(template_id)
+
+    def compiled_effects(self, template_id: int):
+        """Produces the effects of a template compiled into functions
+
+        Each template is compiled the first time its effects are requested and kept
+        by the catalog.
+
+        Returns
+        -------
+        CompiledEffects
+            See ``realms.effects``
+
+        Raises
+        ------
+        TemplateNotFoundError
+            Raised when no template has the requested id
+        """
+        compiled = self._compiled.get(template_id)
+        if compiled is None:
+            from .effects import compile_effects
+            compiled = self._compiled.setdefault(template_id,
+                                                 compile_effects(self.template(template_id)))
+        return compiled
+
+    def named_template(self, cardname: str) -> CardTemplate:
+        """Produces the template with the given card name
+
+        Raises
+        ------
+        TemplateNotFoundError
+            Raised when no template has the requested name
+        """
+        try:
+            return self._by_name[cardname]
+        except KeyError:
+            raise TemplateNotFoundError(cardname)
+
+    def new_card(self, template_id: int, uuid: Optional[str] = None) -> Card:
+        """Produces a new instance of the card with the given template id
+
+        Parameters
+        ----------
+        template_id : int
+            The id of the card's template
+        uuid : str (Optional)
+            The UUID to assign to the card (a new one is generated by default)
+        """
+        if uuid is None:
+            uuid = random_hex()
+        return Card.from_template(self.template(template_id), uuid)
+
+    def _named_card(self, cardname: str) -> Card:
+        """Produces a new instance of a card with the given name
+        """
+        return Card.from_template(self.named_template(cardname), random_hex())
+
+    def new_viper(self) -> Card:
+        """Produces a new instance of a Viper card
+        """
+        return self._named_card('Viper')
+
+    def new_scout(self) -> Card:
+        """Produces a new instance of a Scout card
+        """
+        return self._named_card('Scout')
+
+    def new_explorer(self) -> Card:
+        """Produces a new instance of an Explorer card
+        """
+        return self._named_card('Explorer')
+
+    def main_deck_cards(self) -> CardList:
+        """Produces the (unshuffled) list of cards suitable for the main deck
+        """
+        return [Card.from_template(t, random_hex())
+                for t in self.templates if t.count != 0
+                for _ in range(t.count)]
+
+    def player_deck_cards(self, n_players: Optional[int] = None):
+        """Produces the (unshuffled) cards of players' starting decks
+
+        Parameters
+        ----------
+        n_players : int (Optional)
+            The number of decks to deal in one pass (Default is a single deck)
+
+        Returns
+        -------
+        [Card] or [[Card]]
+            The cards of a single deck when ``n_players`` is not given, otherwise one
+            list of cards per player
+        """
+        decks: List[CardList] = _deal_starting_decks(self.named_template('Scout'),
+                                                     self.named_template('Viper'),
+                                                     n_players or 1)
+        return decks[0] if n_players is None else decks
+
+    def pack(self, cards: CardList) -> PackedCards:
+        """Reduces a list of cards to their template ids and UUIDs
+
+        See Also
+        --------
+        pack_cards
+        """
+        return pack_cards(cards)
+
+    def unpack(self, packed: PackedCards) -> CardList:
+        """Rebuilds a list of cards packed with ``pack_cards``
+
+        Note
+        ----
+        The ``CardEffect`` objects of the rebuilt cards receive new UUIDs, since
+        effect UUIDs are only meaningful within the process that created them.
+        Collect ``EffectRecord``s after the cards have been transferred.
+        """
+        ids, uuids = packed
+        template_ids = array('H')
+        template_ids.frombytes(ids)
+        return [Card.from_template(self.template(t), u) for t, u in zip(template_ids, uuids)]
+
+    def card_json(self, card: Card) -> str:
+        """The client-facing JSON representation of a card
+
+        The representation of each template is serialized once, when the catalog is
+        built, so producing the JSON of a card only splices in its UUID. UUIDs are
+        hexadecimal strings, so they never need escaping.
+
+        Examples
+        --------
+        >>> catalog.card_json(catalog.new_scout())
+        '{"template":44,"name":"Scout",...,"uuid":"5f0c..."}'
+        """
+        return self._prefix(card.template_id) + card.uuid + '"}'
+
+    def cards_json(self, cards: CardList) -> str:
+        """The JSON array of the client-facing representations of a list of cards
+        """
+        fragments: Dict[int, str] = self._json
+        try:
+            return '[' + ','.join([fragments[c.template_id] + c.uuid + '"}' for c in cards]) + ']'
+        except KeyError:
+            return '[' + ','.join([self.card_json(c) for c in cards]) + ']'
+
+    def _prefix(self, template_id: int) -> str:
+        """The serialized template, for templates of this and other card sets
+        """
+        try:
+            return self._json[template_id]
+        except KeyError:
+            prefix: str = _json_prefix(self.template(template_id))
+            self._json[template_id] = prefix
+            return prefix
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def __contains__(self, template_id) -> bool:
+        return template_id in self._templates
+
+    def __reduce__(self):
+        """Reduces the catalog to its version and the flat array encoding of its
+        templates, see ``realms.sharedcatalog``
+
+        Unpickling produces the catalog of the process with the same version and
+        templates, if there is one, so that the copies of a game share a catalog and
+        its compiled effects.
+        """
+        encoded: bytes = self.encoded()
+        _by_encoding.setdefault((self.version, encoded), self)
+        return _restore_catalog, (self.version, encoded)
+
+    def encoded(self) -> bytes:
+        """The flat array encoding of the templates, computed once
+        """
+        if self._encoded is None:
+            from .sharedcatalog import CatalogArrays
+            arrays = self.arrays
+            self._encoded = (bytes(arrays.buffer[:arrays.nbytes]) if arrays is not None
+                             else CatalogArrays.encode(self))
+        return self._encoded
+
+
+def pack_cards(cards: CardList) -> PackedCards:
+    """Reduces a list of cards to an array of template ids and a tuple of UUIDs
+
+    Parameters
+    ----------
+    cards : List[Card]
+        The cards to pack
+
+    Returns
+    -------
+    PackedCards
+        The template ids as the bytes of an unsigned short array, and the UUIDs
+    """
+    template_ids = array('H', [c.template_id for c in cards])
+    return template_ids.tobytes(), tuple(c.uuid for c in cards)
+
+
+_local_catalog: Optional[CardCatalog] = None
+_local_catalog_lock = threading.Lock()
+_versions = count(1)
+_live_versions: 'weakref.WeakValueDictionary[int, CardCatalog]' = weakref.WeakValueDictionary()
+_by_encoding: 'weakref.WeakValueDictionary[Tuple[int, bytes], CardCatalog]' = \
+    weakref.WeakValueDictionary()
+
+
+def local_catalog() -> CardCatalog:
+    """Produces the catalog belonging to the current process
+
+    The catalog is built from ``process_backend()`` the first time it is requested,
+    so a process that only uses the JSON backend never opens a database.
+    Objects that were pickled in another process are rebuilt from it. Callers that
+    keep the catalog, such as the decks of a game, keep using that version after
+    the catalog is reloaded.
+
+    Returns
+    -------
+    CardCatalog
+        The process-local catalog
+    """
+    global _local_catalog
+    if _local_catalog is None:
+        with _local_catalog_lock:
+            if _local_catalog is None:
+                _local_catalog = _versioned(CardRepo().backend.catalog())
+    return _local_catalog
+
+
+def install_catalog(catalog: Optional[CardCatalog]) -> None:
+    """Replaces the process-local catalog
+
+    Useful as a ``multiprocessing`` pool initializer so that workers do not
+    need to touch the database at all.
+
+    Parameters
+    ----------
+    catalog : CardCatalog
+        The catalog to use in this process, or ``None`` to rebuild it on demand
+    """
+    global _local_catalog
+    with _local_catalog_lock:
+        _local_catalog = _versioned(catalog) if catalog is not None else None
+    return
+
+
+def reload_catalog(path: Optional[str] = None) -> CardCatalog:
+    """Loads the card data again and makes it the process-local catalog
+
+    The new catalog is built before the swap, which is a single assignment, so
+    callers of ``local_catalog`` never wait on the reload. Games in progress keep
+    the catalog they started with; a version is freed once nothing refers to it.
+
+    Parameters
+    ----------
+    path : str (Optional)
+        A file in the format of ``cards.json`` to load (Default is to reload the
+        card backend)
+
+    Returns
+    -------
+    CardCatalog
+        The newly installed catalog
+    """
+    if path is not None:
+        catalog: CardCatalog = CardCatalog.from_json(_read_cards_json(path))
+    else:
+        catalog = CardRepo().backend.reload()
+    install_catalog(catalog)
+    return catalog
+
+
+def catalog_of(cards) -> CardCatalog:
+    """The catalog of a source of cards
+
+    Parameters
+    ----------
+    cards : CardRepo or CardCatalog
+        The source of the cards of a game
+
+    Returns
+    -------
+    CardCatalog
+        ``cards`` itself when it is a catalog, the process-local catalog for a
+        repository of the process's backend, whose version is then the one the cards
+        were dealt from, and otherwise the catalog of the repository's backend
+    """
+    if isinstance(cards, CardCatalog):
+        return cards
+    if cards.backend == process_backend():
+        return local_catalog()
+    return cards.backend.catalog()
+
+
+def live_versions() -> List[int]:
+    """The versions of the process-local catalog that are still referenced
+    """
+    return sorted(_live_versions.keys())
+
+
+def _versioned(catalog: CardCatalog) -> CardCatalog:
+    """Assigns the next version number to a catalog that is about to be installed
+    """
+    if not catalog.version:
+        catalog.version = next(_versions)
+    _live_versions[catalog.version] = catalog
+    return catalog
+
+
+def _restore_catalog(version: int, encoded: bytes) -> CardCatalog:
+    """Rebuilds a pickled catalog, reusing the catalog of the process that has the same
+    version and encoding
+    """
+    catalog: Optional[CardCatalog] = _by_encoding.get((version, encoded))
+    if catalog is None:
+        from .sharedcatalog import CatalogArrays
+        catalog = CatalogArrays(encoded).lazy_catalog()
+        catalog.version = version
+        catalog._encoded = encoded
+        catalog = _by_encoding.setdefault((version, encoded), catalog)
+    return catalog
+
+
+def _deal_starting_decks(scout: CardTemplate, viper: CardTemplate,
+                         n_players: int) -> List[CardList]:
+    """Deals the starting decks of a table: eight Scouts and two Vipers per player
+    """
+    new = Card.from_template
+    templates: List[CardTemplate] = [scout] * 8 + [viper] * 2
+    return [[new(t, random_hex()) for t in templates] for _ in range(n_players)]
+
+
+def _json_prefix(template: CardTemplate) -> str:
+    """Serializes everything but the UUID of a card, leaving the UUID string open
+    """
+    def effects(slot: Tuple[EffectTemplate, ...]) -> List[list]:
+        return [[e.target.name, e.action.name, e.value] for e in slot]
+
+    payload: dict = {'template': template.id,
+                     'name': template.name,
+                     'faction': template.faction.value,
+                     'base': template.base,
+                     'outpost': template.outpost,
+                     'defense': template.defense,
+                     'cost': template.cost,
+                     'effects': {'basic': effects(template.effects_basic),
+                                 'ally': effects(template.effects_ally),
+                                 'scrap': effects(template.effects_scrap)}}
+    return json.dumps(payload, separators=(',', ':'))[:-1] + ',"uuid":"'
+
+
+def _template_from_json(template_id: int, card: dict) -> CardTemplate:
+    """Converts a card definition from ``cards.json`` into a ``CardTemplate``
+    """
+    def effects(definitions: List[dict]) -> Tuple[EffectTemplate, ...]:
+        return tuple(EffectTemplate(target=CardTarget[e['target'].upper()],
+                                    action=CardAction[e['action'].upper()],
+                                    value=int(e['value']),
+                                    condition=compile_condition(e.get('condition', {})))
+                     for e in definitions)
+
+    return CardTemplate(id=template_id,
+                        name=card['name'],
+                        faction=CardFaction(card['faction']),
+                        base=card['base'] == 'true',
+                        outpost=card['outpost'] == 'true',
+                        defense=int(card['defense']),
+                        cost=int(card['cost']),
+                        count=int(card['count']),
+                        effects_basic=effects(card['effects']),
+                        effects_ally=effects(card['ally']),
+                        effects_scrap=effects(card['scrap']))
+
+
+def _template_from_primitive(primitive) -> CardTemplate:
+    """Converts a ``CardPrimitive`` entity into a ``CardTemplate``
+    """
+    def effects(primitives) -> Tuple[EffectTemplate, ...]:
+        return tuple(EffectTemplate(target=CardTarget.from_primitive(e.target),
+                                    action=CardAction.from_primitive(e.action),
+                                    value=e.value,
+                                    condition=parse_condition(e.condition))
+                     for e in sorted(primitives, key=lambda e: e.id))
+
+    return CardTemplate(id=primitive.id,
+                        name=primitive.name,
+                        faction=CardFaction.from_primitive(primitive.faction),
+                        base=primitive.base,
+                        outpost=primitive.outpost,
+                        defense=primitive.defense,
+                        cost=primitive.cost,
+                        count=primitive.count,
+                        effects_basic=effects(primitive.effects),
+                        effects_ally=effects(primitive.ally),
+                        effects_scrap=effects(primitive.scrap))
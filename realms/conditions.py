@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: conditions
+    :synopsis: Conditions on card effects, compiled to predicates and to integer codes
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+
+The ``condition`` of an effect in ``cards.json`` states what must be in play for the
+effect to apply::
+
+    {}                          always holds
+    {"bases": 2}                at least two bases are in play
+    {"outposts": 1}             likewise for outposts, ships (non-bases) and cards
+    {"faction": {"Blob": 2}}    at least two Blob cards are in play
+    {"not": {...}}              the inner condition does not hold
+    {"all": [{...}, ...]}       every inner condition holds
+    {"any": [{...}, ...]}       at least one inner condition holds
+
+An object with several keys holds when each of them does. The cards in play are those
+of the hand being processed, including the bases carried over from previous turns and
+the card providing the effect.
+
+A condition is encoded once, when the catalog is loaded, as a short sequence of
+integers in postfix order: ``OP_AT_LEAST counter n`` pushes ``counts[counter] >= n``,
+``OP_NOT`` negates the top of the stack, and ``OP_ALL k``/``OP_ANY k`` replace the top
+``k`` entries with their conjunction/disjunction. An empty sequence always holds. The
+codes are what ``CatalogArrays`` stores, and a ``Condition`` compiles them into nested
+closures, so evaluating a condition while processing a hand is a single call on the
+hand's counts.
+"""
+
+import json
+from typing import Callable, Dict, List, Sequence, Tuple
+from .cards import CardFaction
+from .exceptions import CatalogFormatError
+
+OP_AT_LEAST: int = 0
+OP_NOT: int = 1
+OP_ALL: int = 2
+OP_ANY: int = 3
+
+COUNTERS: Tuple[str, ...] = ('cards', 'ships', 'bases', 'outposts')
+"""The counters of a hand, followed in ``Counts`` by one counter per ``CardFaction``"""
+
+FACTIONS: List[CardFaction] = list(CardFaction)
+
+Counts = List[int]
+"""The number of cards in play of each kind, indexed like ``COUNTERS`` then ``FACTIONS``"""
+
+Codes = Tuple[int, ...]
+Predicate = Callable[[Counts], bool]
+
+_FACTION_COUNTERS: Dict[CardFaction, int] = {f: len(COUNTERS) + i for i, f in enumerate(FACTIONS)}
+_MAX_THRESHOLD: int = 0x7fff
+
+
+class Condition(object):
+    """A compiled effect condition
+
+    Conditions are interned: there is a single ``Condition`` per distinct sequence of
+    codes, so the templates of a catalog share them.
+
+    Attributes
+    ----------
+    codes : (int)
+        The encoded condition, empty when it always holds
+    source : str
+        The condition in canonical JSON form, as stored in the card database
+    test : Callable[[Counts], bool]
+        The compiled predicate
+    """
+    __slots__ = ('codes', 'source', 'test')
+
+    def __init__(self, codes: Codes):
+        self.codes: Codes = codes
+        self.source: str = json.dumps(_decode(codes), sort_keys=True, separators=(',', ':'))
+        self.test: Predicate = _compile(codes)
+        return
+
+    def __call__(self, counts: Counts) -> bool:
+        return self.test(counts)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Condition) and other.codes == self.codes
+
+    def __hash__(self) -> int:
+        return hash(self.codes)
+
+    def __reduce__(self):
+        return condition_from_codes, (self.codes,)
+
+    def __repr__(self) -> str:
+        return f"Condition({self.source})"
+
+
+_interned: Dict[Codes, Condition] = {}
+_parsed: Dict[str, Condition] = {}
+
+
+def condition_from_codes(codes: Sequence[int]) -> Condition:
+    """Produces the ``Condition`` for a sequence of codes
+    """
+    codes = tuple(codes)
+    condition = _interned.get(codes)
+    if condition is None:
+        condition = _interned.setdefault(codes, Condition(codes))
+    return condition
+
+
+def compile_condition(condition: dict) -> Condition:
+    """Compiles the ``condition`` object of an effect in ``cards.json``
+
+    Raises
+    ------
+    CatalogFormatError
+        Raised when the object is not a valid condition
+    """
+    return condition_from_codes(encode_condition(condition))
+
+
+def parse_condition(source: str) -> Condition:
+    """Compiles a condition stored as JSON, such as ``EffectPrimitive.condition``
+    """
+    condition = _parsed.get(source)
+    if condition is None:
+        condition = _parsed.setdefault(source, compile_condition(json.loads(source)))
+    return condition
+
+
+def encode_condition(condition: dict) -> Codes:
+    """Encodes a condition object as a sequence of codes
+
+    Raises
+    ------
+    CatalogFormatError
+        Raised when the object is not a valid condition
+    """
+    if condition == {}:
+        return ()
+    codes: List[int] = []
+    _encode(condition, codes)
+    return tuple(codes)
+
+
+def hand_counts(cards) -> Counts:
+    """Counts the cards in play of each kind
+
+    Parameters
+    ----------
+    cards : [Card]
+        The cards of a hand, carried-over bases included
+    """
+    counts: Counts = [0] * (len(COUNTERS) + len(FACTIONS))
+    for c in cards:
+        count_card(counts, c)
+    return counts
+
+
+def count_card(counts: Counts, card) -> None:
+    """Adds a card put in play to a hand's counts
+    """
+    counts[0] += 1
+    if card.base:
+        counts[2] += 1
+        if card.outpost:
+            counts[3] += 1
+    else:
+        counts[1] += 1
+    counts[_FACTION_COUNTERS[card.faction]] += 1
+    return
+
+
+def faction_count(counts: Counts, faction: CardFaction) -> int:
+    """The number of cards of a faction in play
+    """
+    return counts[_FACTION_COUNTERS[faction]]
+
+
+def evaluate_codes(codes: Sequence[int], counts: Counts) -> bool:
+    """Evaluates encoded conditions directly, without compiling them
+
+    This is meant for code working on ``CatalogArrays``, where ``codes`` is a slice of
+    ``CatalogArrays.condition_codes``.
+    """
+    stack: List[bool] = []
+    i: int = 0
+    while i < len(codes):
+        op: int = codes[i]
+        if op == OP_AT_LEAST:
+            stack.append(counts[codes[i + 1]] >= codes[i + 2])
+            i += 3
+        elif op == OP_NOT:
+            stack[-1] = not stack[-1]
+            i += 1
+        else:
+            k: int = codes[i + 1]
+            operands: List[bool] = stack[len(stack) - k:]
+            del stack[len(stack) - k:]
+            stack.append(all(operands) if op == OP_ALL else any(operands))
+            i += 2
+    return stack[-1] if stack else True
+
+
+def _encode(node: dict, codes: List[int]) -> None:
+    """Appends the codes of a condition object, which push exactly one entry
+    """
+    if not isinstance(node, dict):
+        raise CatalogFormatError(f"A condition must be an object, not {node!r}")
+    parts: int = sum(_encode_key(key, node[key], codes) for key in sorted(node))
+    if parts != 1:
+        codes += [OP_ALL, parts]
+    return
+
+
+def _encode_key(key: str, value, codes: List[int]) -> int:
+    """Appends the codes of a single key of a condition object
+
+    Returns
+    -------
+    int
+        The number of entries the codes push
+    """
+    if key in COUNTERS:
+        codes += [OP_AT_LEAST, COUNTERS.index(key), _threshold(value)]
+        return 1
+    if key == 'faction':
+        return _encode_factions(value, codes)
+    if key == 'not':
+        _encode(value, codes)
+        codes.append(OP_NOT)
+        return 1
+    if key in ('all', 'any'):
+        if not isinstance(value, list):
+            raise CatalogFormatError(f"Expected a list of conditions, not {value!r}")
+        for inner in value:
+            _encode(inner, codes)
+        codes += [OP_ALL if key == 'all' else OP_ANY, len(value)]
+        return 1
+    raise CatalogFormatError(f"Unknown condition {key!r}")
+
+
+def _encode_factions(thresholds: dict, codes: List[int]) -> int:
+    """Appends the codes of the ``faction`` key of a condition object
+    """
+    if not isinstance(thresholds, dict) or not thresholds:
+        raise CatalogFormatError(f"Expected faction thresholds, not {thresholds!r}")
+    for name in sorted(thresholds):
+        try:
+            faction = CardFaction(name)
+        except ValueError:
+            raise CatalogFormatError(f"Unknown faction {name!r} in a condition")
+        codes += [OP_AT_LEAST, _FACTION_COUNTERS[faction], _threshold(thresholds[name])]
+    return len(thresholds)
+
+
+def _threshold(value) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= _MAX_THRESHOLD:
+        raise CatalogFormatError(f"A condition threshold must be a small count, not {value!r}")
+    return value
+
+
+def _decode(codes: Codes) -> dict:
+    """Rebuilds a condition object from its codes
+    """
+    stack: List[dict] = []
+    i: int = 0
+    while i < len(codes):
+        op: int = codes[i]
+        if op == OP_AT_LEAST:
+            counter, n = codes[i + 1], codes[i + 2]
+            if counter < len(COUNTERS):
+                stack.append({COUNTERS[counter]: n})
+            else:
+                stack.append({'faction': {FACTIONS[counter - len(COUNTERS)].value: n}})
+            i += 3
+        elif op == OP_NOT:
+            stack[-1] = {'not': stack[-1]}
+            i += 1
+        else:
+            k: int = codes[i + 1]
+            operands: List[dict] = stack[len(stack) - k:]
+            del stack[len(stack) - k:]
+            stack.append({'all' if op == OP_ALL else 'any': operands})
+            i += 2
+    return stack[-1] if stack else {}
+
+
+def _always(counts: Counts) -> bool:
+    return True
+
+
+def _compile(codes: Codes) -> Predicate:
+    """Turns codes into nested closures, resolving every operand ahead of time
+    """
+    stack: List[Predicate] = []
+    i: int = 0
+    while i < len(codes):
+        op: int = codes[i]
+        if op == OP_AT_LEAST:
+            stack.append(_at_least(codes[i + 1], codes[i + 2]))
+            i += 3
+        elif op == OP_NOT:
+            stack[-1] = _negation(stack[-1])
+            i += 1
+        else:
+            k: int = codes[i + 1]
+            operands: Tuple[Predicate, ...] = tuple(stack[len(stack) - k:])
+            del stack[len(stack) - k:]
+            stack.append(_conjunction(operands) if op == OP_ALL else _disjunction(operands))
+            i += 2
+    return stack[-1] if stack else _always
+
+
+def _at_least(counter: int, n: int) -> Predicate:
+    return lambda counts: counts[counter] >= n
+
+
+def _negation(predicate: Predicate) -> Predicate:
+    return lambda counts: not predicate(counts)
+
+
+def _conjunction(predicates: Tuple[Predicate, ...]) -> Predicate:
+    if len(predicates) == 2:
+        first, second = predicates
+        return lambda counts: first(counts) and second(counts)
+    return lambda counts: all(p(counts) for p in predicates)
+
+
+def _disjunction(predicates: Tuple[Predicate, ...]) -> Predicate:
+    if len(predicates) == 2:
+        first, second = predicates
+        return lambda counts: first(counts) or second(counts)
+    return lambda counts: any(p(counts) for p in predicates)
@@ -5,8 +5,8 @@
 .. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
 """
 
-from random import shuffle
-from typing import List
+from random import shuffle, getrandbits, Random
+from typing import Dict, List, Optional, Tuple
 from .cards import (
     Card,
     CardFaction,
@@ -15,6 +15,12 @@ from .cards import (
     CardTarget
 )
 from .cardrepo import CardRepo
+from .cardsets import CORE, card_sets
+from .catalog import CardCatalog, catalog_of, local_catalog, pack_cards
+from .conditions import Counts, hand_counts
+from .effects import PlayerState
+from .events import EventKind, EventLog
+from .handbatch import HandTotals, hand_table
 from .exceptions import (
     RealmsException,
     MainDeckEmpty,
@@ -53,6 +59,9 @@ class PlayerDeck(object):
     ----------
     player_cards : List[Card]
         The list of cards from which the player's starting deck will be constructed
+    catalog : CardCatalog (Optional)
+        The catalog the cards were dealt from, which rebuilds them when the deck is
+        unpickled (Default is the process-local catalog)
 
     Raises
     ------
@@ -63,8 +72,11 @@ class PlayerDeck(object):
     """
 
     starting_size = 10
+    _log: EventLog = None
+    _zone: str = None
+    _rng: Random = None
 
-    def __init__(self, player_cards: CardList):
+    def __init__(self, player_cards: CardList, catalog: Optional[CardCatalog] = None):
         try:
             self._validate_deck_size(player_cards)
             self._validate_deck_contents(player_cards)
@@ -73,6 +85,7 @@ class PlayerDeck(object):
         self._undrawn: CardList = player_cards
         shuffle(self._undrawn)  # shuffled in place
         self._discards: CardList = []
+        self._catalog: CardCatalog = catalog if catalog is not None else local_catalog()
 
     @staticmethod
     def _validate_deck_size(cards: CardList) -> None:
@@ -132,13 +145,14 @@ class PlayerDeck(object):
             Raised when attempting to draw a card while both undrawn and discard
             piles are empty
         """
-        if len(self._undrawn) > 0:
-            return self._undrawn.pop()
-        elif len(self._discards) > 0:
+        if len(self._undrawn) == 0:
+            if len(self._discards) == 0:
+                raise PlayerDeckEmpty
             self._refill_undrawn()
-            return self._undrawn.pop()
-        else:
-            raise PlayerDeckEmpty
+        card: Card = self._undrawn.pop()
+        if self._log is not None:
+            self._log.record(EventKind.DRAW, self._zone, card.template_id, card.uuid)
+        return card
 
     @property
     def cards_remaining(self) -> int:
@@ -157,11 +171,15 @@ class PlayerDeck(object):
         Note
         ----
         The cards in the discard pile are shuffled before being placed
-        back into the undrawn pile
+        back into the undrawn pile. The shuffle is driven by a fresh seed
+        so that it can be recorded and replayed.
         """
+        seed: int = getrandbits(32) if self._rng is None else self._rng.getrandbits(32)
         self._undrawn: CardList = self._discards
-        shuffle(self._undrawn)  # shuffled in place
+        Random(seed).shuffle(self._undrawn)  # shuffled in place
         self._discards: CardList = []
+        if self._log is not None:
+            self._log.record(EventKind.RESHUFFLE, self._zone, seed)
         return
 
     def discard(self, card: Card) -> None:
@@ -173,6 +191,8 @@ class PlayerDeck(object):
             The card to send to the discard pile
         """
         self._discards.append(card)
+        if self._log is not None:
+            self._log.record(EventKind.DISCARD, self._zone, card.template_id, card.uuid)
         return
 
     def draw(self, num=5) -> CardList:
@@ -215,6 +235,41 @@ class PlayerDeck(object):
         """
         pass
 
+    def fork(self, rng: Optional[Random] = None) -> 'PlayerDeck':
+        """Copies the piles of the deck into a deck that is not logged
+
+        Parameters
+        ----------
+        rng : Random (Optional)
+            Seeds the reshuffles of the copy (Default is the global generator)
+        """
+        deck: PlayerDeck = PlayerDeck.__new__(PlayerDeck)
+        deck._undrawn = list(self._undrawn)
+        deck._discards = list(self._discards)
+        deck._catalog = self._catalog
+        deck._rng = rng
+        return deck
+
+    def _piles(self) -> Dict[str, CardList]:
+        """The piles of cards held by the deck, keyed by name
+        """
+        return {'undrawn': self._undrawn, 'discards': self._discards}
+
+    def __getstate__(self) -> dict:
+        """Reduces the deck to its catalog and the template ids and UUIDs of its cards
+        """
+        return {'catalog': self._catalog,
+                'undrawn': pack_cards(self._undrawn),
+                'discards': pack_cards(self._discards)}
+
+    def __setstate__(self, state: dict) -> None:
+        """Rebuilds the deck from the catalog it was dealt from
+        """
+        catalog = self._catalog = state['catalog']
+        self._undrawn = catalog.unpack(state['undrawn'])
+        self._discards = catalog.unpack(state['discards'])
+        return
+
 
 class MainDeck(object):
     """The deck from which players can acquire cards
@@ -223,10 +278,24 @@ class MainDeck(object):
     ----------
     cardrepo : CardRepo
         The repository from which the cards are obtained
+    sets : List[str] (Optional)
+        The names of the card sets the deck is composed of (Default is the cards of
+        the repository alone, which are also the ``core`` set). Sets are loaded on
+        first use and shared by every game.
     """
-    def __init__(self, cardrepo: CardRepo):
+
+    _log: EventLog = None
+    _zone: str = None
+
+    def __init__(self, cardrepo: CardRepo, sets: Optional[List[str]] = None):
         self._repo: CardRepo = cardrepo
-        self._cards: CardList = self._repo.main_deck_cards()
+        self._catalog: CardCatalog = catalog_of(cardrepo)
+        if sets is None:
+            self._cards: CardList = self._repo.main_deck_cards()
+        else:
+            self._cards = [card for name in sets
+                           for card in (self._repo.main_deck_cards() if name == CORE
+                                        else card_sets().get(name).main_deck_cards())]
         shuffle(self._cards)
         return
 
@@ -243,10 +312,41 @@ class MainDeck(object):
         MainDeckEmpty
             Raised when attempting to draw a card when the deck is empty
         """
-        if len(self._cards) > 0:
-            return self._cards.pop()
-        else:
+        if len(self._cards) == 0:
             raise MainDeckEmpty
+        card: Card = self._cards.pop()
+        if self._log is not None:
+            self._log.record(EventKind.POP, self._zone, card.template_id, card.uuid)
+        return card
+
+    def fork(self) -> 'MainDeck':
+        """Copies the deck into a deck that is not logged
+        """
+        deck: MainDeck = MainDeck.__new__(MainDeck)
+        deck._repo = self._repo
+        deck._catalog = self._catalog
+        deck._cards = list(self._cards)
+        return deck
+
+    def _piles(self) -> Dict[str, CardList]:
+        """The piles of cards held by the deck, keyed by name
+        """
+        return {'cards': self._cards}
+
+    def __getstate__(self) -> dict:
+        """Reduces the deck to its catalog and the template ids and UUIDs of its cards
+
+        The repository is not sent, since it holds a database connection.
+        """
+        return {'catalog': self._catalog, 'cards': pack_cards(self._cards)}
+
+    def __setstate__(self, state: dict) -> None:
+        """Rebuilds the deck from the catalog it was dealt from, which also replaces
+        the repository
+        """
+        catalog = self._repo = self._catalog = state['catalog']
+        self._cards = catalog.unpack(state['cards'])
+        return
 
 
 class TradeRow(object):
@@ -259,9 +359,14 @@ class TradeRow(object):
     cardrepo : CardRepo
         The repository from which cards are obtained
     """
+
+    _log: EventLog = None
+    _zone: str = None
+
     def __init__(self, maindeck: MainDeck, cardrepo: CardRepo):
         self._maindeck: MainDeck = maindeck
         self._repo: CardRepo = cardrepo
+        self._catalog: CardCatalog = catalog_of(cardrepo)
         self._explorer = None
         self._cards = []
 
@@ -291,9 +396,17 @@ class TradeRow(object):
                 card: Card = self._maindeck.next_card()
             except MainDeckEmpty:
                 break
-            self._cards.append(card)
+            self._fill(card)
         return self._cards
 
+    def _fill(self, card: Card) -> None:
+        """Adds a card drawn from the main deck to the trade row
+        """
+        self._cards.append(card)
+        if self._log is not None:
+            self._log.record(EventKind.FILL, self._zone, card.template_id, card.uuid)
+        return
+
     @property
     def explorer(self) -> Card:
         """Produces the current Explorer available for purchase
@@ -304,9 +417,17 @@ class TradeRow(object):
             The current Explorer
         """
         if self._explorer is None:
-            self._explorer: Card = self._repo.new_explorer()
+            self._set_explorer(self._repo.new_explorer())
         return self._explorer
 
+    def _set_explorer(self, card: Card) -> None:
+        """Offers a new Explorer once the previous one has been acquired
+        """
+        self._explorer: Card = card
+        if self._log is not None:
+            self._log.record(EventKind.EXPLORER, self._zone, card.template_id, card.uuid)
+        return
+
     def acquire(self, uuid: str) -> Card:
         """Produces the card with the specified UUID
 
@@ -329,13 +450,15 @@ class TradeRow(object):
         cards_bools = [c.uuid == uuid for c in self.cards]
         if True in cards_bools:
             i = cards_bools.index(True)
-            return self._cards.pop(i)
+            card = self._cards.pop(i)
         elif self.explorer.uuid == uuid:
             card = self._explorer
             self._explorer = None
-            return card
         else:
             raise UUIDNotFoundError
+        if self._log is not None:
+            self._log.record(EventKind.ACQUIRE, self._zone, card.template_id, card.uuid)
+        return card
 
     def scrap(self, uuid: str) -> None:
         """Permanently removes a card from the trade row
@@ -348,11 +471,57 @@ class TradeRow(object):
         cards_bools = [c.uuid == uuid for c in self.cards]
         if True in cards_bools:
             i = cards_bools.index(True)
-            del self._cards[i]
+            card = self._cards.pop(i)
         elif self.explorer.uuid == uuid:
+            card = self._explorer
             self._explorer = None
         else:
             raise UUIDNotFoundError
+        if self._log is not None:
+            self._log.record(EventKind.SCRAP, self._zone, card.template_id, card.uuid)
+        return
+
+    def fork(self, maindeck: MainDeck) -> 'TradeRow':
+        """Copies the trade row into a trade row that is not logged
+
+        Parameters
+        ----------
+        maindeck : MainDeck
+            The deck the copy is drawn from, usually a fork of the trade row's deck
+        """
+        row: TradeRow = TradeRow(maindeck, self._repo)
+        row._catalog = self._catalog
+        row._cards = list(self._cards)
+        row._explorer = self._explorer
+        return row
+
+    def _piles(self) -> Dict[str, CardList]:
+        """The piles of cards held by the trade row, keyed by name
+        """
+        explorer: CardList = [] if self._explorer is None else [self._explorer]
+        return {'cards': self._cards, 'explorer': explorer}
+
+    def __getstate__(self) -> dict:
+        """Reduces the trade row to its catalog and the template ids and UUIDs of its
+        cards
+
+        The repository is not sent, since it holds a database connection.
+        """
+        explorer = [] if self._explorer is None else [self._explorer]
+        return {'catalog': self._catalog,
+                'maindeck': self._maindeck,
+                'cards': pack_cards(self._cards),
+                'explorer': pack_cards(explorer)}
+
+    def __setstate__(self, state: dict) -> None:
+        """Rebuilds the trade row from the catalog it was dealt from, which also
+        replaces the repository
+        """
+        catalog = self._repo = self._catalog = state['catalog']
+        self._maindeck = state['maindeck']
+        self._cards = catalog.unpack(state['cards'])
+        explorer = catalog.unpack(state['explorer'])
+        self._explorer = explorer[0] if explorer else None
         return
 
 
@@ -378,7 +547,7 @@ class Hand(object):
     existing_bases : List[Card]
         Any bases that were played previously and have not yet been destroyed
     playerdeck : PlayerDeck
-        The player's deck
+        The player's deck, whose catalog the effects of the hand are resolved with
     """
     def __init__(self, to_draw: int, existing_bases: CardList, playerdeck: PlayerDeck):
         if (to_draw < 0) or (to_draw > 5):
@@ -389,12 +558,17 @@ class Hand(object):
             drawn: CardList = []
         self.cards = drawn + existing_bases
         self._playerdeck = playerdeck
+        self._catalog: CardCatalog = playerdeck._catalog
         return
 
     @staticmethod
-    def _collect_basic_effects(cards: List[Card]) -> List[EffectRecord]:
-        """Assembles a list of `EffectRecord`s from the cards in the hand
+    def _collect_basic_effects(cards: List[Card],
+                               counts: Optional[Counts] = None) -> List[EffectRecord]:
+        """Assembles a list of `EffectRecord`s from the cards in the hand, skipping the
+        effects whose condition does not hold
         """
+        if counts is None:
+            counts = hand_counts(cards)
         basic_effects: List[EffectRecord] = []
         for c in cards:
             effects: List[CardEffect] = c.effects_basic
@@ -403,9 +577,9 @@ class Hand(object):
                                     value=e.value,
                                     uuid=e.uuid,
                                     provider=c.uuid)
-                       for e in effects]
+                       for e in effects if e.condition.test(counts)]
             basic_effects += records
-        return records
+        return basic_effects
 
     @staticmethod
     def _collect_ally_factions(cards: List[Card]) -> List[CardFaction]:
@@ -420,9 +594,12 @@ class Hand(object):
         return allies
 
     @staticmethod
-    def _collect_ally_effects(cards: List[Card], facs: List[CardFaction]) -> List[EffectRecord]:
+    def _collect_ally_effects(cards: List[Card], facs: List[CardFaction],
+                              counts: Optional[Counts] = None) -> List[EffectRecord]:
         """Assembles a list of the ally effects that are applicable
         """
+        if counts is None:
+            counts = hand_counts(cards)
         ally_effects: List[EffectRecord] = []
         for c in cards:
             effects: List[CardEffect] = c.effects_ally
@@ -431,14 +608,93 @@ class Hand(object):
                                     value=e.value,
                                     uuid=e.uuid,
                                     provider=c.uuid)
-                       for e in effects if c.faction in facs]
+                       for e in effects if c.faction in facs and e.condition.test(counts)]
             ally_effects += records
         return ally_effects
 
     def _collect_effects(self) -> List[EffectRecord]:
         """Assembles a list of effects provided by the player's hand
         """
-        basic_effects: List[EffectRecord] = Hand._collect_basic_effects(self.cards)
+        counts: Counts = hand_counts(self.cards)
+        basic_effects: List[EffectRecord] = Hand._collect_basic_effects(self.cards, counts)
         ally_factions: List[CardFaction] = Hand._collect_ally_factions(self.cards)
-        ally_effects: List[EffectRecord] = Hand._collect_ally_effects(self.cards, ally_factions)
+        ally_effects: List[EffectRecord] = Hand._collect_ally_effects(self.cards, ally_factions,
+                                                                      counts)
         return basic_effects + ally_effects
+
+    def effect_totals(self) -> Dict[Tuple[CardTarget, CardAction], int]:
+        """Sums the values of the hand's effects by target and action
+
+        Returns
+        -------
+        Dict[Tuple[CardTarget, CardAction], int]
+            The total value of each (target, action) pair provided by the hand
+        """
+        totals: Dict[Tuple[CardTarget, CardAction], int] = {}
+        for e in self._collect_effects():
+            key = (e.target, e.action)
+            totals[key] = totals.get(key, 0) + e.value
+        return totals
+
+    @staticmethod
+    def batch_totals(hands, width: Optional[int] = None, catalog=None) -> HandTotals:
+        """Sums the effects of many hands at once, as ``effect_totals`` does for one
+
+        Parameters
+        ----------
+        hands : [[int]] or array
+            The template ids of the cards of each hand, carried-over bases included,
+            either one sequence per hand or a flat, row-major sequence of ``width``
+            ids per hand
+        width : int (Optional)
+            The number of cards per hand of a flat sequence (Default is one sequence
+            per hand)
+        catalog : CardCatalog (Optional)
+            The catalog the template ids refer to (Default is the process-local
+            catalog)
+
+        Returns
+        -------
+        HandTotals
+            The totals of each hand, in order, see ``realms.handbatch``
+        """
+        if width is not None:
+            hands = [hands[i:i + width] for i in range(0, len(hands), width)]
+        return hand_table(catalog).evaluate(hands)
+
+    def resolve(self, state: PlayerState) -> PlayerState:
+        """Applies the basic and ally effects of the hand to a player state
+
+        Each card costs a single call to the compiled effects of its template, instead
+        of one dispatch per effect.
+
+        Parameters
+        ----------
+        state : PlayerState
+            The state whose pools receive the effects
+
+        Returns
+        -------
+        PlayerState
+            The state that was passed in
+        """
+        catalog: CardCatalog = self._catalog
+        counts: Counts = hand_counts(self.cards)
+        allies: List[CardFaction] = Hand._collect_ally_factions(self.cards)
+        for c in self.cards:
+            catalog.compiled_effects(c.template_id).play(state, counts, c.faction in allies)
+        return state
+
+    def __getstate__(self) -> dict:
+        """Reduces the hand to the template ids and UUIDs of its cards
+        """
+        return {'cards': pack_cards(self.cards),
+                'playerdeck': self._playerdeck}
+
+    def __setstate__(self, state: dict) -> None:
+        """Rebuilds the hand from the catalog of its player's deck
+        """
+        self._playerdeck = state['playerdeck']
+        self._catalog = self._playerdeck._catalog
+        self.cards = self._catalog.unpack(state['cards'])
+        return
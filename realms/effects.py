@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: effects
+    :synopsis: Compiles the effects of card templates into specialized Python functions
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+
+Instead of dispatching on the target and action of every effect each time a card is
+played, the effects of a template are turned into the source of two functions, which
+are compiled once per template::
+
+    def play(state, counts, ally):
+        state.opponent_attack += 4
+        if c0(counts):
+            state.owner_money += 2
+        if ally:
+            state.owner_draw += 1
+        return
+
+Unconditional effects on the same pool are folded into a single statement, and the
+compiled conditions (``c0`` above) are bound as globals of the function.
+
+A ``Turn`` cannot apply every effect as it is played: effects listed in
+``PRIORITIES`` go through its queue, and effects whose condition does not hold yet
+wait for a later card. Each slot (basic, ally, scrap) of a template therefore also
+gets a function applying only the effects that go straight to the pools::
+
+    def basic_pools(state):
+        state.opponent_attack += 4
+        return
+
+and a flag telling whether the slot has other, deferred, effects, which the turn
+offers one at a time.
+"""
+
+from typing import Callable, Dict, List, NamedTuple, Sequence, Tuple
+from .cards import CardAction, CardTarget
+from .catalog import CardTemplate, EffectTemplate
+from .conditions import Counts
+
+EffectKey = Tuple[CardTarget, CardAction]
+
+PRIORITIES: Dict[EffectKey, int] = {
+    (CardTarget.OWNER, CardAction.DRAW): 0,
+    (CardTarget.OWNER, CardAction.DISCARD): 1,
+    (CardTarget.OWNER, CardAction.SCRAP): 2,
+    (CardTarget.OWNER, CardAction.ACQUIRE): 3,
+    (CardTarget.OPPONENT, CardAction.DESTROY): 4,
+    (CardTarget.OPPONENT, CardAction.DISCARD): 5,
+}
+"""The order in which the effects queued by a ``Turn`` are resolved, lowest first
+
+Effects that are not listed are commutative and never queued.
+"""
+
+BASIC, ALLY, SCRAP = 0, 1, 2
+"""The indexes of the slots of ``CompiledEffects.pools`` and ``CompiledEffects.deferred``"""
+
+
+def pool_name(target: CardTarget, action: CardAction) -> str:
+    """The name of the ``PlayerState`` attribute accumulating an effect, e.g. ``owner_money``
+    """
+    return f"{target.name.lower()}_{action.name.lower()}"
+
+
+POOLS: Dict[EffectKey, str] = {(t, a): pool_name(t, a) for t in CardTarget for a in CardAction}
+"""The name of the pool of each (target, action) pair"""
+
+
+class PlayerState(object):
+    """The numbers describing a player during a turn
+
+    Besides ``health`` and ``discards_due``, the number of cards the player must
+    discard at the start of their next turn, the state holds one pool per (target,
+    action) pair, named by ``pool_name``, which accumulates the values of the effects
+    played this turn, e.g. ``owner_money`` or ``opponent_attack``.
+
+    Parameters
+    ----------
+    health : int (Optional)
+        The player's starting health (Default is 50)
+    """
+    __slots__ = ('health', 'discards_due') + tuple(POOLS.values())
+
+    def __init__(self, health: int = 50):
+        self.health: int = health
+        self.discards_due: int = 0
+        self.reset()
+        return
+
+    def reset(self) -> None:
+        """Empties every pool, as at the start of a turn
+        """
+        for name in POOLS.values():
+            setattr(self, name, 0)
+        return
+
+    def copy(self) -> 'PlayerState':
+        state: PlayerState = PlayerState.__new__(PlayerState)
+        for name in PlayerState.__slots__:
+            setattr(state, name, getattr(self, name))
+        return state
+
+    def totals(self) -> Dict[EffectKey, int]:
+        """The non-empty pools, keyed like ``Hand.effect_totals``
+        """
+        totals: Dict[EffectKey, int] = {}
+        for key, name in POOLS.items():
+            value: int = getattr(self, name)
+            if value:
+                totals[key] = value
+        return totals
+
+    def __repr__(self) -> str:
+        pools: str = ', '.join(f"{k}={v}" for k, v in
+                               ((n, getattr(self, n)) for n in POOLS.values()) if v)
+        return f"PlayerState(health={self.health}, {pools})"
+
+
+PlayFunction = Callable[[PlayerState, Counts, bool], None]
+ScrapFunction = Callable[[PlayerState, Counts], None]
+PoolFunction = Callable[[PlayerState], None]
+
+CompiledEffects = NamedTuple('CompiledEffects', [
+                             ('template_id', int),
+                             ('play', PlayFunction),
+                             ('scrap', ScrapFunction),
+                             ('pools', Tuple[PoolFunction, PoolFunction, PoolFunction]),
+                             ('deferred', Tuple[bool, bool, bool]),
+                             ('source', str)])
+"""The compiled effects of a template
+
+``play(state, counts, ally)`` applies the basic effects, and the ally effects when
+``ally`` is true; ``scrap(state, counts)`` applies the scrap effects. ``counts`` are the
+hand's ``hand_counts``, used to evaluate conditions.
+
+``pools[slot](state)`` applies the effects of a slot (``BASIC``, ``ALLY`` or
+``SCRAP``) that are neither conditional nor queued, and ``deferred[slot]`` tells
+whether the slot has other effects, see ``is_deferred``.
+"""
+
+
+def is_deferred(effect) -> bool:
+    """Whether a ``Turn`` queues an effect or checks its condition, instead of adding
+    it straight to a pool
+
+    Parameters
+    ----------
+    effect : EffectTemplate or CardEffect
+        The effect to classify
+    """
+    return bool(effect.condition.codes) or (effect.target, effect.action) in PRIORITIES
+
+
+def compile_effects(template: CardTemplate) -> CompiledEffects:
+    """Compiles the effects of a template
+
+    See Also
+    --------
+    CardCatalog.compiled_effects
+    """
+    namespace: Dict[str, object] = {}
+    lines: List[str] = ['def play(state, counts, ally):']
+    lines += _statements(template.effects_basic, namespace, '    ')
+    ally: List[str] = _statements(template.effects_ally, namespace, '        ')
+    if ally:
+        lines.append('    if ally:')
+        lines += ally
+    lines += ['    return', '', '', 'def scrap(state, counts):']
+    lines += _statements(template.effects_scrap, namespace, '    ')
+    lines.append('    return')
+    slots = (template.effects_basic, template.effects_ally, template.effects_scrap)
+    for name, effects in zip(('basic_pools', 'ally_pools', 'scrap_pools'), slots):
+        lines += ['', '', f"def {name}(state):"]
+        lines += _statements([e for e in effects if not is_deferred(e)], namespace, '    ')
+        lines.append('    return')
+    source: str = '\n'.join(lines) + '\n'
+    exec(compile(source, f"<effects of {template.name}>", 'exec'), namespace)
+    return CompiledEffects(template_id=template.id,
+                           play=namespace['play'],
+                           scrap=namespace['scrap'],
+                           pools=(namespace['basic_pools'], namespace['ally_pools'],
+                                  namespace['scrap_pools']),
+                           deferred=tuple(any(map(is_deferred, effects)) for effects in slots),
+                           source=source)
+
+
+def _statements(effects: Sequence[EffectTemplate], namespace: Dict[str, object],
+                indent: str) -> List[str]:
+    """The statements applying a list of effects, folding the unconditional ones by pool
+    """
+    folded: Dict[str, int] = {}
+    lines: List[str] = []
+    for e in effects:
+        pool: str = POOLS[(e.target, e.action)]
+        if not e.condition.codes:
+            folded[pool] = folded.get(pool, 0) + e.value
+            continue
+        name: str = f"c{len(namespace)}"
+        namespace[name] = e.condition.test
+        lines += [f"{indent}if {name}(counts):", f"{indent}    state.{pool} += {e.value}"]
+    return [f"{indent}state.{pool} += {value}" for pool, value in folded.items()] + lines
@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: events
+    :synopsis: An append-only log of the state transitions of the decks in a game
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+"""
+
+import gzip
+import json
+from enum import Enum
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+
+EventTuple = Tuple[Union[int, str], ...]
+"""A single event: the ``EventKind`` value, the zone, and the event's arguments"""
+
+Snapshot = Dict[str, object]
+"""The JSON-ready state of every zone at a given point in the log"""
+
+
+class EventKind(Enum):
+    """The state transitions recorded by an ``EventLog``
+
+    Every card event carries the card's template id and UUID so that the card can be
+    rebuilt from the catalog during replay.
+    """
+    DRAW = 0
+    """A card moved from a player's undrawn pile into play"""
+    DISCARD = 1
+    """A card was placed on a player's discard pile"""
+    RESHUFFLE = 2
+    """A player's discards were shuffled into the undrawn pile (carries the seed)"""
+    POP = 3
+    """A card was taken from the top of the main deck"""
+    FILL = 4
+    """A card taken from the main deck was placed in the trade row"""
+    EXPLORER = 5
+    """A new Explorer was made available in the trade row"""
+    ACQUIRE = 6
+    """A card was acquired from the trade row"""
+    SCRAP = 7
+    """A card was permanently removed from the trade row"""
+
+
+# Events after which the card is no longer in any zone
+_TO_LIMBO = (EventKind.DRAW.value, EventKind.POP.value, EventKind.ACQUIRE.value)
+# Events that place a card from limbo back into a zone
+_FROM_LIMBO = (EventKind.DISCARD.value, EventKind.FILL.value)
+
+
+class EventLog(object):
+    """Records every state transition of a set of decks as a compact event stream
+
+    Decks are attached to the log under short zone names, e.g. ``'main'``, ``'row'``,
+    ``'p0'``. Each recorded event is a tuple of small integers and strings, and is
+    optionally appended to a text stream as a single JSON line. A snapshot of every
+    zone is taken when the decks are attached and then every ``snapshot_every``
+    events, so that a replay can skip forward instead of starting from scratch.
+
+    Parameters
+    ----------
+    stream : TextIO (Optional)
+        A text stream opened for appending to which each record is written
+    snapshot_every : int (Optional)
+        The number of events between periodic snapshots (Default is 256)
+
+    Attributes
+    ----------
+    events : List[EventTuple]
+        The events held by the log, the first of which is event number ``first``
+    snapshots : List[Snapshot]
+        The snapshots held by the log, the first of which is snapshot number
+        ``first_snapshot``
+    first : int
+        The number of events dropped by ``trim``
+    first_snapshot : int
+        The number of snapshots dropped by ``trim``
+
+    Note
+    ----
+    Cards that are not in any attached zone (i.e. in a player's hand, or in play)
+    are tracked by the log as "limbo" so that snapshots are complete.
+    """
+    def __init__(self, stream: Optional[TextIO] = None, snapshot_every: int = 256):
+        self._stream: Optional[TextIO] = stream
+        self._zones: Dict[str, object] = {}
+        self._limbo: Dict[str, int] = {}
+        self.events: List[EventTuple] = []
+        self.snapshots: List[Snapshot] = []
+        self.first: int = 0
+        self.first_snapshot: int = 0
+        self.snapshot_every: int = snapshot_every
+        self._since_snapshot: int = 0
+        return
+
+    def attach(self, **zones) -> None:
+        """Attaches decks to the log under the given zone names and takes a snapshot
+
+        Parameters
+        ----------
+        zones
+            The decks to attach, keyed by zone name
+
+        Examples
+        --------
+        >>> log = EventLog()
+        >>> log.attach(main=maindeck, row=traderow, p0=playerdeck)
+        """
+        for name, deck in zones.items():
+            deck._log = self
+            deck._zone = name
+            self._zones[name] = deck
+        self.snapshot()
+        return
+
+    def detach(self) -> None:
+        """Stops recording events from every attached deck
+        """
+        for deck in self._zones.values():
+            deck._log = None
+            deck._zone = None
+        self._zones = {}
+        return
+
+    @property
+    def seq(self) -> int:
+        """The number of events recorded so far
+        """
+        return self.first + len(self.events)
+
+    def trim(self) -> None:
+        """Drops the events and snapshots recorded before the latest snapshot
+
+        A log whose records are persisted elsewhere, such as by ``GameStore``, is
+        trimmed so that the memory it holds does not grow with the length of the
+        game; it can still be replayed from its latest snapshot.
+        """
+        if not self.snapshots:
+            return
+        latest: int = self.snapshots[-1]['seq']
+        del self.events[:latest - self.first]
+        self.first = latest
+        self.first_snapshot += len(self.snapshots) - 1
+        del self.snapshots[:-1]
+        return
+
+    def record(self, kind: EventKind, zone: str, *args: Union[int, str]) -> None:
+        """Appends an event to the log
+
+        Events must be recorded after the transition has been applied, since a
+        periodic snapshot may be taken before this method returns.
+
+        Parameters
+        ----------
+        kind : EventKind
+            The kind of state transition
+        zone : str
+            The name of the zone in which the transition took place
+        args
+            The template id and UUID of the card, or the seed of a reshuffle
+        """
+        event: EventTuple = (kind.value, zone) + args
+        self.events.append(event)
+        if kind.value in _TO_LIMBO:
+            self._limbo[args[1]] = args[0]
+        elif kind.value in _FROM_LIMBO:
+            self._limbo.pop(args[1], None)
+        if self._stream is not None:
+            self._stream.write(json.dumps(event, separators=(',', ':')))
+            self._stream.write('\n')
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.snapshot_every:
+            self.snapshot()
+        return
+
+    def snapshot(self) -> Snapshot:
+        """Records the current contents of every attached zone
+
+        Returns
+        -------
+        Snapshot
+            The snapshot that was recorded
+        """
+        snap: Snapshot = {
+            'seq': self.seq,
+            'zones': {name: [type(deck).__name__,
+                             {pile: _pack(cards) for pile, cards in deck._piles().items()}]
+                      for name, deck in self._zones.items()},
+            'limbo': [list(self._limbo.values()), list(self._limbo.keys())]
+        }
+        self.snapshots.append(snap)
+        self._since_snapshot = 0
+        if self._stream is not None:
+            self._stream.write(json.dumps(snap, separators=(',', ':')))
+            self._stream.write('\n')
+        return snap
+
+    def flush(self) -> None:
+        """Flushes the underlying stream, if any
+        """
+        if self._stream is not None:
+            self._stream.flush()
+        return
+
+    def records(self) -> Iterator[Union[EventTuple, Snapshot]]:
+        """Produces the events and snapshots held by the log, in the order they were
+        recorded
+        """
+        i = 0
+        for snap in self.snapshots:
+            end: int = snap['seq'] - self.first
+            yield from self.events[i:end]
+            i = max(i, end)
+            yield snap
+        yield from self.events[i:]
+
+
+def read_log(lines: Iterable[str]) -> Tuple[List[EventTuple], List[Snapshot]]:
+    """Parses the lines written by an ``EventLog`` back into events and snapshots
+
+    Parameters
+    ----------
+    lines : Iterable[str]
+        The JSON lines written by the log
+
+    Returns
+    -------
+    ([EventTuple], [Snapshot])
+        The events and snapshots in the order they were recorded
+
+    Note
+    ----
+    A truncated final line, e.g. from a crash mid-write, is ignored.
+    """
+    events: List[EventTuple] = []
+    snapshots: List[Snapshot] = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            break
+        if isinstance(record, dict):
+            snapshots.append(record)
+        else:
+            events.append(tuple(record))
+    return events, snapshots
+
+
+def _pack(cards) -> List[List[Union[int, str]]]:
+    """Reduces a pile of cards to a list of template ids and a list of UUIDs
+    """
+    return [[c.template_id for c in cards], [c.uuid for c in cards]]
+
+
+class ArchiveWriter(object):
+    """Appends the logs of finished games to an archive
+
+    An archive is a JSON-lines file (gzip-compressed if the name ends in ``.gz``) in
+    which each game starts with a ``{"game": <id>}`` header line, followed by the
+    game's events and snapshots in the order they were recorded.
+
+    Parameters
+    ----------
+    path : str
+        The path of the archive, which is created if it does not exist
+    """
+    def __init__(self, path: str):
+        self._file: TextIO = _open_archive(path, 'at')
+        return
+
+    def write_game(self, game_id: str, log: EventLog) -> None:
+        """Appends the log of a single game, from its first record that was not
+        trimmed, ending with a final snapshot
+        """
+        if not log.snapshots or log.snapshots[-1]['seq'] != log.seq:
+            log.snapshot()
+        self._file.write(json.dumps({'game': game_id}))
+        self._file.write('\n')
+        for record in log.records():
+            self._file.write(json.dumps(record, separators=(',', ':')))
+            self._file.write('\n')
+        return
+
+    def close(self) -> None:
+        self._file.close()
+        return
+
+    def __enter__(self) -> 'ArchiveWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+        return
+
+
+class ArchiveReader(object):
+    """Streams the games in an archive without loading the archive into memory
+
+    Only one line of the archive is held at a time while iterating over events,
+    and only one game at a time while iterating over games.
+
+    Parameters
+    ----------
+    path : str
+        The path of the archive written by an ``ArchiveWriter``
+    """
+    def __init__(self, path: str):
+        self.path: str = path
+        return
+
+    def records(self) -> Iterator[Tuple[str, Union[EventTuple, Snapshot]]]:
+        """Produces every event and snapshot in the archive, along with its game id
+        """
+        game_id: Optional[str] = None
+        with _open_archive(self.path, 'rt') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if isinstance(record, dict) and 'game' in record:
+                    game_id = record['game']
+                elif isinstance(record, dict):
+                    yield game_id, record
+                else:
+                    yield game_id, tuple(record)
+        return
+
+    def events(self) -> Iterator[Tuple[str, EventTuple]]:
+        """Produces every event in the archive, along with its game id
+        """
+        return ((g, r) for g, r in self.records() if not isinstance(r, dict))
+
+    def games(self) -> Iterator[Tuple[str, List[str]]]:
+        """Produces the raw JSON lines of each game in the archive, one game at a time
+
+        The lines can be handed to ``read_log`` or ``ReplayEngine.from_lines``.
+        """
+        game_id: Optional[str] = None
+        lines: List[str] = []
+        with _open_archive(self.path, 'rt') as f:
+            for line in f:
+                if line.startswith('{"game"'):
+                    if game_id is not None:
+                        yield game_id, lines
+                    game_id = json.loads(line)['game']
+                    lines = []
+                else:
+                    lines.append(line)
+        if game_id is not None:
+            yield game_id, lines
+        return
+
+
+def _open_archive(path: str, mode: str) -> TextIO:
+    """Opens an archive, transparently handling gzip compression
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
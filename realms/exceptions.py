@@ -62,7 +62,49 @@ class UUIDNotFoundError(RealmsException):
     pass
 
 
+class TemplateNotFoundError(RealmsException):
+    """Raised when a requested card template is not in the catalog
+    """
+    pass
+
+
+class CardBackendError(RealmsException):
+    """Raised when a card backend cannot be used in this process
+    """
+    pass
+
+
+class CardSetNotFoundError(RealmsException):
+    """Raised when a requested card set has not been registered
+    """
+    pass
+
+
+class CatalogFormatError(RealmsException):
+    """Raised when a buffer does not contain an encoded card catalog
+    """
+    pass
+
+
+class ReplayMismatch(RealmsException):
+    """Raised when a recorded event does not match the state being replayed
+    """
+    pass
+
+
 class HandInitError(RealmsException):
     """Raised when attempting to construct a hand from an invalid number of cards
     """
     pass
+
+
+class GameOver(RealmsException):
+    """Raised when attempting to play a turn of a game that has already ended
+    """
+    pass
+
+
+class NotYourTurn(RealmsException):
+    """Raised when a player acts during the turn of another player
+    """
+    pass
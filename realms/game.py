@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: game
+    :synopsis: Ties the players, the main deck and the trade row of a game together
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+
+A ``Game`` is driven one turn at a time::
+
+    >>> game = Game(local_catalog(), ['alice', 'bob', 'carol'])
+    >>> while not game.over:
+    ...     step = game.step()
+    >>> game.winner
+
+Any number of players from two upwards can take part. Players take turns in the
+order they were seated, and each one attacks the next living player in that order,
+so with two players everyone attacks their only opponent. A player whose authority
+drops to zero or below leaves the turn order, and the game is over when a single
+player remains.
+
+Functions registered with ``add_hook`` are called after each phase of every turn
+with the name of the phase (one of ``PHASES``) and the time it took, in seconds;
+``PhaseTimings`` is such a function, accumulating the time spent in each phase.
+Turns are only timed while at least one hook is registered.
+"""
+
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+from .decks import MainDeck, TradeRow
+from .events import EventLog
+from .exceptions import GameOver
+from .player import Player
+from .turns import PHASES, Turn, TurnPolicy, TurnReport
+from .zobrist import ZobristHash, ZobristKeys
+
+PhaseHook = Callable[[str, float], None]
+
+GameStep = NamedTuple('GameStep', [
+                      ('turn', int),
+                      ('player', Player),
+                      ('opponent', Player),
+                      ('report', TurnReport),
+                      ('eliminated', List[Player])])
+"""The outcome of a single turn: the (zero-based) turn number, the player who played
+it and the one they attacked, a summary of the turn, and the players who left the
+game as a result"""
+
+
+class PhaseTimings(object):
+    """A phase hook accumulating the number of turns and the time spent in each phase
+    """
+    def __init__(self):
+        self.count: Dict[str, int] = dict.fromkeys(PHASES, 0)
+        self.seconds: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        return
+
+    def __call__(self, phase: str, seconds: float) -> None:
+        self.count[phase] += 1
+        self.seconds[phase] += seconds
+        return
+
+    @property
+    def total(self) -> float:
+        """The time spent in every phase, in seconds
+        """
+        return sum(self.seconds.values())
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        """The mean time of each phase in microseconds, and its share of the total
+        """
+        total: float = self.total or 1.0
+        return {phase: {'mean_us': round(self.seconds[phase] / (self.count[phase] or 1) * 1e6, 1),
+                        'share': round(self.seconds[phase] / total, 3)}
+                for phase in PHASES}
+
+
+class Game(object):
+    """A game between two or more players sharing a main deck and a trade row
+
+    Parameters
+    ----------
+    cards : CardRepo or CardCatalog
+        The source of every card of the game
+    names : [str] (Optional)
+        The names of the players, in turn order (Default is two players, ``p0`` and
+        ``p1``)
+    policies : [TurnPolicy] (Optional)
+        One policy per player (Default is a ``TurnPolicy`` each)
+    sets : [str] (Optional)
+        The card sets the main deck is composed of (Default is the cards of ``cards``)
+    log : EventLog (Optional)
+        A log to which the decks of the game are attached, with the zones ``main``,
+        ``row`` and ``p0`` onwards
+    zobrist : ZobristKeys (Optional)
+        Keys with which to hash the decks as they change (Default is no hashing)
+
+    Attributes
+    ----------
+    players : [Player]
+        Every player, in turn order, including those who left the game
+    turn : int
+        The number of turns played so far
+    zobrist : ZobristHash
+        The incremental hash of the decks, if ``zobrist`` keys were given
+
+    Raises
+    ------
+    ValueError
+        Raised when fewer than two players are given
+    """
+    def __init__(self, cards, names: Sequence[str] = ('p0', 'p1'),
+                 policies: Optional[Sequence[TurnPolicy]] = None,
+                 sets: Optional[List[str]] = None, log: Optional[EventLog] = None,
+                 zobrist: Optional[ZobristKeys] = None):
+        if len(names) < 2:
+            raise ValueError(f"A game needs at least two players, not {len(names)}")
+        self.maindeck: MainDeck = MainDeck(cards, sets)
+        self.traderow: TradeRow = TradeRow(self.maindeck, cards)
+        self.players: List[Player] = Player.table(names, cards, policies)
+        self.turn: int = 0
+        self.log: Optional[EventLog] = log
+        self._order: List[Player] = list(self.players)
+        self._next: int = 0
+        self._hooks: List[PhaseHook] = []
+        if log is not None:
+            log.attach(main=self.maindeck, row=self.traderow,
+                       **{f"p{i}": p._deck for i, p in enumerate(self.players)})
+        self.zobrist: Optional[ZobristHash] = None
+        if zobrist is not None:
+            self.zobrist = ZobristHash(zobrist, self)
+        return
+
+    @property
+    def alive(self) -> List[Player]:
+        """The players still in the game, in turn order
+        """
+        return list(self._order)
+
+    @property
+    def over(self) -> bool:
+        return len(self._order) < 2
+
+    @property
+    def winner(self) -> Optional[Player]:
+        """The last player standing, or ``None`` while the game is in progress
+        """
+        return self._order[0] if len(self._order) == 1 else None
+
+    @property
+    def current(self) -> Player:
+        """The player whose turn is next
+
+        Raises
+        ------
+        GameOver
+            Raised when the game is over
+        """
+        if self.over:
+            raise GameOver
+        return self._order[self._next]
+
+    def opponent_of(self, player: Player) -> Player:
+        """The player that a player attacks: the next living player in turn order
+        """
+        return self._order[(self._order.index(player) + 1) % len(self._order)]
+
+    def fork(self, policies: Optional[Sequence[TurnPolicy]] = None) -> 'Game':
+        """Copies the game cheaply, for policies that search ahead
+
+        The copy shares the cards of the game, which are never modified, and copies
+        every pile. It is neither logged, hashed nor timed.
+
+        Parameters
+        ----------
+        policies : [TurnPolicy] (Optional)
+            The policies of the players of the copy (Default is the players' policies)
+        """
+        game: Game = Game.__new__(Game)
+        game.maindeck = self.maindeck.fork()
+        game.traderow = self.traderow.fork(game.maindeck)
+        policies = policies or [None] * len(self.players)
+        game.players = [p.fork(policy) for p, policy in zip(self.players, policies)]
+        forked: Dict[int, Player] = {id(p): f for p, f in zip(self.players, game.players)}
+        game.turn = self.turn
+        game.log = None
+        game.zobrist = None
+        game._order = [forked[id(p)] for p in self._order]
+        game._next = self._next
+        game._hooks = []
+        return game
+
+    def __getstate__(self) -> dict:
+        """Drops the log, the hash and the hooks
+        """
+        state: dict = dict(self.__dict__)
+        state['log'] = None
+        state['zobrist'] = None
+        state['_hooks'] = []
+        return state
+
+    def add_hook(self, hook: PhaseHook) -> None:
+        """Calls a function after each phase of every turn, see ``PhaseHook``
+        """
+        self._hooks.append(hook)
+        return
+
+    def remove_hook(self, hook: PhaseHook) -> None:
+        """Stops calling a function registered with ``add_hook``
+
+        Raises
+        ------
+        ValueError
+            Raised when the function is not registered
+        """
+        self._hooks.remove(hook)
+        return
+
+    def step(self) -> GameStep:
+        """Plays the turn of the current player, then passes the turn on
+
+        Returns
+        -------
+        GameStep
+            The outcome of the turn
+
+        Raises
+        ------
+        GameOver
+            Raised when the game is over
+        """
+        player: Player = self.current
+        opponent: Player = self.opponent_of(player)
+        turn: Turn = Turn(player, opponent, self.traderow, self)
+        report: TurnReport = self._timed(turn) if self._hooks else turn.play()
+        return self.advance(player, opponent, report)
+
+    def advance(self, player: Player, opponent: Player, report: TurnReport) -> GameStep:
+        """Passes the turn on once a player's turn has been played
+
+        ``step`` calls it; a caller that plays a turn itself, such as one resuming a
+        forked turn, calls it afterwards.
+        """
+        eliminated: List[Player] = [p for p in self._order if not p.alive]
+        if eliminated:
+            self._eliminate(player)
+        else:
+            self._next = (self._next + 1) % len(self._order)
+        step: GameStep = GameStep(turn=self.turn, player=player, opponent=opponent,
+                                  report=report, eliminated=eliminated)
+        self.turn += 1
+        return step
+
+    def run(self, max_turns: Optional[int] = None) -> Optional[Player]:
+        """Plays turns until the game is over
+
+        Parameters
+        ----------
+        max_turns : int (Optional)
+            Stops once this many turns have been played in total (Default is no limit)
+
+        Returns
+        -------
+        Player
+            The winner, or ``None`` when the game was stopped before it was over
+        """
+        while not self.over and (max_turns is None or self.turn < max_turns):
+            self.step()
+        return self.winner
+
+    def _eliminate(self, player: Player) -> None:
+        """Removes the players who lost from the turn order, which passes the turn to
+        the first living player after ``player``
+        """
+        i: int = self._order.index(player) + 1
+        following: List[Player] = self._order[i:] + self._order[:i]
+        self._order = [p for p in self._order if p.alive]
+        survivor: Optional[Player] = next((p for p in following if p.alive), None)
+        self._next = self._order.index(survivor) if survivor is not None else 0
+        return
+
+    def _timed(self, turn: Turn) -> TurnReport:
+        """Plays a turn one phase at a time, reporting the duration of each to the hooks
+        """
+        clock = time.perf_counter
+        for phase, play in turn.phases():
+            start: float = clock()
+            play()
+            elapsed: float = clock() - start
+            for hook in self._hooks:
+                hook(phase, elapsed)
+        return turn.report()
+
+    def __repr__(self) -> str:
+        names: str = ', '.join(p.name for p in self._order)
+        return f"Game(turn={self.turn}, alive=[{names}])"
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: handbatch
+    :synopsis: Evaluates the effect totals of many hands at once with table lookups
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+
+Lookahead and analytics ask for the effect totals of thousands of candidate hands,
+e.g. every 5-card subset of a deck. Processing each hand with ``Hand.effect_totals``
+builds an ``EffectRecord`` per effect; a ``HandTable`` instead precomputes, once per
+template, everything a card contributes to a hand, packed into a single integer of
+fixed-width lanes:
+
+- one lane per counter of ``hand_counts`` (cards, ships, bases, outposts and each
+  faction), plus one counting the cards whose effects have conditions
+- the totals of the unconditional basic effects, one lane per (target, action)
+  column, and the number of such effects per column
+- the same for the unconditional ally effects, in a block of lanes belonging to the
+  faction of the card
+
+Summing the integers of the cards of a hand adds every lane at once, so a hand costs
+one addition per card. The ally blocks of the factions that the counters activate,
+following ``Hand._collect_ally_factions`` (every faction when a card of
+``CardFaction.ALL`` is in play), are then added to the basic block. Effects with a
+condition are few, so they are tested on the hand's counts one by one, only for the
+hands that hold such cards. The lanes are wide enough for the longest hand of the
+batch, and the results of the whole batch are unpacked into an ``array`` in one go.
+"""
+
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from weakref import WeakKeyDictionary
+from .cards import CardAction, CardFaction, CardTarget
+from .catalog import local_catalog
+from .conditions import COUNTERS, FACTIONS, Predicate
+
+EffectKey = Tuple[CardTarget, CardAction]
+
+ALLY_FACTIONS: List[CardFaction] = [CardFaction.BLOB, CardFaction.STAR,
+                                    CardFaction.FEDERATION, CardFaction.MACHINE]
+"""The factions whose ally abilities can be activated, in the order of ``Hand``"""
+
+_COUNTERS: int = len(COUNTERS) + len(FACTIONS)
+_CONDITIONAL: int = _COUNTERS
+_EFFECTS: int = _COUNTERS + 1
+_ALL: int = len(COUNTERS) + FACTIONS.index(CardFaction.ALL)
+_TYPECODES: Dict[int, str] = {array(t).itemsize * 8: t for t in 'qlihb'}
+
+_tables: WeakKeyDictionary = WeakKeyDictionary()
+
+
+class _Template(object):
+    """What a single card of a template contributes to a hand"""
+    __slots__ = ('faction', 'counters', 'basic', 'ally', 'conditional', 'magnitude')
+
+    def __init__(self, template, index: Dict[EffectKey, int]):
+        self.faction: CardFaction = template.faction
+        self.counters: List[int] = [0, 2 if template.base else 1,
+                                    len(COUNTERS) + FACTIONS.index(template.faction)]
+        if template.base and template.outpost:
+            self.counters.append(3)
+        self.basic: List[Tuple[int, int]] = []
+        self.ally: List[Tuple[int, int]] = []
+        self.conditional: List[Tuple[bool, Predicate, int, int]] = []
+        for ally, effects in ((False, template.effects_basic), (True, template.effects_ally)):
+            for e in effects:
+                column: int = index.setdefault((e.target, e.action), len(index))
+                if e.condition.codes:
+                    self.conditional.append((ally, e.condition.test, column, e.value))
+                else:
+                    (self.ally if ally else self.basic).append((column, e.value))
+        magnitudes: Dict[int, int] = {}
+        for column, value in self.basic + self.ally:
+            magnitudes[column] = magnitudes.get(column, 0) + max(abs(value), 1)
+        for _, _, column, value in self.conditional:
+            magnitudes[column] = magnitudes.get(column, 0) + max(abs(value), 1)
+        self.magnitude: int = max(magnitudes.values(), default=1)
+        return
+
+
+class HandTotals(object):
+    """The effect totals of a batch of hands
+
+    Attributes
+    ----------
+    columns : [(CardTarget, CardAction)]
+        The (target, action) pairs of the catalog, indexing the values of each hand
+    data : array
+        For each hand in turn, the total value of each column followed by the number
+        of effects that contributed to it
+    """
+    def __init__(self, columns: List[EffectKey], data: array):
+        self.columns: List[EffectKey] = columns
+        self.data: array = data
+        self._stride: int = 2 * len(columns)
+        return
+
+    def __len__(self) -> int:
+        return len(self.data) // self._stride if self._stride else 0
+
+    def __getitem__(self, i: int) -> Dict[EffectKey, int]:
+        return self.totals(i)
+
+    def values(self, i: int) -> array:
+        """The total of each column for the ``i``-th hand
+        """
+        start: int = i * self._stride
+        return self.data[start:start + len(self.columns)]
+
+    def totals(self, i: int) -> Dict[EffectKey, int]:
+        """The totals of the ``i``-th hand, as ``Hand.effect_totals`` returns them
+        """
+        start: int = i * self._stride
+        n: int = len(self.columns)
+        row: array = self.data[start:start + self._stride]
+        return {key: row[c] for c, key in enumerate(self.columns) if row[n + c]}
+
+    def column(self, target: CardTarget, action: CardAction) -> array:
+        """The total of a (target, action) pair for every hand
+
+        Raises
+        ------
+        ValueError
+            Raised when no effect of the catalog has that target and action
+        """
+        c: int = self.columns.index((target, action))
+        return self.data[c::self._stride]
+
+
+class HandTable(object):
+    """The per-template lookup tables of a catalog, see the module documentation
+
+    Parameters
+    ----------
+    catalog : CardCatalog
+        The source of the templates; templates of other card sets are looked up
+        through it on first use
+    """
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.columns: List[EffectKey] = []
+        self._index: Dict[EffectKey, int] = {}
+        self._templates: Dict[int, _Template] = {}
+        self._packed: Dict[int, Dict[int, int]] = {}
+        for t in catalog.templates:
+            self._templates[t.id] = _Template(t, self._index)
+        self._columns()
+        return
+
+    def evaluate(self, hands: Iterable[Sequence[int]]) -> HandTotals:
+        """Sums the effects of each hand, applying ally and conditional effects
+
+        Parameters
+        ----------
+        hands : [[int]]
+            The template ids of the cards of each hand, carried-over bases included
+
+        Returns
+        -------
+        HandTotals
+            The totals of each hand, in order
+        """
+        hands = hands if isinstance(hands, list) else list(hands)
+        width: int = max(map(len, hands), default=0)
+        ids = set().union(*hands)
+        for template_id in ids.difference(self._templates):
+            self._add(template_id)
+        bits: int = self._bits(width)
+        rows: Dict[int, int] = self._rows(bits)
+        conditional = {t for t in ids if self._templates[t].conditional}
+        n: int = len(self.columns)
+        lane: int = (1 << bits) - 1
+        half: int = 1 << bits - 1
+        lanes: int = _EFFECTS + 2 * n * (1 + len(ALLY_FACTIONS))
+        bias: int = sum(half << bits * i for i in range(lanes))
+        block_bias: int = bias & ((1 << 2 * n * bits) - 1)
+        block_mask: int = (1 << 2 * n * bits) - 1
+        effects: int = bits * _EFFECTS
+        faction_shift: int = bits * len(COUNTERS)
+        faction_mask: int = (1 << bits * len(FACTIONS)) - 1
+        allies: Dict[int, Tuple[int, ...]] = {}
+        nbytes: int = 2 * n * bits // 8
+        out: List[bytes] = []
+        for hand in hands:
+            biased: int = sum(map(rows.__getitem__, hand)) + bias
+            key: int = (biased >> faction_shift) & faction_mask
+            active: Optional[Tuple[int, ...]] = allies.get(key)
+            if active is None:
+                active = allies[key] = self._active(key, bits)
+            total: int = ((biased >> effects) & block_mask) - block_bias
+            for block in active:
+                total += ((biased >> block) & block_mask) - block_bias
+            if (biased >> bits * _CONDITIONAL) & lane != half:
+                total += self._conditional(hand, biased, bits, conditional)
+            out.append(((total + block_bias) ^ block_bias).to_bytes(nbytes, 'little'))
+        data: array = array(_TYPECODES[bits])
+        data.frombytes(b''.join(out))
+        return HandTotals(list(self.columns), data)
+
+    def _active(self, key: int, bits: int) -> Tuple[int, ...]:
+        """The shifts of the ally blocks activated by the faction lanes of a hand
+        """
+        lane: int = (1 << bits) - 1
+        half: int = 1 << bits - 1
+        counts: List[int] = [0] * len(COUNTERS)
+        counts += [((key >> bits * i) & lane) - half for i in range(len(FACTIONS))]
+        n: int = len(self.columns)
+        return tuple(bits * (_EFFECTS + 2 * n * (1 + k))
+                     for k, faction in enumerate(ALLY_FACTIONS) if _activates(counts, faction))
+
+    def _conditional(self, hand: Sequence[int], biased: int, bits: int,
+                     conditional: set) -> int:
+        """The packed totals of the effects of a hand whose conditions hold
+        """
+        lane: int = (1 << bits) - 1
+        half: int = 1 << bits - 1
+        counts: List[int] = [((biased >> bits * i) & lane) - half for i in range(_COUNTERS)]
+        n: int = len(self.columns)
+        total: int = 0
+        for template_id in hand:
+            if template_id not in conditional:
+                continue
+            template: _Template = self._templates[template_id]
+            for ally, test, column, value in template.conditional:
+                if (not ally or _activates(counts, template.faction)) and test(counts):
+                    total += (value << bits * column) + (1 << bits * (n + column))
+        return total
+
+    def _add(self, template_id: int) -> None:
+        """Adds the template of another card set, widening the lanes if it has effects
+        on a new (target, action) pair
+        """
+        columns: int = len(self._index)
+        self._templates[template_id] = _Template(self.catalog.template(template_id),
+                                                 self._index)
+        if len(self._index) != columns:
+            self._columns()
+        else:
+            self._packed.clear()
+        return
+
+    def _columns(self) -> None:
+        self.columns = sorted(self._index, key=self._index.__getitem__)
+        self._packed.clear()
+        return
+
+    def _bits(self, width: int) -> int:
+        """The narrowest lanes whose sums over ``width`` cards cannot overflow
+        """
+        bound: int = max(1, width) * max(t.magnitude for t in self._templates.values())
+        for bits in sorted(_TYPECODES):
+            if bound < 1 << bits - 1:
+                return bits
+        raise ValueError(f"Hands of {width} cards overflow the lanes of a HandTable")
+
+    def _rows(self, bits: int) -> Dict[int, int]:
+        """The packed contribution of each template, for lanes of the given width
+        """
+        rows: Optional[Dict[int, int]] = self._packed.get(bits)
+        if rows is not None:
+            return rows
+        n: int = len(self.columns)
+        rows = self._packed[bits] = {}
+        for template_id, t in self._templates.items():
+            row: int = sum(1 << bits * c for c in t.counters)
+            if t.conditional:
+                row += 1 << bits * _CONDITIONAL
+            for column, value in t.basic:
+                row += (value << bits * (_EFFECTS + column)) + (1 << bits * (_EFFECTS + n + column))
+            if t.faction in ALLY_FACTIONS:
+                block: int = _EFFECTS + 2 * n * (1 + ALLY_FACTIONS.index(t.faction))
+                for column, value in t.ally:
+                    row += (value << bits * (block + column)) + (1 << bits * (block + n + column))
+            rows[template_id] = row
+        return rows
+
+
+def _activates(counts: List[int], faction: CardFaction) -> bool:
+    """Whether the ally abilities of a faction are active, as in ``Hand``
+    """
+    if faction not in ALLY_FACTIONS:
+        return False
+    return counts[_ALL] > 0 or counts[len(COUNTERS) + FACTIONS.index(faction)] > 1
+
+
+def hand_table(catalog=None) -> HandTable:
+    """The ``HandTable`` of a catalog, built on first use
+
+    Parameters
+    ----------
+    catalog : CardCatalog (Optional)
+        The catalog whose templates make up the hands (Default is the process-local
+        catalog)
+    """
+    catalog = catalog if catalog is not None else local_catalog()
+    table: Optional[HandTable] = _tables.get(catalog)
+    if table is None:
+        table = _tables[catalog] = HandTable(catalog)
+    return table
@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: mcts
+    :synopsis: A bot that chooses its plays by Monte Carlo tree search
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+
+An ``MCTSPolicy`` searches three kinds of decisions: which card to play next, which
+card of the trade row to buy (or to stop buying), and which cards to scrap. Every
+other decision is left to ``TurnPolicy``.
+
+Each decision is the root of a search whose children are the candidate actions,
+cards of the same template counting as one. Children are chosen by UCB1, and each
+visit is a rollout:
+
+1. The game and the turn in progress are forked (``Game.fork``, ``Turn.fork``), which
+   only copies the piles of cards
+2. The fork is determinized: the main deck and the undrawn piles, whose order the
+   bot cannot know, are shuffled with the rollout's generator
+3. The action is applied, the turn is played out and the game continues for up to
+   ``horizon`` turns, every player following a ``RolloutPolicy``
+4. The rollout is worth 1 if the bot won, 0 if it lost, and otherwise depends on
+   the difference between its authority and that of its strongest opponent
+
+The search below the root is left to the rollouts: the draws between two decisions
+are random, so deeper nodes would hardly ever be revisited.
+
+Every rollout has its own generator, seeded from the policy's seed, the decision and
+the rollout number, so a search with a budget of rollouts is reproducible. Searches
+can be spread over a process pool: each worker searches the same decision with its
+own seeds, and their visit counts are added up (root parallelization).
+"""
+
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from math import log, sqrt
+from random import Random
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from .cards import Card, CardAction, CardTarget
+from .catalog import install_catalog, local_catalog
+from .turns import Turn, TurnPolicy, price
+from .zobrist import TranspositionTable, ZobristHash
+
+CardList = List[Card]
+
+Action = Union[None, str, Tuple[str, ...]]
+"""A candidate action: the UUID of a card to play or buy, ``None`` to stop buying, or
+the UUIDs of the cards to scrap"""
+
+_ORDERED_ACTIONS = frozenset([(CardTarget.OWNER, CardAction.DISCARD),
+                              (CardTarget.OWNER, CardAction.SCRAP)])
+"""The effects whose outcome depends on the cards in hand or in play"""
+
+
+class SearchStats(object):
+    """Counts the decisions searched by a policy and the rollouts they took
+
+    ``reused`` counts the decisions taken from the transposition table alone.
+    """
+    def __init__(self):
+        self.decisions: int = 0
+        self.rollouts: int = 0
+        self.reused: int = 0
+        self.seconds: float = 0.0
+        return
+
+    @property
+    def rollouts_per_second(self) -> float:
+        return self.rollouts / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {'decisions': self.decisions,
+                'rollouts': self.rollouts,
+                'reused': self.reused,
+                'seconds': round(self.seconds, 3),
+                'rollouts_per_second': round(self.rollouts_per_second, 1)}
+
+
+class RolloutPolicy(TurnPolicy):
+    """A cheap randomized policy for the players of a rollout
+
+    It buys a random affordable card with probability ``epsilon``, and otherwise plays
+    like ``TurnPolicy``.
+
+    Parameters
+    ----------
+    rng : Random
+        The generator of the rollout
+    epsilon : float (Optional)
+        The probability of buying at random (Default is 0.3)
+    """
+    def __init__(self, rng: Random, epsilon: float = 0.3):
+        self.rng: Random = rng
+        self.epsilon: float = epsilon
+        return
+
+    def buy(self, cards: CardList, money: int) -> Optional[Card]:
+        if self.rng.random() >= self.epsilon:
+            return super().buy(cards, money)
+        affordable: CardList = [c for c in cards if price(c) <= money]
+        return self.rng.choice(affordable) if affordable else None
+
+
+class MCTSPolicy(TurnPolicy):
+    """A policy that searches its decisions with Monte Carlo tree search
+
+    Without a game to fork, i.e. for a turn played outside of a ``Game``, the policy
+    plays like ``TurnPolicy``.
+
+    Parameters
+    ----------
+    rollouts : int (Optional)
+        The number of rollouts per decision (Default is 64, or no limit when
+        ``seconds`` is given)
+    seconds : float (Optional)
+        The time allowed per decision (Default is no limit)
+    horizon : int (Optional)
+        The number of turns played by a rollout after the current one (Default is 8)
+    exploration : float (Optional)
+        The exploration constant of UCB1 (Default is 1.4)
+    workers : int (Optional)
+        The number of worker processes the rollouts are spread over (Default is 0,
+        searching in this process)
+    seed : int (Optional)
+        Seeds the rollouts (Default is a random seed)
+    table : TranspositionTable (Optional)
+        Keeps the results of searched decisions, which are reused when a decision
+        comes up again in the same position; positions are only recognized in games
+        hashed with ``zobrist`` keys (Default is no table)
+
+    Attributes
+    ----------
+    stats : SearchStats
+        The number of decisions and rollouts searched so far
+    """
+    blocking: bool = True
+
+    def __init__(self, rollouts: Optional[int] = None, seconds: Optional[float] = None,
+                 horizon: int = 8, exploration: float = 1.4, workers: int = 0,
+                 seed: Optional[int] = None, table: Optional[TranspositionTable] = None):
+        if rollouts is None and seconds is None:
+            rollouts = 64
+        self.rollouts: Optional[int] = rollouts
+        self.seconds: Optional[float] = seconds
+        self.horizon: int = horizon
+        self.exploration: float = exploration
+        self.workers: int = workers
+        self.table: Optional[TranspositionTable] = table
+        self.stats: SearchStats = SearchStats()
+        self._rng: Random = Random(seed)
+        self._turn: Optional[Turn] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        return
+
+    def start(self, turn: Turn) -> None:
+        self._turn = turn
+        return
+
+    def next_card(self, hand: CardList) -> Card:
+        candidates: CardList = _distinct(hand)
+        if len(candidates) < 2 or not self._searchable() or not _order_matters(hand):
+            return super().next_card(hand)
+        uuid: str = self._search('play', [c.uuid for c in candidates],
+                                 [c.template_id for c in candidates])
+        return next(c for c in hand if c.uuid == uuid)
+
+    def buy(self, cards: CardList, money: int) -> Optional[Card]:
+        affordable: CardList = _distinct([c for c in cards if price(c) <= money])
+        if not affordable or not self._searchable():
+            return super().buy(cards, money)
+        uuid: Optional[str] = self._search('buy', [None] + [c.uuid for c in affordable],
+                                           [None] + [c.template_id for c in affordable])
+        return next((c for c in cards if c.uuid == uuid), None)
+
+    def scrap(self, cards: CardList, n: int) -> CardList:
+        candidates: CardList = _distinct(cards)
+        if not candidates or not self._searchable():
+            return super().scrap(cards, n)
+        choices: List[Tuple[Card, ...]] = [chosen for k in range(min(n, len(candidates)) + 1)
+                                           for chosen in combinations(candidates, k)]
+        uuids: Tuple[str, ...] = self._search('scrap',
+                                              [tuple(c.uuid for c in chosen) for chosen in choices],
+                                              [tuple(c.template_id for c in chosen)
+                                               for chosen in choices])
+        return [c for c in cards if c.uuid in uuids]
+
+    def close(self) -> None:
+        """Shuts the worker processes down, if any
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        return
+
+    def _searchable(self) -> bool:
+        return self._turn is not None and self._turn.game is not None
+
+    def _search(self, kind: str, actions: List[Action], labels: list) -> Action:
+        """Searches a decision of the turn in progress
+
+        The evaluation of a position found in the transposition table counts towards
+        the budget of rollouts, and the decision is stored back with its new rollouts.
+
+        Parameters
+        ----------
+        kind : str
+            One of ``play``, ``buy`` or ``scrap``
+        actions : [Action]
+            The candidate actions
+        labels : list
+            The template ids of each action, which identify it across transpositions
+
+        Returns
+        -------
+        Action
+            The most visited action
+        """
+        start: float = time.perf_counter()
+        key: Optional[int] = self._key(kind, labels)
+        known: Optional[List[Tuple[int, float]]] = None if key is None else self.table.get(key)
+        results: List[List[Tuple[int, float]]] = [] if known is None else [known]
+        rollouts: Optional[int] = self.rollouts
+        if known is not None and rollouts is not None:
+            rollouts = max(rollouts - sum(v for v, _ in known), 0)
+        if rollouts == 0:
+            self.stats.reused += 1
+        else:
+            results += self._rollouts(kind, actions, rollouts)
+        merged: List[Tuple[int, float]] = [(sum(r[i][0] for r in results),
+                                            sum(r[i][1] for r in results))
+                                           for i in range(len(actions))]
+        visits: List[int] = [v for v, _ in merged]
+        if key is not None:
+            self.table.put(key, merged, depth=sum(visits))
+        self.stats.decisions += 1
+        self.stats.rollouts += sum(visits) - sum(v for v, _ in known or ())
+        self.stats.seconds += time.perf_counter() - start
+        return actions[max(range(len(actions)), key=visits.__getitem__)]
+
+    def _rollouts(self, kind: str, actions: List[Action],
+                  rollouts: Optional[int]) -> List[List[Tuple[int, float]]]:
+        """Runs the rollouts of a decision, in this process or on the workers
+        """
+        turn: Turn = self._turn
+        seed: int = self._rng.getrandbits(64)
+        viewer: int = turn.game.players.index(turn.player)
+        if not self.workers:
+            return [search(turn.game, turn, kind, actions, rollouts, self.seconds,
+                           str(seed), self.horizon, self.exploration, viewer)]
+        game = turn.game.fork([TurnPolicy()] * len(turn.game.players))
+        payload: bytes = pickle.dumps((game, turn.fork(game)))
+        futures = [self._workers().submit(_search_payload, payload, kind, actions, n,
+                                          self.seconds, f"{seed}:{w}", self.horizon,
+                                          self.exploration, viewer)
+                   for w, n in enumerate(_split(rollouts, self.workers))]
+        return [f.result() for f in futures]
+
+    def _key(self, kind: str, labels: list) -> Optional[int]:
+        """The key of the decision in the transposition table, if there is one
+        """
+        zobrist: Optional[ZobristHash] = self._turn.game.zobrist
+        if self.table is None or zobrist is None:
+            return None
+        return zobrist.position(self._turn) ^ zobrist.keys.key('decision', kind, tuple(labels))
+
+    def _workers(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             initializer=install_catalog,
+                                             initargs=(local_catalog(),))
+        return self._pool
+
+    def __getstate__(self) -> dict:
+        """Drops the turn in progress and the worker processes
+        """
+        state: dict = dict(self.__dict__)
+        state['_turn'] = None
+        state['_pool'] = None
+        return state
+
+
+def search(game, turn: Turn, kind: str, actions: Sequence[Action], rollouts: Optional[int],
+           seconds: Optional[float], seed: str, horizon: int, exploration: float,
+           viewer: int) -> List[Tuple[int, float]]:
+    """Runs the rollouts of a decision, choosing the action of each by UCB1
+
+    Parameters
+    ----------
+    game : Game
+        The game the decision is taken in, which is not modified
+    turn : Turn
+        The turn in progress
+    kind : str
+        One of ``play``, ``buy`` or ``scrap``
+    actions : [Action]
+        The candidate actions
+    rollouts : int
+        The number of rollouts, or ``None`` for no limit
+    seconds : float
+        The time allowed, or ``None`` for no limit
+    seed : str
+        Seeds the rollouts, together with their number
+    horizon : int
+        The number of turns played after the current one
+    exploration : float
+        The exploration constant of UCB1
+    viewer : int
+        The index in ``game.players`` of the player taking the decision
+
+    Returns
+    -------
+    [(int, float)]
+        The number of visits and the total value of each action
+    """
+    deadline: Optional[float] = None if seconds is None else time.perf_counter() + seconds
+    visits: List[int] = [0] * len(actions)
+    totals: List[float] = [0.0] * len(actions)
+    n: int = 0
+    while rollouts is None or n < rollouts:
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        if n < len(actions):
+            a: int = n
+        else:
+            bonus: float = exploration * sqrt(log(n))
+            a = max(range(len(actions)),
+                    key=lambda i: totals[i] / visits[i] + bonus / sqrt(visits[i]))
+        value: float = rollout(game, turn, kind, actions[a], Random(f"{seed}:{n}"),
+                               horizon, viewer)
+        visits[a] += 1
+        totals[a] += value
+        n += 1
+    return list(zip(visits, totals))
+
+
+def rollout(game, turn: Turn, kind: str, action: Action, rng: Random, horizon: int,
+            viewer: int) -> float:
+    """Plays a single rollout of an action on a fork of the game
+
+    Returns
+    -------
+    float
+        The value of the outcome for the player taking the decision, from 0 to 1
+    """
+    fork = game.fork([RolloutPolicy(rng) for _ in game.players])
+    forked: Turn = turn.fork(fork)
+    rng.shuffle(fork.maindeck._cards)
+    for p in fork.players:
+        rng.shuffle(p._deck._undrawn)
+        p._deck._rng = rng
+    _apply(forked, kind, action)
+    fork.advance(forked.player, forked.opponent, forked.resume())
+    last: int = fork.turn + horizon
+    while not fork.over and fork.turn < last:
+        fork.step()
+    me = fork.players[viewer]
+    if not me.alive:
+        return 0.0
+    if fork.winner is me:
+        return 1.0
+    strongest: int = max(p.health for p in fork.alive if p is not me)
+    return min(max(0.5 + (me.health - strongest) / 100, 0.0), 1.0)
+
+
+def _apply(turn: Turn, kind: str, action: Action) -> None:
+    """Takes a decision on a forked turn
+    """
+    if kind == 'play':
+        turn.play_card(next(c for c in turn.hand if c.uuid == action))
+    elif kind == 'buy':
+        if action is None:
+            turn.money = 0
+        else:
+            turn.buy_card(next(c for c in turn.traderow.available if c.uuid == action))
+    else:
+        turn.scrapped += [c for c in turn.in_play if c.uuid in action]
+    return
+
+
+def _search_payload(payload: bytes, *args) -> List[Tuple[int, float]]:
+    """Runs ``search`` in a worker process on a pickled game and turn
+    """
+    game, turn = pickle.loads(payload)
+    return search(game, turn, *args)
+
+
+def _split(rollouts: Optional[int], workers: int) -> List[Optional[int]]:
+    """Splits a budget of rollouts between workers
+    """
+    if rollouts is None:
+        return [None] * workers
+    return [rollouts // workers + (w < rollouts % workers) for w in range(workers)]
+
+
+def _distinct(cards: CardList) -> CardList:
+    """One card of each template, in order of first appearance
+    """
+    seen: Dict[int, Card] = {}
+    for c in cards:
+        seen.setdefault(c.template_id, c)
+    return list(seen.values())
+
+
+def _order_matters(hand: CardList) -> bool:
+    """Whether the order in which a hand is played can change the outcome of the turn
+
+    Effects are applied in the same way whatever the order, except for those that
+    depend on the cards in hand or in play when they are resolved, and conditional
+    effects, whose conditions may stop holding.
+    """
+    for card in hand:
+        for e in card.effects_basic + card.effects_ally:
+            if (e.target, e.action) in _ORDERED_ACTIONS or e.condition.codes:
+                return True
+    return False
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: persistence
+    :synopsis: Write-behind persistence of the event logs of live games
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+"""
+
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
+from pony.orm import Database, LongStr, Optional as OptionalAttr, PrimaryKey, Required, Set
+from pony.orm import db_session
+from .events import EventLog, EventTuple, Snapshot, read_log
+
+
+class GameStore(object):
+    """Persists the events and snapshots of games in progress to a SQLite file
+
+    Recording a game's progress with ``stage`` only copies references to the
+    events and snapshots added to its log since the previous call, which the store
+    then holds until they are written, so the log is trimmed (see
+    ``EventLog.trim``) and a live game keeps a bounded history in memory. A background
+    thread encodes everything staged and writes it in a single transaction every
+    ``interval`` seconds, so the data of a live game is never more than about
+    ``interval`` seconds stale and the game never waits on the disk.
+
+    The store uses its own Pony ``Database``, separate from the card database, in
+    SQLite's write-ahead-log mode so that reading a game back does not block the
+    writer.
+
+    Parameters
+    ----------
+    path : str
+        The path of the SQLite file, which is created if it does not exist
+    interval : float (Optional)
+        The maximum number of seconds between flushes (Default is 1.0)
+    max_pending : int (Optional)
+        The number of staged records that triggers an early flush (Default is 10000)
+
+    Examples
+    --------
+    >>> store = GameStore('games.sqlite')
+    >>> store.stage('1', log)   # after every action
+    >>> store.close()           # flushes whatever is still staged
+    >>> events, snapshots = GameStore('games.sqlite').load('1')
+    """
+    def __init__(self, path: str, interval: float = 1.0, max_pending: int = 10000):
+        self.path: str = path
+        self.interval: float = interval
+        self.max_pending: int = max_pending
+        self.flushes: int = 0
+        self.db: Database = Database()
+        self._game, self._chunk = _define_entities(self.db)
+        self.db.on_connect(provider='sqlite')(_configure_connection)
+        self.db.bind('sqlite', path, create_db=True)
+        self.db.generate_mapping(create_tables=True)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[str, List[Union[EventTuple, Snapshot]]] = {}
+        self._pending_count: int = 0
+        self._finished: Dict[str, bool] = {}
+        self._cursors: Dict[str, Tuple[int, int]] = {}
+        self._wake = threading.Event()
+        self._closed: bool = False
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name='gamestore', daemon=True)
+        self._thread.start()
+        return
+
+    def stage(self, game_id: str, log: EventLog, finished: bool = False) -> None:
+        """Queues the events and snapshots added to a game's log since the last call
+
+        Parameters
+        ----------
+        game_id : str
+            The id of the game
+        log : EventLog
+            The game's log
+        finished : bool (Optional)
+            Marks the game as over; a final snapshot is taken if the log does not
+            already end with one
+        """
+        if finished and (not log.snapshots or log.snapshots[-1]['seq'] != log.seq):
+            log.snapshot()
+        events, snapshots = self._cursors.get(game_id, (0, 0))
+        records: List[Union[EventTuple, Snapshot]] = _merge(log, events, snapshots)
+        log.trim()
+        self._cursors[game_id] = (log.seq, log.first_snapshot + len(log.snapshots))
+        if finished:
+            del self._cursors[game_id]
+        if not records and not finished:
+            return
+        with self._lock:
+            self._pending.setdefault(game_id, []).extend(records)
+            self._pending_count += len(records)
+            if finished:
+                self._finished[game_id] = True
+            full: bool = self._pending_count >= self.max_pending
+        if full:
+            self._wake.set()
+        return
+
+    def flush(self) -> int:
+        """Writes everything staged so far in a single transaction
+
+        Returns
+        -------
+        int
+            The number of records written
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                finished, self._finished = self._finished, {}
+                self._pending_count = 0
+            if not pending and not finished:
+                return 0
+            try:
+                self._write(pending, finished)
+            except BaseException:
+                with self._lock:
+                    for game_id, records in self._pending.items():
+                        pending.setdefault(game_id, []).extend(records)
+                    self._pending = pending
+                    self._pending_count = sum(len(r) for r in pending.values())
+                    finished.update(self._finished)
+                    self._finished = finished
+                raise
+            self.flushes += 1
+        return sum(len(r) for r in pending.values())
+
+    @db_session
+    def _write(self, pending: Dict[str, List[Union[EventTuple, Snapshot]]],
+               finished: Dict[str, bool]) -> None:
+        now: float = time.time()
+        for game_id in set(pending) | set(finished):
+            game = self._game.get(id=game_id)
+            if game is None:
+                game = self._game(id=game_id, seq=0, chunks_written=0, updated=now)
+            records = pending.get(game_id, [])
+            if records:
+                lines: str = ''.join(json.dumps(r, separators=(',', ':')) + '\n'
+                                     for r in records)
+                self._chunk(game=game, index=game.chunks_written, data=lines)
+                game.chunks_written += 1
+                game.seq += sum(1 for r in records if not isinstance(r, dict))
+            game.updated = now
+            if finished.get(game_id):
+                game.finished = now
+        return
+
+    @db_session
+    def load(self, game_id: str) -> Tuple[List[EventTuple], List[Snapshot]]:
+        """Reads back the persisted events and snapshots of a game
+
+        The result can be handed to ``ReplayEngine`` to rebuild the game's state.
+
+        Returns
+        -------
+        ([EventTuple], [Snapshot])
+            The events and snapshots, empty if the game was never flushed
+        """
+        chunks = self._chunk.select(lambda c: c.game.id == game_id).order_by(
+            lambda c: c.index)
+        lines: List[str] = [line for c in chunks for line in c.data.splitlines()]
+        return read_log(lines)
+
+    @db_session
+    def games(self, finished: Optional[bool] = None) -> List[str]:
+        """The ids of the persisted games, optionally only those (not) finished
+        """
+        games = self._game.select()
+        if finished is True:
+            games = games.filter(lambda g: g.finished is not None)
+        elif finished is False:
+            games = games.filter(lambda g: g.finished is None)
+        return sorted(g.id for g in games)
+
+    def close(self) -> None:
+        """Stops the background thread and flushes everything that is still staged
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        self.db.disconnect()
+        if self._error is not None:
+            raise self._error
+        return
+
+    def __enter__(self) -> 'GameStore':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+        return
+
+    def _run(self) -> None:
+        """Flushes every ``interval`` seconds, or sooner when too much is staged
+        """
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self._error = e
+        self.db.disconnect()
+        return
+
+
+def _merge(log: EventLog, events: int, snapshots: int) -> List[Union[EventTuple, Snapshot]]:
+    """The records of a log after the given numbers of events and snapshots, in the
+    order they were recorded
+    """
+    records: List[Union[EventTuple, Snapshot]] = []
+    i: int = events - log.first
+    for snap in log.snapshots[snapshots - log.first_snapshot:]:
+        records.extend(log.events[i:snap['seq'] - log.first])
+        records.append(snap)
+        i = max(i, snap['seq'] - log.first)
+    records.extend(log.events[i:])
+    return records
+
+
+def _configure_connection(db: Database, connection) -> None:
+    """Puts every connection to the store in write-ahead-log mode
+
+    With WAL, a commit only appends to the log, and ``synchronous=NORMAL`` only
+    syncs the log at checkpoints: a crash may lose the last transactions but never
+    corrupts the file.
+    """
+    cursor = connection.cursor()
+    cursor.execute('PRAGMA journal_mode = WAL')
+    cursor.execute('PRAGMA synchronous = NORMAL')
+    return
+
+
+def _define_entities(db: Database):
+    """Defines the entities of a game store on the given database
+
+    Returns
+    -------
+    (StoredGame, StoredChunk)
+        The entity classes
+    """
+    class StoredGame(db.Entity):
+        """A game whose progress is persisted
+        """
+        id = PrimaryKey(str)
+        """(str) The id of the game"""
+
+        seq = Required(int, size=64)
+        """(int) The number of events persisted"""
+
+        chunks_written = Required(int)
+        """(int) The number of chunks persisted, i.e. the index of the next chunk"""
+
+        updated = Required(float)
+        """(float) The time of the last flush that included the game"""
+
+        finished = OptionalAttr(float)
+        """(float) The time at which the game was marked as over, if it was"""
+
+        chunks = Set('StoredChunk')
+        """The batches of records written for the game"""
+
+    class StoredChunk(db.Entity):
+        """The records of a single game written by a single flush
+        """
+        game = Required(StoredGame)
+        """(StoredGame) The game the records belong to"""
+
+        index = Required(int)
+        """(int) The position of the chunk among the game's chunks"""
+
+        data = Required(LongStr)
+        """(str) The records as JSON lines, as written by an ``EventLog``"""
+
+        PrimaryKey(game, index)
+
+    return StoredGame, StoredChunk
@@ -5,22 +5,123 @@
 .. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
 """
 
-
-from .decks import PlayerDeck
+from typing import List, Optional, Sequence
+from .cards import Card
+from .catalog import catalog_of
+from .decks import PlayerDeck, TradeRow
+from .effects import PlayerState
+from .turns import EffectQueue, Turn, TurnPolicy, TurnReport
 
 
 class Player(object):
     """
     Represents a single player
+
+    Parameters
+    ----------
+    name : str
+        The name of the player
+    cards : CardRepo or CardCatalog
+        The source of cards shared by every player of the game
+    policy : TurnPolicy (Optional)
+        Makes the player's decisions during a turn (Default is a ``TurnPolicy``)
+    deck : PlayerDeck (Optional)
+        The player's deck (Default is a starting deck dealt from ``cards``)
+
+    Attributes
+    ----------
+    state : PlayerState
+        The player's health and the effects accumulated during the current turn
     """
-    def __init__(self, name):
-        self.name = name
-        self._deck = PlayerDeck()
-        self._cards_drawn = self._deck.draw()  # draws 5 by default
-        self._bases = None
-        self._queued_effects = None
-        self._health = 50
-        self._money = 0
-        pass
+    def __init__(self, name: str, cards, policy: Optional[TurnPolicy] = None,
+                 deck: Optional[PlayerDeck] = None):
+        self.name: str = name
+        self.policy: TurnPolicy = policy or TurnPolicy()
+        self.state: PlayerState = PlayerState()
+        self._cards = cards
+        self._deck: PlayerDeck = deck or PlayerDeck(cards.player_deck_cards(), catalog_of(cards))
+        self._bases: List[Card] = []
+        self._queued_effects: EffectQueue = EffectQueue()
+        return
+
+    @classmethod
+    def table(cls, names: Sequence[str], cards,
+              policies: Optional[Sequence[TurnPolicy]] = None) -> List['Player']:
+        """Seats the players of a game, dealing every starting deck in a single call
+
+        Parameters
+        ----------
+        names : [str]
+            The names of the players, in turn order
+        cards : CardRepo or CardCatalog
+            The source of cards shared by every player
+        policies : [TurnPolicy] (Optional)
+            One policy per player (Default is a ``TurnPolicy`` each)
+
+        Returns
+        -------
+        [Player]
+            The players, in the order of ``names``
+        """
+        decks: List[List[Card]] = cards.player_deck_cards(len(names))
+        catalog = catalog_of(cards)
+        policies = policies or [None] * len(names)
+        return [cls(name, cards, policy, PlayerDeck(deck, catalog))
+                for name, policy, deck in zip(names, policies, decks)]
+
+    def fork(self, policy: Optional[TurnPolicy] = None) -> 'Player':
+        """Copies the player, whose deck is forked, see ``PlayerDeck.fork``
+
+        Parameters
+        ----------
+        policy : TurnPolicy (Optional)
+            The policy of the copy (Default is the player's policy)
+        """
+        player: Player = Player.__new__(Player)
+        player.name = self.name
+        player.policy = policy or self.policy
+        player.state = self.state.copy()
+        player._cards = self._cards
+        player._deck = self._deck.fork()
+        player._bases = list(self._bases)
+        player._queued_effects = self._queued_effects.copy()
+        return player
+
+    def __getstate__(self) -> dict:
+        """Drops the source of cards, which may hold a database connection
+        """
+        state: dict = dict(self.__dict__)
+        del state['_cards']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        """Restores the player, whose source of cards becomes the catalog of their deck
+        """
+        self.__dict__.update(state)
+        self._cards = self._deck._catalog
+        return
+
+    @property
+    def health(self) -> int:
+        return self.state.health
+
+    @property
+    def alive(self) -> bool:
+        return self.state.health > 0
+
+    def take_turn(self, opponent: 'Player', traderow: Optional[TradeRow] = None) -> TurnReport:
+        """Draws a hand and plays it against an opponent
 
+        Parameters
+        ----------
+        opponent : Player
+            The player receiving the attacks and forced discards
+        traderow : TradeRow (Optional)
+            The trade row to buy from (Default is buying nothing)
 
+        Returns
+        -------
+        TurnReport
+            A summary of the turn
+        """
+        return Turn(self, opponent, traderow).play()
@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: replay
+    :synopsis: Rebuilds game state deterministically from an event log
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+
+The zones of a snapshot are rebuilt the way unpickling rebuilds decks, and every
+event is replayed through the method of the deck that recorded it, so a replay
+follows the same rules as the game did. A reshuffle is replayed by handing its
+recorded seed to the deck in place of its random generator.
+"""
+
+import os
+import time
+from array import array
+from bisect import bisect_right
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from .cards import Card
+from .catalog import CardCatalog, install_catalog, local_catalog
+from .decks import MainDeck, PlayerDeck, TradeRow
+from .events import ArchiveReader, EventKind, EventTuple, Snapshot, read_log
+from .exceptions import RealmsException, ReplayMismatch, UUIDNotFoundError
+
+CardList = List[Card]
+
+
+ReplayResult = NamedTuple('ReplayResult', [
+                          ('game_id', str),
+                          ('events', int),
+                          ('mismatch', Optional[str]),
+                          ('seconds', float)])
+
+
+class _RecordedSeeds(object):
+    """Stands in for the random generator of a replayed ``PlayerDeck``, producing the
+    seeds of its recorded reshuffles
+    """
+    def __init__(self):
+        self.seeds: List[int] = []
+        return
+
+    def getrandbits(self, k: int) -> int:
+        if not self.seeds:
+            raise ReplayMismatch("Deck reshuffled without a recorded seed")
+        return self.seeds.pop()
+
+
+class ReplayState(object):
+    """The state of every zone of a game at a given point in its event log
+
+    Attributes
+    ----------
+    seq : int
+        The number of events that have been applied
+    zones : Dict[str, object]
+        The rebuilt ``PlayerDeck``, ``MainDeck`` and ``TradeRow`` objects, keyed by zone
+    limbo : Dict[str, Card]
+        The cards that are not in any zone (in a hand, in play, or just acquired),
+        keyed by UUID
+    """
+    def __init__(self, seq: int, zones: Dict[str, object], limbo: Dict[str, Card]):
+        self.seq: int = seq
+        self.zones: Dict[str, object] = zones
+        self.limbo: Dict[str, Card] = limbo
+        return
+
+    def digest(self) -> Dict[str, Dict[str, List[str]]]:
+        """The UUIDs of the cards in each pile of each zone, for comparing states
+        """
+        return {name: {pile: [c.uuid for c in cards] for pile, cards in zone._piles().items()}
+                for name, zone in self.zones.items()}
+
+
+class ReplayEngine(object):
+    """Rebuilds the state of a game from the events and snapshots of an ``EventLog``
+
+    Replaying to a given event starts from the latest snapshot taken at or before
+    that event, so only the events since the snapshot are applied.
+
+    Parameters
+    ----------
+    events : List[EventTuple]
+        The recorded events
+    snapshots : List[Snapshot]
+        The recorded snapshots, in order (there is always at least the initial one)
+    catalog : CardCatalog (Optional)
+        The catalog from which cards are rebuilt (Default is the process-local catalog)
+    first : int (Optional)
+        The number of the first event, for a log that was trimmed (Default is 0)
+    """
+    def __init__(self, events: List[EventTuple], snapshots: List[Snapshot],
+                 catalog: Optional[CardCatalog] = None, first: int = 0):
+        self._events: List[EventTuple] = events
+        self._first: int = first
+        self._snapshots: List[Snapshot] = snapshots
+        self._snapshot_seqs: List[int] = [s['seq'] for s in snapshots]
+        self._catalog: CardCatalog = catalog if catalog is not None else local_catalog()
+        self._handlers = {
+            EventKind.DRAW.value: self._apply_draw,
+            EventKind.DISCARD.value: self._apply_discard,
+            EventKind.RESHUFFLE.value: self._apply_reshuffle,
+            EventKind.POP.value: self._apply_pop,
+            EventKind.FILL.value: self._apply_fill,
+            EventKind.EXPLORER.value: self._apply_explorer,
+            EventKind.ACQUIRE.value: self._apply_acquire,
+            EventKind.SCRAP.value: self._apply_scrap,
+        }
+        return
+
+    @classmethod
+    def from_log(cls, log, catalog: Optional[CardCatalog] = None) -> 'ReplayEngine':
+        """Creates a replay engine for the events held by an ``EventLog``
+        """
+        return cls(log.events, log.snapshots, catalog, log.first)
+
+    @classmethod
+    def from_lines(cls, lines, catalog: Optional[CardCatalog] = None) -> 'ReplayEngine':
+        """Creates a replay engine from the JSON lines written by an ``EventLog``
+
+        This is the crash-recovery path: the log file of a live game is read back
+        and replayed to its last complete event.
+        """
+        events, snapshots = read_log(lines)
+        return cls(events, snapshots, catalog)
+
+    def replay(self, upto: Optional[int] = None) -> ReplayState:
+        """Rebuilds the game state after the given number of events
+
+        Parameters
+        ----------
+        upto : int (Optional)
+            The number of events to apply (Default is every event)
+
+        Returns
+        -------
+        ReplayState
+            The rebuilt state
+
+        Raises
+        ------
+        ReplayMismatch
+            Raised when an event does not match the state it is applied to
+        ValueError
+            Raised when the events up to ``upto`` precede the first snapshot held
+        """
+        end: int = self._first + len(self._events)
+        upto = end if upto is None else min(upto, end)
+        i = bisect_right(self._snapshot_seqs, upto) - 1
+        if i < 0 and self._first:
+            raise ValueError(f"The events before event {self._first} were trimmed")
+        state: ReplayState = self.restore(self._snapshots[max(i, 0)])
+        for event in self._events[state.seq - self._first:upto - self._first]:
+            self.apply(state, event)
+        return state
+
+    def restore(self, snapshot: Snapshot) -> ReplayState:
+        """Rebuilds the state recorded in a snapshot
+        """
+        zones: Dict[str, object] = {}
+        rows = [name for name, (kind, _) in snapshot['zones'].items() if kind == 'TradeRow']
+        for name, (kind, piles) in snapshot['zones'].items():
+            if name not in rows:
+                zones[name] = self._restore_zone(kind, piles)
+        maindeck: Optional[MainDeck] = next((z for z in zones.values()
+                                             if isinstance(z, MainDeck)), None)
+        for name in rows:
+            zones[name] = self._restore_zone('TradeRow', snapshot['zones'][name][1], maindeck)
+        limbo: Dict[str, Card] = {c.uuid: c for c in self._unpack(snapshot['limbo'])}
+        return ReplayState(snapshot['seq'], zones, limbo)
+
+    def apply(self, state: ReplayState, event: EventTuple) -> None:
+        """Applies a single event to the state
+        """
+        self._handlers[event[0]](state, state.zones[event[1]], *event[2:])
+        state.seq += 1
+        return
+
+    def _restore_zone(self, kind: str, piles, maindeck: Optional[MainDeck] = None) -> object:
+        """Rebuilds a deck from its piles as unpickling does, see ``PlayerDeck.__setstate__``
+        """
+        zones = {'PlayerDeck': PlayerDeck, 'MainDeck': MainDeck, 'TradeRow': TradeRow}
+        if kind not in zones:
+            raise ReplayMismatch(f"Unknown zone type {kind}")
+        state: dict = {pile: (array('H', ids).tobytes(), uuids)
+                       for pile, (ids, uuids) in piles.items()}
+        state.update(catalog=self._catalog, maindeck=maindeck)
+        zone = zones[kind].__new__(zones[kind])
+        zone.__setstate__(state)
+        if kind == 'PlayerDeck':
+            zone._rng = _RecordedSeeds()
+        return zone
+
+    def _unpack(self, packed) -> CardList:
+        template_ids, uuids = packed
+        return [self._catalog.new_card(t, u) for t, u in zip(template_ids, uuids)]
+
+    def _take_from_limbo(self, state: ReplayState, template_id: int, uuid: str) -> Card:
+        card: Optional[Card] = state.limbo.pop(uuid, None)
+        if card is None:
+            card = self._catalog.new_card(template_id, uuid)
+        return card
+
+    @staticmethod
+    def _check(card: Card, uuid: str) -> None:
+        if card.uuid != uuid:
+            raise ReplayMismatch(f"Expected card {uuid}, found {card.uuid}")
+        return
+
+    def _apply_draw(self, state: ReplayState, deck: PlayerDeck, template_id: int, uuid: str):
+        card: Card = deck.draw(1)[0]
+        ReplayEngine._check(card, uuid)
+        state.limbo[uuid] = card
+
+    def _apply_discard(self, state: ReplayState, deck: PlayerDeck, template_id: int, uuid: str):
+        deck.discard(self._take_from_limbo(state, template_id, uuid))
+
+    def _apply_reshuffle(self, state: ReplayState, deck: PlayerDeck, seed: int):
+        deck._rng.seeds.append(seed)
+        deck._refill_undrawn()
+
+    def _apply_pop(self, state: ReplayState, deck: MainDeck, template_id: int, uuid: str):
+        card: Card = deck.next_card()
+        ReplayEngine._check(card, uuid)
+        state.limbo[uuid] = card
+
+    def _apply_fill(self, state: ReplayState, row: TradeRow, template_id: int, uuid: str):
+        row._fill(self._take_from_limbo(state, template_id, uuid))
+
+    def _apply_explorer(self, state: ReplayState, row: TradeRow, template_id: int, uuid: str):
+        row._set_explorer(self._catalog.new_card(template_id, uuid))
+
+    def _apply_acquire(self, state: ReplayState, row: TradeRow, template_id: int, uuid: str):
+        try:
+            state.limbo[uuid] = row.acquire(uuid)
+        except UUIDNotFoundError:
+            raise ReplayMismatch(f"Card {uuid} is not in the trade row")
+
+    def _apply_scrap(self, state: ReplayState, row: TradeRow, template_id: int, uuid: str):
+        try:
+            row.scrap(uuid)
+        except UUIDNotFoundError:
+            raise ReplayMismatch(f"Card {uuid} is not in the trade row")
+
+
+class VerificationReport(object):
+    """The outcome of replaying every game in an archive
+
+    Attributes
+    ----------
+    results : List[ReplayResult]
+        One result per game, in the order in which the replays finished
+    seconds : float
+        The wall-clock time taken to verify the archive
+    """
+    def __init__(self, results: List[ReplayResult], seconds: float):
+        self.results: List[ReplayResult] = results
+        self.seconds: float = seconds
+        return
+
+    @property
+    def mismatches(self) -> List[Tuple[str, str]]:
+        """The id of each game that did not replay deterministically, and why
+        """
+        return [(r.game_id, r.mismatch) for r in self.results if r.mismatch is not None]
+
+    @property
+    def events(self) -> int:
+        """The total number of events replayed
+        """
+        return sum(r.events for r in self.results)
+
+    @property
+    def events_per_second(self) -> float:
+        """The replay throughput across every worker
+        """
+        return self.events / self.seconds if self.seconds > 0 else 0.0
+
+    def latency(self, percentile: float) -> float:
+        """The per-game replay latency, in seconds, at the given percentile (0-100)
+        """
+        latencies: List[float] = sorted(r.seconds for r in self.results)
+        if not latencies:
+            return 0.0
+        i = min(len(latencies) - 1, int(round(percentile / 100 * (len(latencies) - 1))))
+        return latencies[i]
+
+    def __str__(self) -> str:
+        return (f"{len(self.results)} games, {self.events} events, "
+                f"{len(self.mismatches)} mismatches, {self.events_per_second:,.0f} events/s, "
+                f"p50 {self.latency(50) * 1e3:.2f} ms, p99 {self.latency(99) * 1e3:.2f} ms")
+
+
+def verify_game(game_id: str, lines: List[str]) -> ReplayResult:
+    """Replays a single game from its first snapshot and checks every later snapshot
+
+    The log of a game that was trimmed (see ``EventLog.trim``) starts at its first
+    snapshot rather than at the first event of the game.
+
+    Parameters
+    ----------
+    game_id : str
+        The id of the game
+    lines : List[str]
+        The JSON lines of the game's log
+
+    Returns
+    -------
+    ReplayResult
+        The number of events replayed, the first mismatch found (if any), and the
+        time taken to replay the game
+    """
+    start: float = time.perf_counter()
+    events, snapshots = read_log(lines)
+    mismatch: Optional[str] = None
+    try:
+        first: int = snapshots[0]['seq']
+        engine = ReplayEngine(events, snapshots[:1], first=first)
+        state: ReplayState = engine.restore(snapshots[0])
+        for snap in snapshots[1:]:
+            for event in events[state.seq - first:snap['seq'] - first]:
+                engine.apply(state, event)
+            expected = {name: {pile: packed[1] for pile, packed in piles.items()}
+                        for name, (kind, piles) in snap['zones'].items()}
+            if state.digest() != expected:
+                raise ReplayMismatch(f"State differs from snapshot at event {snap['seq']}")
+        for event in events[state.seq - first:]:
+            engine.apply(state, event)
+    except (RealmsException, IndexError, KeyError, TypeError, ValueError) as e:
+        mismatch = f"{type(e).__name__}: {e}"
+    return ReplayResult(game_id, len(events), mismatch, time.perf_counter() - start)
+
+
+def _verify_game(args: Tuple[str, List[str]]) -> ReplayResult:
+    return verify_game(*args)
+
+
+def verify_archive(path: str, workers: Optional[int] = None,
+                   max_pending: Optional[int] = None) -> VerificationReport:
+    """Replays every game in an archive in parallel and reports mismatches and latencies
+
+    Games are streamed from the archive and handed to a process pool, with at most
+    ``max_pending`` games in flight so that memory use does not grow with the size
+    of the archive. Each worker rebuilds cards from a copy of this process's catalog.
+
+    Parameters
+    ----------
+    path : str
+        The path of the archive
+    workers : int (Optional)
+        The number of worker processes (Default is the number of CPUs). If 0, the
+        games are replayed in this process.
+    max_pending : int (Optional)
+        The maximum number of games in flight (Default is four per worker)
+
+    Returns
+    -------
+    VerificationReport
+        The per-game results
+    """
+    start: float = time.perf_counter()
+    games = ArchiveReader(path).games()
+    if workers == 0:
+        results = [verify_game(game_id, lines) for game_id, lines in games]
+        return VerificationReport(results, time.perf_counter() - start)
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 4 * workers
+    results: List[ReplayResult] = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=install_catalog,
+                             initargs=(local_catalog(),)) as pool:
+        pending = set()
+        for game in games:
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results += [f.result() for f in done]
+            pending.add(pool.submit(_verify_game, game))
+        results += [f.result() for f in wait(pending).done]
+    return VerificationReport(results, time.perf_counter() - start)
@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: scheduler
+    :synopsis: Multiplexes the turns of many games on a single event loop
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+
+Games are driven one ``Game.step`` at a time, so a scheduler can interleave the turns
+of thousands of bot games, and of the bot players of live games, on the event loop
+that also serves the clients of ``GameServer``::
+
+    >>> scheduler = GameScheduler()
+    >>> entry = scheduler.submit(Game(local_catalog()), max_seconds=0.5)
+    >>> runner = asyncio.ensure_future(scheduler.run())
+    >>> winner = await entry.wait()
+
+The scheduler works in slices. Each slice plays turns until it has taken ``slice``
+seconds or no game is ready, then yields to the event loop so that I/O is never held
+up by more than a slice plus a single turn. Within a slice:
+
+- games of a lower ``Priority`` always go first, so background simulations only get
+  the time that live games leave unused
+- games of the same priority share the time fairly: the game that has been given
+  the least time so far plays the next turn, so a game whose bots think slowly gets
+  fewer turns rather than more time
+- a game that exceeds its budget of turns or seconds is stopped
+- a game whose next player is ``remote``, a client of ``GameServer``, waits until
+  ``resume`` is called once the client has played its turn
+
+A game with a player whose policy is ``blocking``, such as ``MCTSPolicy``, would hold
+up the event loop for a whole search, so while ``run`` drives the scheduler its turns
+are played on an executor, one at a time, and the game gets back in line when its
+turn is over. ``run_slice`` called on its own plays every turn in place.
+
+Every game records the latency of its turns in a ``LatencyStats``.
+"""
+
+import asyncio
+import heapq
+import time
+from concurrent.futures import Executor
+from enum import IntEnum
+from itertools import count
+from typing import Callable, Dict, List, Optional, Tuple
+from .game import Game
+from .player import Player
+from .server import LatencyStats
+
+
+class Priority(IntEnum):
+    """The priority of a scheduled game, lowest first"""
+    LIVE = 0
+    BACKGROUND = 1
+
+
+class GameStatus(IntEnum):
+    """The state of a scheduled game"""
+    RUNNING = 0
+    FINISHED = 1
+    OUT_OF_BUDGET = 2
+    CANCELLED = 3
+    FAILED = 4
+    WAITING = 5
+
+
+class ScheduledGame(object):
+    """A game submitted to a ``GameScheduler``
+
+    Attributes
+    ----------
+    id : int
+        The identifier of the game within its scheduler
+    game : Game
+        The game being played
+    priority : Priority
+        The priority of the game
+    status : GameStatus
+        Whether the game is still being played, and why it stopped otherwise
+    latency : LatencyStats
+        The latency of each turn played
+    used : float
+        The time spent playing turns, in seconds
+    error : Exception
+        The exception raised by a turn, when the status is ``FAILED``
+    blocking : bool
+        Whether a player's policy is ``blocking``, so that the turns of the game are
+        played on the scheduler's executor
+    on_turn : callable
+        Called with the game, on the event loop, after each of its turns
+    """
+    def __init__(self, id: int, game: Game, priority: Priority,
+                 max_turns: Optional[int], max_seconds: Optional[float],
+                 on_turn: Optional[Callable[['ScheduledGame'], None]] = None):
+        self.id: int = id
+        self.game: Game = game
+        self.priority: Priority = priority
+        self.max_turns: Optional[int] = max_turns
+        self.max_seconds: Optional[float] = max_seconds
+        self.status: GameStatus = GameStatus.RUNNING
+        self.latency: LatencyStats = LatencyStats()
+        self.used: float = 0.0
+        self.error: Optional[Exception] = None
+        self.blocking: bool = any(p.policy.blocking for p in game.players)
+        self.on_turn: Optional[Callable[[ScheduledGame], None]] = on_turn
+        self._vtime: float = 0.0
+        self._done: asyncio.Event = asyncio.Event()
+        return
+
+    @property
+    def done(self) -> bool:
+        return self.status not in (GameStatus.RUNNING, GameStatus.WAITING)
+
+    async def wait(self) -> Optional[Player]:
+        """Waits until the game stops
+
+        Returns
+        -------
+        Player
+            The winner, or ``None`` when the game stopped before it was over
+        """
+        await self._done.wait()
+        return self.game.winner
+
+    def _stop(self, status: GameStatus) -> None:
+        self.status = status
+        self._done.set()
+        return
+
+    def _out_of_budget(self) -> bool:
+        if self.max_turns is not None and self.latency.count >= self.max_turns:
+            return True
+        return self.max_seconds is not None and self.used >= self.max_seconds
+
+    def as_dict(self) -> dict:
+        """The state and turn latency of the game, as in ``GameService`` statistics
+        """
+        return {'priority': self.priority.name.lower(),
+                'status': self.status.name.lower(),
+                'turns': self.latency.count,
+                'latency': self.latency.as_dict()}
+
+    def __repr__(self) -> str:
+        return f"ScheduledGame({self.id}, {self.priority.name}, {self.status.name})"
+
+
+class GameScheduler(object):
+    """Plays the turns of many games cooperatively, see the module documentation
+
+    Parameters
+    ----------
+    slice : float (Optional)
+        The time, in seconds, after which the scheduler yields to the event loop
+        (Default is 2 ms)
+    executor : Executor (Optional)
+        Plays the turns of games with a ``blocking`` policy (Default is the event
+        loop's default executor)
+    """
+    def __init__(self, slice: float = 0.002, executor: Optional[Executor] = None):
+        self.slice: float = slice
+        self.executor: Optional[Executor] = executor
+        self.games: Dict[int, ScheduledGame] = {}
+        self._ready: List[Tuple[int, float, int, ScheduledGame]] = []
+        self._ids = count(1)
+        self._seq = count()
+        self._wakeup: asyncio.Event = asyncio.Event()
+        self._stopping: bool = False
+        self._floor: Dict[Priority, float] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        return
+
+    def submit(self, game: Game, priority: Priority = Priority.BACKGROUND,
+               max_turns: Optional[int] = None,
+               max_seconds: Optional[float] = None,
+               on_turn: Optional[Callable[[ScheduledGame], None]] = None) -> ScheduledGame:
+        """Schedules the turns of a game until it is over or out of budget
+
+        Parameters
+        ----------
+        game : Game
+            The game to play
+        priority : Priority (Optional)
+            The priority of the game (Default is ``BACKGROUND``)
+        max_turns : int (Optional)
+            The number of turns after which the game is stopped (Default is no limit)
+        max_seconds : float (Optional)
+            The time, in seconds, after which the game is stopped (Default is no limit)
+        on_turn : callable (Optional)
+            Called with the scheduled game after each of its turns (Default is none)
+        """
+        entry: ScheduledGame = ScheduledGame(next(self._ids), game, priority,
+                                             max_turns, max_seconds, on_turn)
+        # A new game starts level with the games of its priority being played, so it
+        # gets its fair share from now on rather than catching up on the past
+        entry._vtime = self._floor.get(priority, 0.0)
+        self.games[entry.id] = entry
+        self._push(entry)
+        self._wakeup.set()
+        return entry
+
+    def cancel(self, entry: ScheduledGame) -> None:
+        """Stops scheduling a game; its turn in progress, if any, is played out
+        """
+        if not entry.done:
+            entry._stop(GameStatus.CANCELLED)
+        return
+
+    def resume(self, entry: ScheduledGame) -> None:
+        """Schedules a game that is waiting for a client again
+        """
+        if entry.status == GameStatus.WAITING:
+            entry.status = GameStatus.RUNNING
+            self._push(entry)
+            self._wakeup.set()
+        return
+
+    @property
+    def pending(self) -> int:
+        """The number of games still being played
+        """
+        return sum(1 for e in self.games.values() if not e.done)
+
+    def run_slice(self) -> int:
+        """Plays turns for at most one slice, without yielding
+
+        Returns
+        -------
+        int
+            The number of turns played
+        """
+        clock = time.perf_counter
+        deadline: float = clock() + self.slice
+        turns: int = 0
+        while self._ready:
+            entry: ScheduledGame = heapq.heappop(self._ready)[3]
+            if entry.done or not self._settle(entry):
+                continue
+            if entry.blocking and self._loop is not None:
+                self._offload(entry)
+                continue
+            self._step(entry)
+            turns += 1
+            if clock() >= deadline:
+                break
+        return turns
+
+    async def run(self) -> None:
+        """Plays turns, one slice at a time, until ``stop`` is called
+
+        The scheduler waits for ``submit`` while no game is being played.
+        """
+        self._stopping = False
+        self._loop = asyncio.get_running_loop()
+        try:
+            while not self._stopping:
+                if not self._ready:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                self.run_slice()
+                await asyncio.sleep(0)
+        finally:
+            self._loop = None
+        return
+
+    def stop(self) -> None:
+        """Makes ``run`` return after the current slice
+        """
+        self._stopping = True
+        self._wakeup.set()
+        return
+
+    def forget(self) -> List[ScheduledGame]:
+        """Drops the games that are no longer being played
+
+        Returns
+        -------
+        [ScheduledGame]
+            The games that were dropped
+        """
+        done: List[ScheduledGame] = [e for e in self.games.values() if e.done]
+        for entry in done:
+            del self.games[entry.id]
+        return done
+
+    def stats(self) -> Dict[str, dict]:
+        """The state and turn latency of every game, keyed by id
+        """
+        return {str(i): e.as_dict() for i, e in self.games.items()}
+
+    def _step(self, entry: ScheduledGame) -> None:
+        """Plays a single turn of a game and puts it back in line
+        """
+        self._floor[entry.priority] = max(self._floor.get(entry.priority, 0.0), entry._vtime)
+        try:
+            elapsed: float = self._play(entry)
+        except Exception as e:
+            entry.error = e
+            entry._stop(GameStatus.FAILED)
+            return
+        self._finish(entry, elapsed)
+        return
+
+    def _offload(self, entry: ScheduledGame) -> None:
+        """Plays a single turn of a game on the executor, then puts it back in line
+        """
+        self._floor[entry.priority] = max(self._floor.get(entry.priority, 0.0), entry._vtime)
+
+        def played(future: asyncio.Future) -> None:
+            if future.exception() is not None:
+                entry.error = future.exception()
+                entry._stop(GameStatus.FAILED)
+            else:
+                self._finish(entry, future.result())
+            self._wakeup.set()
+            return
+
+        self._loop.run_in_executor(self.executor, self._play, entry).add_done_callback(played)
+        return
+
+    @staticmethod
+    def _play(entry: ScheduledGame) -> float:
+        """Plays a single turn of a game
+
+        Returns
+        -------
+        float
+            The time the turn took, in seconds
+        """
+        start: float = time.perf_counter()
+        entry.game.step()
+        return time.perf_counter() - start
+
+    def _finish(self, entry: ScheduledGame, elapsed: float) -> None:
+        """Records a turn that was played and puts the game back in line
+        """
+        entry.latency.record(elapsed)
+        entry.used += elapsed
+        entry._vtime += elapsed
+        if entry.on_turn is not None:
+            entry.on_turn(entry)
+        if self._settle(entry):
+            self._push(entry)
+        return
+
+    @staticmethod
+    def _settle(entry: ScheduledGame) -> bool:
+        """Stops a game that is over or out of budget, and sets aside a game whose
+        next player is a client
+
+        Returns
+        -------
+        bool
+            Whether the game is ready for its next turn
+        """
+        if entry.done:
+            return False
+        if entry.game.over:
+            entry._stop(GameStatus.FINISHED)
+        elif entry._out_of_budget():
+            entry._stop(GameStatus.OUT_OF_BUDGET)
+        elif entry.game.current.policy.remote:
+            entry.status = GameStatus.WAITING
+        return entry.status == GameStatus.RUNNING
+
+    def _push(self, entry: ScheduledGame) -> None:
+        heapq.heappush(self._ready, (int(entry.priority), entry._vtime, next(self._seq), entry))
+        return
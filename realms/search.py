@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: search
+    :synopsis: In-memory inverted indexes for querying the templates of a catalog
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+
+Every filter of a ``CardIndex`` produces a ``Match``, and matches combine with
+``&``, ``|`` and ``~``::
+
+    >>> index = card_index()
+    >>> blob_ships = index.faction(CardFaction.BLOB) & index.ships() & index.cost(max=4)
+    >>> (blob_ships & index.effect(CardAction.ATTACK, slot='ally')).templates('cost')
+
+A match is a bit set over the rows of the index, held in a Python ``int``, so
+combining filters is a handful of integer operations whatever the size of the
+catalog.
+"""
+
+import weakref
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from .cards import CardAction, CardFaction, CardTarget
+from .catalog import CardCatalog, CardTemplate, local_catalog
+
+SLOTS: Tuple[str, ...] = ('basic', 'ally', 'scrap')
+"""The names of the effect slots of a template"""
+
+EffectKey = Tuple[Optional[str], Optional[CardAction], Optional[CardTarget]]
+
+_ORDERS: Dict[str, Callable[[CardTemplate], tuple]] = {
+    'id': lambda t: (t.id,),
+    'name': lambda t: (t.name, t.id),
+    'cost': lambda t: (t.cost, t.name, t.id),
+    'defense': lambda t: (t.defense, t.name, t.id),
+    'faction': lambda t: (t.faction.value, t.name, t.id),
+}
+
+_indexes: 'weakref.WeakKeyDictionary[CardCatalog, CardIndex]' = weakref.WeakKeyDictionary()
+
+
+class Match(object):
+    """The set of templates selected by a filter
+
+    Parameters
+    ----------
+    index : CardIndex
+        The index the match belongs to
+    mask : int
+        Bit ``i`` is set when the template in row ``i`` of the index is selected
+    """
+    __slots__ = ('index', 'mask')
+
+    def __init__(self, index: 'CardIndex', mask: int):
+        self.index: CardIndex = index
+        self.mask: int = mask
+        return
+
+    def __and__(self, other: 'Match') -> 'Match':
+        return Match(self.index, self.mask & other.mask)
+
+    def __or__(self, other: 'Match') -> 'Match':
+        return Match(self.index, self.mask | other.mask)
+
+    def __invert__(self) -> 'Match':
+        return Match(self.index, self.mask ^ self.index.everything)
+
+    def __len__(self) -> int:
+        return bin(self.mask).count('1')
+
+    def __bool__(self) -> bool:
+        return self.mask != 0
+
+    def __iter__(self) -> Iterator[CardTemplate]:
+        return iter(self.templates())
+
+    def __contains__(self, template_id: int) -> bool:
+        row: Optional[int] = self.index._rows.get(template_id)
+        return row is not None and bool(self.mask >> row & 1)
+
+    def rows(self) -> List[int]:
+        """The rows of the selected templates, in ascending order
+        """
+        rows: List[int] = []
+        mask: int = self.mask
+        while mask:
+            low: int = mask & -mask
+            rows.append(low.bit_length() - 1)
+            mask ^= low
+        return rows
+
+    def templates(self, order_by: str = 'id', reverse: bool = False) -> List[CardTemplate]:
+        """The selected templates, sorted
+
+        Parameters
+        ----------
+        order_by : str (Optional)
+            One of ``id``, ``name``, ``cost``, ``defense`` or ``faction`` (Default is
+            ``id``). Ties are broken by name, then id.
+        reverse : bool (Optional)
+            Sorts in descending order (Default is False)
+
+        Raises
+        ------
+        KeyError
+            Raised when ``order_by`` is not a known ordering
+        """
+        rows: List[int] = self.rows()
+        if order_by != 'id' or reverse:
+            rows.sort(key=self.index._ranks[order_by].__getitem__, reverse=reverse)
+        templates: List[CardTemplate] = self.index._templates
+        return [templates[r] for r in rows]
+
+    def ids(self, order_by: str = 'id', reverse: bool = False) -> List[int]:
+        """The ids of the selected templates, sorted as by ``templates``
+        """
+        return [t.id for t in self.templates(order_by, reverse)]
+
+    def __repr__(self) -> str:
+        return f"Match({len(self)} templates)"
+
+
+class CardIndex(object):
+    """Inverted indexes over the templates of a catalog
+
+    The indexes are built once, when the ``CardIndex`` is created; use ``card_index``
+    to share a single index per catalog.
+
+    Parameters
+    ----------
+    catalog : CardCatalog
+        The catalog to index
+
+    Attributes
+    ----------
+    everything : int
+        The mask selecting every template
+    """
+    def __init__(self, catalog: CardCatalog):
+        self.catalog: CardCatalog = catalog
+        self._templates: List[CardTemplate] = sorted(catalog.templates, key=lambda t: t.id)
+        self._rows: Dict[int, int] = {t.id: i for i, t in enumerate(self._templates)}
+        self.everything: int = (1 << len(self._templates)) - 1
+        self._factions: Dict[CardFaction, int] = {}
+        self._bases: int = 0
+        self._outposts: int = 0
+        self._effects: Dict[EffectKey, int] = {}
+        max_cost: int = max((t.cost for t in self._templates), default=0)
+        costs: List[int] = [0] * (max_cost + 1)
+        for row, t in enumerate(self._templates):
+            bit: int = 1 << row
+            self._factions[t.faction] = self._factions.get(t.faction, 0) | bit
+            costs[t.cost] |= bit
+            if t.base:
+                self._bases |= bit
+            if t.outpost:
+                self._outposts |= bit
+            for slot, effects in zip(SLOTS, (t.effects_basic, t.effects_ally, t.effects_scrap)):
+                for e in effects:
+                    for key in _effect_keys(slot, e.action, e.target):
+                        self._effects[key] = self._effects.get(key, 0) | bit
+        self._at_most: List[int] = []
+        mask: int = 0
+        for cost_mask in costs:
+            mask |= cost_mask
+            self._at_most.append(mask)
+        self._ranks: Dict[str, List[int]] = {}
+        for name, key in _ORDERS.items():
+            ranks: List[int] = [0] * len(self._templates)
+            order = sorted(range(len(self._templates)), key=lambda r: key(self._templates[r]))
+            for rank, row in enumerate(order):
+                ranks[row] = rank
+            self._ranks[name] = ranks
+        return
+
+    def all(self) -> Match:
+        """Selects every template
+        """
+        return Match(self, self.everything)
+
+    def none(self) -> Match:
+        """Selects no template
+        """
+        return Match(self, 0)
+
+    def ids(self, *template_ids: int) -> Match:
+        """Selects the templates with the given ids; unknown ids are ignored
+        """
+        mask: int = 0
+        for template_id in template_ids:
+            row: Optional[int] = self._rows.get(template_id)
+            if row is not None:
+                mask |= 1 << row
+        return Match(self, mask)
+
+    def faction(self, *factions: CardFaction) -> Match:
+        """Selects the templates belonging to any of the given factions
+        """
+        mask: int = 0
+        for faction in factions:
+            mask |= self._factions.get(faction, 0)
+        return Match(self, mask)
+
+    def cost(self, min: Optional[int] = None, max: Optional[int] = None) -> Match:
+        """Selects the templates whose cost lies between the (inclusive) bounds
+        """
+        below: int = 0 if min is None else self._cost_at_most(min - 1)
+        return Match(self, self._cost_at_most(max) & ~below)
+
+    def bases(self) -> Match:
+        """Selects the bases, outposts included
+        """
+        return Match(self, self._bases)
+
+    def outposts(self) -> Match:
+        """Selects the outposts
+        """
+        return Match(self, self._outposts)
+
+    def ships(self) -> Match:
+        """Selects every template that is not a base
+        """
+        return Match(self, self.everything ^ self._bases)
+
+    def effect(self, action: Optional[CardAction] = None, target: Optional[CardTarget] = None,
+               slot: Optional[str] = None) -> Match:
+        """Selects the templates having at least one effect that matches every given field
+
+        Parameters
+        ----------
+        action : CardAction (Optional)
+            The action of the effect (Default is any action)
+        target : CardTarget (Optional)
+            The target of the effect (Default is any target)
+        slot : str (Optional)
+            One of ``SLOTS`` (Default is any slot)
+
+        Raises
+        ------
+        ValueError
+            Raised when ``slot`` is not one of ``SLOTS``
+        """
+        if slot is not None and slot not in SLOTS:
+            raise ValueError(f"Unknown effect slot {slot!r}, expected one of {SLOTS}")
+        return Match(self, self._effects.get((slot, action, target), 0))
+
+    def _cost_at_most(self, cost: Optional[int]) -> int:
+        if cost is None:
+            return self.everything
+        if cost < 0:
+            return 0
+        return self._at_most[min(cost, len(self._at_most) - 1)]
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+
+def card_index(catalog: Optional[CardCatalog] = None) -> CardIndex:
+    """Produces the index of a catalog, building it the first time it is requested
+
+    Parameters
+    ----------
+    catalog : CardCatalog (Optional)
+        The catalog to index (Default is the process-local catalog, so a reloaded
+        catalog gets a fresh index)
+    """
+    if catalog is None:
+        catalog = local_catalog()
+    index: Optional[CardIndex] = _indexes.get(catalog)
+    if index is None:
+        index = CardIndex(catalog)
+        _indexes[catalog] = index
+    return index
+
+
+def _effect_keys(slot: str, action: CardAction, target: CardTarget) -> List[EffectKey]:
+    """Every key under which an effect is indexed, with ``None`` standing for any value
+    """
+    return [(s, a, t) for s in (slot, None) for a in (action, None) for t in (target, None)]
@@ -0,0 +1,664 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: server
+    :synopsis: An asyncio service hosting many concurrent games in one process
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+
+Clients talk to the server over a local TCP or Unix socket using line-delimited
+JSON. Each request is a single JSON object with an ``op`` field and an optional
+``id`` that is echoed back in the response::
+
+    > {"id": 1, "op": "new_game", "players": 2}
+    < {"id": 1, "ok": true, "game": "1"}
+    > {"id": 2, "op": "draw", "game": "1", "player": 0}
+    < {"id": 2, "ok": true, "cards": [...]}
+
+Every game is a ``Game``, whose players take turns in order. The client of the player
+whose turn it is draws, discards and acquires cards, and ``end_turn`` plays the cards
+it drew under the rules of ``Turn``, then passes the turn on to the next living
+player. A game started with ``"bots": n`` seats bots in its last ``n`` seats, whose
+turns are played by a ``TurnPolicy`` as soon as they come up, by the service's
+``GameScheduler`` at ``Priority.LIVE`` if it has one.
+
+A connection that sends ``{"op": "watch", "game": "1"}`` becomes a spectator of the
+game: after the response it receives the public state of the game as one line per
+update, beginning with the current state::
+
+    < {"s": 3, "row": [...], "players": [{"health": 50, "bases": [], ...}, ...]}
+"""
+
+import asyncio
+import json
+import time
+from itertools import count
+from typing import Callable, Dict, List, Optional, Tuple
+from .broadcast import Broadcaster, Subscription
+from .cards import Card
+from .catalog import CardCatalog, live_versions, local_catalog
+from .decks import MainDeck, PlayerDeck, TradeRow
+from .events import EventLog
+from .exceptions import NotYourTurn, RealmsException, UUIDNotFoundError
+from .game import Game, GameStep
+from .persistence import GameStore
+from .player import Player
+from .turns import Turn, TurnPolicy
+
+CardList = List[Card]
+
+_COMPACT = (',', ':')
+
+_PUBLIC_OPS = frozenset(('draw', 'discard', 'end_turn', 'acquire', 'scrap'))
+"""The operations that change the public state of a game"""
+
+
+class Fragment(str):
+    """A string that already holds encoded JSON, spliced verbatim into a response
+    """
+
+
+class LatencyStats(object):
+    """Per-operation request latency, recorded into power-of-two microsecond buckets
+
+    Recording a sample is O(1) and the memory used is fixed, so the statistics can
+    be kept for every request of a long-running server.
+    """
+
+    buckets = 32
+
+    def __init__(self):
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+        self._histogram: List[int] = [0] * LatencyStats.buckets
+        return
+
+    def record(self, seconds: float) -> None:
+        """Adds a single latency sample
+        """
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        bucket: int = min(int(seconds * 1e6).bit_length(), LatencyStats.buckets - 1)
+        self._histogram[bucket] += 1
+        return
+
+    def merge(self, other: 'LatencyStats') -> None:
+        """Adds the samples recorded by another ``LatencyStats``
+        """
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self._histogram = [a + b for a, b in zip(self._histogram, other._histogram)]
+        return
+
+    def percentile(self, p: float) -> float:
+        """The upper bound, in seconds, of the bucket containing the given percentile
+        """
+        target: float = self.count * p / 100
+        seen: int = 0
+        for bucket, n in enumerate(self._histogram):
+            seen += n
+            if n and seen >= target:
+                return min((1 << bucket) / 1e6, self.max)
+        return self.max
+
+    def as_dict(self) -> Dict[str, float]:
+        """The summary statistics in microseconds, as sent to clients
+        """
+        mean: float = self.total / self.count if self.count else 0.0
+        return {'count': self.count,
+                'mean_us': round(mean * 1e6, 1),
+                'p50_us': round(self.percentile(50) * 1e6, 1),
+                'p99_us': round(self.percentile(99) * 1e6, 1),
+                'max_us': round(self.max * 1e6, 1)}
+
+
+class ClientPolicy(TurnPolicy):
+    """The policy of a player whose cards are drawn, discarded and bought by a client
+
+    The decisions that come up while the client's cards are played, such as which
+    base to attack, are those of ``TurnPolicy``.
+    """
+    remote: bool = True
+
+
+class GameSession(object):
+    """A single hosted ``Game`` and the hands its clients have drawn
+
+    Parameters
+    ----------
+    catalog : CardCatalog
+        The catalog shared by every game on the server
+    players : int
+        The number of players
+    log : EventLog (Optional)
+        A log to which the decks of the game are attached
+    sets : List[str] (Optional)
+        The card sets the main deck is composed of (Default is the catalog's cards)
+    bots : int (Optional)
+        The number of players, last in turn order, played by a ``TurnPolicy``
+        (Default is none)
+
+    Attributes
+    ----------
+    game : Game
+        The game, whose players are named ``p0`` onwards
+    catalog : CardCatalog
+        The catalog the game was started with, kept for the rest of the game
+    spectators : Broadcaster
+        Receives the encoded public state of the game after every change
+    log : EventLog
+        The log the decks are attached to, if any
+    scheduled : ScheduledGame
+        The game as submitted to a ``GameScheduler`` that plays its bots, if any
+
+    Raises
+    ------
+    ValueError
+        Raised when there are fewer than two players, or no player left for a client
+    """
+    def __init__(self, catalog: CardCatalog, players: int, log: Optional[EventLog] = None,
+                 sets: Optional[List[str]] = None, bots: int = 0):
+        if not 0 <= bots < players:
+            raise ValueError(f"Cannot seat {bots} bots among {players} players")
+        policies: List[TurnPolicy] = [ClientPolicy() for _ in range(players - bots)]
+        policies += [TurnPolicy() for _ in range(bots)]
+        self.game: Game = Game(catalog, [f"p{i}" for i in range(players)], policies,
+                               sets, log)
+        self.maindeck: MainDeck = self.game.maindeck
+        self.traderow: TradeRow = self.game.traderow
+        self.decks: List[PlayerDeck] = [p._deck for p in self.game.players]
+        self.hands: List[Dict[str, Card]] = [{} for _ in range(players)]
+        self.spectators: Broadcaster = Broadcaster()
+        self.catalog: CardCatalog = catalog
+        self._public_seq: int = 0
+        self._row_key: Tuple[str, ...] = ()
+        self._row_json: Optional[Fragment] = None
+        self.log: Optional[EventLog] = log
+        self.scheduled = None
+        return
+
+    def deck(self, player: int) -> PlayerDeck:
+        return self.decks[player]
+
+    def seat(self, player: int) -> Player:
+        """The player of a client request, who must be the player whose turn it is
+
+        Raises
+        ------
+        GameOver
+            Raised when the game is over
+        NotYourTurn
+            Raised when it is another player's turn
+        """
+        current: Player = self.game.current
+        if self.game.players[player] is not current:
+            raise NotYourTurn(f"It is the turn of {current.name}, not p{player}")
+        return current
+
+    def end_turn(self, player: int) -> GameStep:
+        """Plays the cards a client drew under the rules of ``Turn``, then passes the
+        turn on
+
+        The client has bought its cards already, so the turn has no buy phase.
+        """
+        current: Player = self.seat(player)
+        opponent: Player = self.game.opponent_of(current)
+        turn: Turn = Turn(current, opponent, self.traderow, self.game)
+        turn.begin(list(self.hands[player].values()))
+        self.hands[player] = {}
+        turn.play_cards()
+        turn.use_scrap_abilities()
+        turn.attack()
+        turn.end()
+        return self.game.advance(current, opponent, turn.report())
+
+    def play_bots(self) -> List[GameStep]:
+        """Plays the turns of bots until it is a client's turn or the game is over
+        """
+        steps: List[GameStep] = []
+        while not self.game.over and not self.game.current.policy.remote:
+            steps.append(self.game.step())
+        return steps
+
+    def row_json(self) -> Fragment:
+        """The encoded cards available in the trade row
+
+        The encoding is reused until the trade row changes, so every client that
+        watches the game is sent the same string.
+        """
+        available: CardList = self.traderow.available
+        key: Tuple[str, ...] = tuple(c.uuid for c in available)
+        if self._row_json is None or key != self._row_key:
+            self._row_key = key
+            self._row_json = Fragment(self.catalog.cards_json(available))
+        return self._row_json
+
+    def public_frame(self) -> bytes:
+        """Encodes the state of the game visible to every spectator
+
+        Returns
+        -------
+        bytes
+            The newline-terminated frame, with a sequence number that increases with
+            every call
+        """
+        self._public_seq += 1
+        players: List[dict] = [{'health': player.health,
+                                'bases': [[c.template_id, c.uuid] for c in player._bases],
+                                'undrawn': len(deck._undrawn),
+                                'discards': len(deck._discards),
+                                'hand': len(hand)}
+                               for player, deck, hand
+                               in zip(self.game.players, self.decks, self.hands)]
+        return encode_response({'s': self._public_seq,
+                                'row': self.row_json(),
+                                'players': players}) + b'\n'
+
+
+class GameService(object):
+    """Dispatches protocol requests to the hosted games
+
+    The service is synchronous and never performs I/O: every card comes from the
+    shared in-memory catalog, so no request touches the database. This keeps each
+    request to a few microseconds of engine work, which is safe to run on the
+    event loop. When a store is given, every game is logged and its new events are
+    handed to the store after each change, and the store writes them in the
+    background.
+
+    Parameters
+    ----------
+    catalog : CardCatalog (Optional)
+        The catalog shared by every hosted game. By default each new game uses the
+        current version of the process-local catalog, so games started after
+        ``reload_catalog`` use the new card data while games in progress keep the
+        version they started with.
+    store : GameStore (Optional)
+        Persists the progress of every game
+    scheduler : GameScheduler (Optional)
+        Plays the turns of the bots of every game at ``Priority.LIVE`` (Default is
+        playing them in place, as soon as the turn of a client ends)
+    """
+    def __init__(self, catalog: Optional[CardCatalog] = None,
+                 store: Optional[GameStore] = None, scheduler=None):
+        self._catalog: Optional[CardCatalog] = catalog
+        self.store: Optional[GameStore] = store
+        self.scheduler = scheduler
+        self.games: Dict[str, GameSession] = {}
+        self.latency: Dict[str, LatencyStats] = {}
+        first_id: int = 1
+        if store is not None:
+            first_id += max((int(g) for g in store.games() if g.isdigit()), default=0)
+        self._ids = count(first_id)
+        self._ops: Dict[str, Callable[[dict], dict]] = {
+            'new_game': self._new_game,
+            'close_game': self._close_game,
+            'draw': self._draw,
+            'discard': self._discard,
+            'end_turn': self._end_turn,
+            'trade_row': self._trade_row,
+            'acquire': self._acquire,
+            'scrap': self._scrap,
+            'state': self._state,
+            'stats': self._stats,
+        }
+        return
+
+    @property
+    def catalog(self) -> CardCatalog:
+        """The catalog that new games are created with
+        """
+        return self._catalog if self._catalog is not None else local_catalog()
+
+    def handle(self, request: dict) -> dict:
+        """Executes a single request and decodes the response
+
+        Parameters
+        ----------
+        request : dict
+            The decoded request
+
+        Returns
+        -------
+        dict
+            The response, with ``ok`` set to ``False`` and an ``error`` message if the
+            request failed
+        """
+        return json.loads(self.respond(request))
+
+    def respond(self, request: dict) -> bytes:
+        """Executes a single request and records its latency, including the time
+        spent encoding the response
+
+        Cards are encoded from the JSON fragments precomputed by the catalog rather
+        than from dicts, see ``CardCatalog.card_json``.
+
+        Returns
+        -------
+        bytes
+            The encoded response, without a trailing newline
+        """
+        start: float = time.perf_counter()
+        op: str = request.get('op')
+        handler = self._ops.get(op) if isinstance(op, str) else None
+        if handler is None:
+            response: dict = {'ok': False, 'error': f"Unknown op {op!r}"}
+        else:
+            try:
+                response = handler(request)
+                response['ok'] = True
+                if op in _PUBLIC_OPS:
+                    self._changed(str(request['game']))
+            except UUIDNotFoundError:
+                response = {'ok': False, 'error': 'UUIDNotFoundError'}
+            except (RealmsException, KeyError, IndexError, TypeError, ValueError) as e:
+                response = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        if 'id' in request:
+            response['id'] = request['id']
+        encoded: bytes = encode_response(response)
+        if handler is not None:
+            self.latency.setdefault(op, LatencyStats()).record(time.perf_counter() - start)
+        return encoded
+
+    def watch(self, game_id: str) -> Subscription:
+        """Subscribes to the public state of a game, starting with its current state
+
+        Raises
+        ------
+        KeyError
+            Raised when no game has the given id
+        """
+        game: GameSession = self.games[str(game_id)]
+        subscription: Subscription = game.spectators.subscribe()
+        subscription.put(game.public_frame())
+        return subscription
+
+    def _publish(self, game: GameSession) -> None:
+        """Encodes the public state of a game once and queues it for every spectator
+        """
+        if game.spectators:
+            game.spectators.publish(game.public_frame())
+        return
+
+    def _changed(self, game_id: str) -> None:
+        """Publishes and stages a game after a change, if it is still hosted
+        """
+        game: Optional[GameSession] = self.games.get(game_id)
+        if game is None:
+            return
+        self._publish(game)
+        if self.store is not None:
+            self.store.stage(game_id, game.log)
+        return
+
+    def close(self) -> None:
+        """Flushes and closes the store, if any
+        """
+        if self.store is not None:
+            self.store.close()
+        return
+
+    def _game(self, request: dict) -> GameSession:
+        return self.games[str(request['game'])]
+
+    @staticmethod
+    def _player(game: GameSession, request: dict) -> int:
+        """The index of the player a request acts for
+
+        Raises
+        ------
+        ValueError
+            Raised when the request does not name a player of the game
+        """
+        try:
+            player: int = int(request['player'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"Invalid player {request.get('player')!r}")
+        if not 0 <= player < len(game.decks):
+            raise ValueError(f"No player {player} in a game of {len(game.decks)}")
+        return player
+
+    def _new_game(self, request: dict) -> dict:
+        players: int = int(request.get('players', 2))
+        if not 2 <= players <= 8:
+            raise ValueError(f"Cannot host a game with {players} players")
+        bots: int = int(request.get('bots', 0))
+        sets: Optional[List[str]] = request.get('sets')
+        if sets is not None and not (isinstance(sets, list) and all(isinstance(s, str)
+                                                                    for s in sets)):
+            raise ValueError('sets must be a list of set names')
+        log: Optional[EventLog] = EventLog() if self.store is not None else None
+        game: GameSession = GameSession(self.catalog, players, log, sets, bots)
+        game_id: str = str(next(self._ids))
+        self.games[game_id] = game
+        if bots and self.scheduler is not None:
+            from .scheduler import Priority
+            game.scheduled = self.scheduler.submit(game.game, Priority.LIVE,
+                                                   on_turn=lambda _: self._changed(game_id))
+        if self.store is not None:
+            self.store.stage(game_id, log)
+        return {'game': game_id}
+
+    def _close_game(self, request: dict) -> dict:
+        game_id: str = str(request['game'])
+        game: GameSession = self.games.pop(game_id)
+        if game.scheduled is not None:
+            self.scheduler.cancel(game.scheduled)
+        game.spectators.close()
+        if self.store is not None:
+            self.store.stage(game_id, game.log, finished=True)
+        return {}
+
+    def _draw(self, request: dict) -> dict:
+        game: GameSession = self._game(request)
+        player: int = self._player(game, request)
+        game.seat(player)
+        try:
+            drawn: CardList = game.deck(player).draw(int(request.get('num', 5)))
+        except IndexError:
+            drawn = []
+        game.hands[player].update((c.uuid, c) for c in drawn)
+        return {'cards': Fragment(game.catalog.cards_json(drawn))}
+
+    def _discard(self, request: dict) -> dict:
+        game: GameSession = self._game(request)
+        player: int = self._player(game, request)
+        game.seat(player)
+        try:
+            card: Card = game.hands[player].pop(request['uuid'])
+        except KeyError:
+            raise UUIDNotFoundError
+        game.deck(player).discard(card)
+        return {}
+
+    def _end_turn(self, request: dict) -> dict:
+        game: GameSession = self._game(request)
+        game.end_turn(self._player(game, request))
+        if game.scheduled is not None:
+            self.scheduler.resume(game.scheduled)
+        else:
+            game.play_bots()
+        return {}
+
+    def _trade_row(self, request: dict) -> dict:
+        return {'cards': self._game(request).row_json()}
+
+    def _acquire(self, request: dict) -> dict:
+        game: GameSession = self._game(request)
+        player: int = self._player(game, request)
+        game.seat(player)
+        card: Card = game.traderow.acquire(request['uuid'])
+        game.deck(player).discard(card)
+        return {'card': Fragment(game.catalog.card_json(card))}
+
+    def _scrap(self, request: dict) -> dict:
+        game: GameSession = self._game(request)
+        game.seat(self._player(game, request))
+        game.traderow.scrap(request['uuid'])
+        return {}
+
+    def _state(self, request: dict) -> dict:
+        game: GameSession = self._game(request)
+        players: List[Player] = game.game.players
+        return {'turn': game.game.turn,
+                'current': None if game.game.over else players.index(game.game.current),
+                'winner': None if game.game.winner is None else players.index(game.game.winner),
+                'main_deck': len(game.maindeck._cards),
+                'players': [{'undrawn': len(d._undrawn),
+                             'discards': len(d._discards),
+                             'hand': len(h)}
+                            for d, h in zip(game.decks, game.hands)]}
+
+    def _stats(self, request: dict) -> dict:
+        return {'games': len(self.games),
+                'catalog_versions': live_versions(),
+                'latency': {op: s.as_dict() for op, s in self.latency.items()}}
+
+
+class GameServer(object):
+    """Serves a ``GameService`` over line-delimited JSON on a local socket
+
+    Parameters
+    ----------
+    service : GameService (Optional)
+        The service to expose, whose scheduler, if any, runs alongside the server. By
+        default one is created around the process-local catalog, which is loaded off
+        the event loop when the server starts, with a ``GameScheduler`` for its bots.
+    store : GameStore (Optional)
+        The store used by the default service
+    """
+    def __init__(self, service: Optional[GameService] = None,
+                 store: Optional[GameStore] = None):
+        self.service: Optional[GameService] = service
+        self.store: Optional[GameStore] = store
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._scheduling: Optional[asyncio.Future] = None
+        return
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0,
+                    path: Optional[str] = None) -> None:
+        """Starts listening on a TCP port, or on a Unix socket if ``path`` is given
+        """
+        if self.service is None:
+            from .scheduler import GameScheduler
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, local_catalog)
+            self.service = GameService(None, self.store, GameScheduler())
+        if self.service.scheduler is not None:
+            self._scheduling = asyncio.ensure_future(self.service.scheduler.run())
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._client, path=path)
+        else:
+            self._server = await asyncio.start_server(self._client, host, port)
+        return
+
+    @property
+    def port(self) -> Optional[int]:
+        """The TCP port the server is listening on
+        """
+        if self._server is None or not self._server.sockets:
+            return None
+        address = self._server.sockets[0].getsockname()
+        return address[1] if isinstance(address, tuple) else None
+
+    async def serve_forever(self) -> None:
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """Stops accepting connections and the scheduler, and flushes the service's store
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._scheduling is not None:
+            self.service.scheduler.stop()
+            await self._scheduling
+        if self.service is not None:
+            self.service.close()
+        return
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Handles the requests of a single connection, in order
+        """
+        try:
+            while True:
+                line: bytes = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError
+                except ValueError:
+                    encoded: bytes = encode_response({'ok': False, 'error': 'Malformed request'})
+                else:
+                    if request.get('op') == 'watch':
+                        await self._watch(request, reader, writer)
+                        break
+                    encoded = self.service.respond(request)
+                writer.write(encoded + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+        return
+
+    async def _watch(self, request: dict, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        """Streams the public state of a game to a spectator until either side hangs up
+        """
+        response: dict = {'ok': True}
+        try:
+            subscription: Subscription = self.service.watch(request.get('game'))
+        except KeyError:
+            response = {'ok': False, 'error': 'Unknown game'}
+        if 'id' in request:
+            response['id'] = request['id']
+        writer.write(encode_response(response) + b'\n')
+        if not response['ok']:
+            await writer.drain()
+            return
+
+        async def hangup() -> None:
+            while await reader.readline():
+                pass
+            subscription.close()
+
+        watcher = asyncio.ensure_future(hangup())
+        try:
+            while True:
+                frame: Optional[bytes] = await subscription.get()
+                if frame is None:
+                    break
+                writer.write(frame)
+                await writer.drain()
+        finally:
+            watcher.cancel()
+            subscription.close()
+        return
+
+
+def encode_response(response: dict) -> bytes:
+    """Encodes a response, splicing in any ``Fragment`` values verbatim
+    """
+    parts: List[str] = []
+    for key, value in response.items():
+        if not isinstance(value, Fragment):
+            value = json.dumps(value, separators=_COMPACT)
+        parts.append(json.dumps(key) + ':' + value)
+    return ('{' + ','.join(parts) + '}').encode()
+
+
+async def serve(host: str = '127.0.0.1', port: int = 8765, path: Optional[str] = None,
+                store: Optional[str] = None) -> None:
+    """Runs a game server until cancelled, persisting games to ``store`` if given
+    """
+    server = GameServer(store=GameStore(store) if store is not None else None)
+    await server.start(host, port, path)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
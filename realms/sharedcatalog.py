@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: sharedcatalog
+    :synopsis: Flat array encoding of the card catalog, publishable in shared memory
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+"""
+
+import struct
+from array import array
+from collections.abc import Mapping
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, List, Optional, Tuple
+from .cards import CardAction, CardFaction, CardTarget
+from .catalog import CardCatalog, CardTemplate, EffectTemplate, install_catalog, _json_prefix
+from .conditions import Condition, condition_from_codes
+from .exceptions import CatalogFormatError
+
+FACTIONS: List[CardFaction] = list(CardFaction)
+"""The ``CardFaction`` members, indexed by their code in the faction array"""
+
+_MAGIC = b'RCAT'
+_FORMAT_VERSION = 2
+_HEADER = struct.Struct('=4sHHIII')
+_SLOTS = 3  # basic, ally, scrap
+
+
+class CatalogArrays(object):
+    """The static data of a catalog as a handful of flat numeric arrays
+
+    The arrays are views into a single buffer, which may be a ``bytes`` object or
+    a shared memory block, so that they can be mapped by many processes without
+    being copied. Rows are ordered by template id. The buffer uses the native byte
+    order, since it is only shared between processes on the same host.
+
+    Parameters
+    ----------
+    buffer : bytes-like
+        A buffer produced by ``CatalogArrays.encode``
+
+    Attributes
+    ----------
+    nbytes : int
+        The length of the encoding, which may be shorter than the buffer
+    ids, faction, flags, defense, cost, count : memoryview
+        One entry per template. ``faction`` indexes ``FACTIONS``; bit 0 of ``flags``
+        marks a base and bit 1 an outpost.
+    slot_offsets : memoryview
+        The effects of row ``i`` in slot ``s`` (0 basic, 1 ally, 2 scrap) are
+        ``slot_offsets[3 * i + s]`` up to ``slot_offsets[3 * i + s + 1]``
+    effect_target, effect_action, effect_value : memoryview
+        One entry per effect, holding ``CardTarget`` and ``CardAction`` values
+    condition_offsets, condition_codes : memoryview
+        The condition of effect ``j`` is encoded (see ``realms.conditions``) in
+        ``condition_codes[condition_offsets[j]:condition_offsets[j + 1]]``, which is
+        empty when the effect is unconditional
+    """
+    def __init__(self, buffer):
+        view: memoryview = memoryview(buffer).cast('B')
+        magic, version, n, m, names_len, codes_len = _HEADER.unpack_from(view, 0)
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            raise CatalogFormatError(f"Not an encoded catalog (version {version})")
+        self.buffer = buffer
+        self.size: int = n
+        self.effects: int = m
+        offset: int = _HEADER.size
+        fields = {}
+        for name, code, length in _layout(n, m, names_len, codes_len):
+            offset = _align(offset, code)
+            nbytes = length * array(code).itemsize
+            fields[name] = view[offset:offset + nbytes].cast(code)
+            offset += nbytes
+        self.nbytes: int = offset
+        self.ids = fields['ids']
+        self.faction = fields['faction']
+        self.flags = fields['flags']
+        self.defense = fields['defense']
+        self.cost = fields['cost']
+        self.count = fields['count']
+        self.slot_offsets = fields['slot_offsets']
+        self.effect_target = fields['effect_target']
+        self.effect_action = fields['effect_action']
+        self.effect_value = fields['effect_value']
+        self.condition_offsets = fields['condition_offsets']
+        self.condition_codes = fields['condition_codes']
+        self.name_offsets = fields['name_offsets']
+        self.names = fields['names']
+        self._rows: Dict[int, int] = {t: i for i, t in enumerate(self.ids)}
+        return
+
+    @staticmethod
+    def encode(catalog: CardCatalog) -> bytes:
+        """Encodes the templates of a catalog into a single buffer
+        """
+        templates: List[CardTemplate] = catalog.templates
+        names: bytes = b''
+        name_offsets = array('I', [0])
+        slot_offsets = array('I', [0])
+        targets, actions, values = array('B'), array('B'), array('h')
+        condition_offsets, condition_codes = array('I', [0]), array('h')
+        for t in templates:
+            names += t.name.encode('utf-8')
+            name_offsets.append(len(names))
+            for slot in (t.effects_basic, t.effects_ally, t.effects_scrap):
+                for e in slot:
+                    targets.append(e.target.value)
+                    actions.append(e.action.value)
+                    values.append(e.value)
+                    condition_codes.extend(e.condition.codes)
+                    condition_offsets.append(len(condition_codes))
+                slot_offsets.append(len(values))
+        columns = {
+            'ids': array('H', [t.id for t in templates]),
+            'faction': array('B', [FACTIONS.index(t.faction) for t in templates]),
+            'flags': array('B', [int(t.base) | int(t.outpost) << 1 for t in templates]),
+            'defense': array('h', [t.defense for t in templates]),
+            'cost': array('h', [t.cost for t in templates]),
+            'count': array('h', [t.count for t in templates]),
+            'slot_offsets': slot_offsets,
+            'effect_target': targets,
+            'effect_action': actions,
+            'effect_value': values,
+            'condition_offsets': condition_offsets,
+            'condition_codes': condition_codes,
+            'name_offsets': name_offsets,
+            'names': array('B', names),
+        }
+        out = bytearray(_HEADER.pack(_MAGIC, _FORMAT_VERSION, len(templates), len(values),
+                                     len(names), len(condition_codes)))
+        for name, code, length in _layout(len(templates), len(values), len(names),
+                                          len(condition_codes)):
+            out += bytes(_align(len(out), code) - len(out))
+            out += columns[name].tobytes()
+        return bytes(out)
+
+    def row(self, template_id: int) -> int:
+        """The row holding the template with the given id
+        """
+        return self._rows[template_id]
+
+    def template(self, row: int) -> CardTemplate:
+        """Decodes the template stored in the given row
+        """
+        name: bytes = bytes(self.names[self.name_offsets[row]:self.name_offsets[row + 1]])
+        slots: List[Tuple[EffectTemplate, ...]] = []
+        for s in range(_SLOTS):
+            start: int = self.slot_offsets[_SLOTS * row + s]
+            end: int = self.slot_offsets[_SLOTS * row + s + 1]
+            slots.append(tuple(EffectTemplate(target=CardTarget(self.effect_target[i]),
+                                              action=CardAction(self.effect_action[i]),
+                                              value=self.effect_value[i],
+                                              condition=self.condition(i))
+                               for i in range(start, end)))
+        return CardTemplate(id=self.ids[row],
+                            name=name.decode('utf-8'),
+                            faction=FACTIONS[self.faction[row]],
+                            base=bool(self.flags[row] & 1),
+                            outpost=bool(self.flags[row] & 2),
+                            defense=self.defense[row],
+                            cost=self.cost[row],
+                            count=self.count[row],
+                            effects_basic=slots[0],
+                            effects_ally=slots[1],
+                            effects_scrap=slots[2])
+
+    def condition_codes_of(self, effect: int) -> memoryview:
+        """The encoded condition of the effect with the given index
+        """
+        return self.condition_codes[self.condition_offsets[effect]:
+                                    self.condition_offsets[effect + 1]]
+
+    def condition(self, effect: int) -> Condition:
+        """The compiled condition of the effect with the given index
+        """
+        return condition_from_codes(self.condition_codes_of(effect))
+
+    def catalog(self) -> CardCatalog:
+        """Builds a ``CardCatalog`` from the arrays
+        """
+        return CardCatalog([self.template(i) for i in range(self.size)])
+
+    def lazy_catalog(self) -> CardCatalog:
+        """Builds a ``CardCatalog`` that decodes each template from the arrays the
+        first time it is requested
+
+        Only the templates that a process actually uses become Python objects, and
+        the catalog keeps referring to the arrays. Unpickled catalogs are built this
+        way too.
+        """
+        catalog = CardCatalog([])
+        templates = _LazyTemplates(self)
+        catalog._templates = templates
+        catalog._by_name = _LazyNames(self, templates)
+        catalog._json = _LazyJSON(templates)
+        catalog.arrays = self
+        return catalog
+
+    def release(self) -> None:
+        """Releases the views into the underlying buffer
+        """
+        for name in ('ids', 'faction', 'flags', 'defense', 'cost', 'count', 'slot_offsets',
+                     'effect_target', 'effect_action', 'effect_value', 'condition_offsets',
+                     'condition_codes', 'name_offsets', 'names'):
+            getattr(self, name).release()
+        return
+
+
+class _LazyTemplates(Mapping):
+    """The templates of a ``CatalogArrays``, by id, decoded on first access"""
+    def __init__(self, arrays: CatalogArrays):
+        self._arrays: CatalogArrays = arrays
+        self._decoded: Dict[int, CardTemplate] = {}
+        return
+
+    def __getitem__(self, template_id: int) -> CardTemplate:
+        template: Optional[CardTemplate] = self._decoded.get(template_id)
+        if template is None:
+            template = self._arrays.template(self._arrays.row(template_id))
+            self._decoded[template_id] = template
+        return template
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._arrays.ids)
+
+    def __len__(self) -> int:
+        return self._arrays.size
+
+    def __contains__(self, template_id) -> bool:
+        return template_id in self._arrays._rows
+
+
+class _LazyNames(Mapping):
+    """The templates of a ``CatalogArrays``, by name, decoded on first access"""
+    def __init__(self, arrays: CatalogArrays, templates: _LazyTemplates):
+        names: bytes = bytes(arrays.names)
+        offsets: memoryview = arrays.name_offsets
+        self._ids: Dict[str, int] = {
+            names[offsets[i]:offsets[i + 1]].decode('utf-8'): arrays.ids[i]
+            for i in range(arrays.size)}
+        self._templates: _LazyTemplates = templates
+        return
+
+    def __getitem__(self, name: str) -> CardTemplate:
+        return self._templates[self._ids[name]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class _LazyJSON(dict):
+    """The serialized templates of a ``CatalogArrays``, serialized on first access"""
+    def __init__(self, templates: _LazyTemplates):
+        super().__init__()
+        self._templates: _LazyTemplates = templates
+        return
+
+    def __missing__(self, template_id: int) -> str:
+        prefix: str = _json_prefix(self._templates[template_id])
+        self[template_id] = prefix
+        return prefix
+
+
+class SharedCatalog(object):
+    """Publishes the arrays of a catalog in a ``multiprocessing.shared_memory`` block
+
+    The process that creates the ``SharedCatalog`` owns the block and should call
+    ``unlink`` once every worker is done with it. Workers call ``attach_catalog``
+    with ``name``, usually as a pool initializer.
+
+    Parameters
+    ----------
+    catalog : CardCatalog
+        The catalog to publish
+    name : str (Optional)
+        The name of the shared memory block (Default is a random name)
+
+    Examples
+    --------
+    >>> shared = SharedCatalog(local_catalog())
+    >>> pool = ProcessPoolExecutor(initializer=attach_catalog, initargs=(shared.name,))
+    """
+    def __init__(self, catalog: CardCatalog, name: Optional[str] = None):
+        data: bytes = CatalogArrays.encode(catalog)
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=len(data))
+        self._shm.buf[:len(data)] = data
+        self.name: str = self._shm.name
+        self.size: int = len(data)
+        return
+
+    def close(self) -> None:
+        self._shm.close()
+        return
+
+    def unlink(self) -> None:
+        """Closes and destroys the shared memory block
+        """
+        self._shm.close()
+        self._shm.unlink()
+        return
+
+    def __enter__(self) -> 'SharedCatalog':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.unlink()
+        return
+
+
+_attached: Optional[Tuple[shared_memory.SharedMemory, CatalogArrays]] = None
+
+
+def attach_catalog(name: str) -> CardCatalog:
+    """Maps a published catalog and installs it as this process's catalog
+
+    Parameters
+    ----------
+    name : str
+        The name of the shared memory block, i.e. ``SharedCatalog.name``
+
+    Returns
+    -------
+    CardCatalog
+        The catalog of the shared arrays, see ``CatalogArrays.lazy_catalog``
+    """
+    global _attached
+    shm = shared_memory.SharedMemory(name=name)
+    arrays = CatalogArrays(shm.buf)
+    catalog: CardCatalog = arrays.lazy_catalog()
+    _attached = (shm, arrays)
+    install_catalog(catalog)
+    return catalog
+
+
+def _align(offset: int, code: str) -> int:
+    size: int = array(code).itemsize
+    return (offset + size - 1) // size * size
+
+
+def _layout(n: int, m: int, names_len: int,
+            codes_len: int) -> List[Tuple[str, str, int]]:
+    """The name, array type code and length of each column of the buffer
+    """
+    return [('ids', 'H', n),
+            ('faction', 'B', n),
+            ('flags', 'B', n),
+            ('defense', 'h', n),
+            ('cost', 'h', n),
+            ('count', 'h', n),
+            ('slot_offsets', 'I', _SLOTS * n + 1),
+            ('effect_target', 'B', m),
+            ('effect_action', 'B', m),
+            ('effect_value', 'h', m),
+            ('condition_offsets', 'I', m + 1),
+            ('condition_codes', 'h', codes_len),
+            ('name_offsets', 'I', n + 1),
+            ('names', 'B', names_len)]
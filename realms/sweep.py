@@ -0,0 +1,512 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: sweep
+    :synopsis: Simulates games over a grid of card variants to measure their balance
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+
+A sweep answers questions such as "what happens to win rates if Trade Pod costs 3?"
+for every point of a grid of values from ``cards.json``::
+
+    >>> sweep = Sweep({'Trade Pod': {'cost': [2, 3, 4]}}, subject='Trade Pod')
+    >>> for result in sweep.run(workers=4):
+    ...     print(result)
+
+Each variant of the catalog is played in batches of games, by ``simulate``, over a
+process pool. Seats alternate between the policies from game to game, and the win
+rate is that of the first policy, which by default buys the ``subject`` card whenever
+it can against a ``TurnPolicy`` that does not favour it. ``Sweep.run`` yields the
+updated result of a variant every time one of its batches finishes.
+
+A variant stops as soon as the Wilson score interval of its win rate excludes the
+``reference`` rate, i.e. the variant is clearly better or worse, or when the interval
+is narrower than ``precision``, or after ``max_games``. Its batches that have not
+started yet are then cancelled, so the time goes to the variants still undecided.
+Since the interval is checked after every batch, the chance of stopping on a wrong
+decision is somewhat higher than ``1 - confidence``; a higher ``confidence`` or
+``min_games`` makes up for it.
+
+Fields are named by paths into the definition of a card, such as ``cost``,
+``count`` or ``effects.0.value``.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from enum import IntEnum
+from itertools import product
+from statistics import NormalDist
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from .cards import Card
+from .catalog import CardCatalog, install_catalog, local_catalog
+from .exceptions import CatalogFormatError
+from .game import Game
+from .turns import TurnPolicy, price
+
+CardList = List[Card]
+PolicyFactory = Callable[[], TurnPolicy]
+
+Override = Tuple[str, str, object]
+"""A card name, the path of a field of its definition, and the value of the field"""
+
+Variant = NamedTuple('Variant', [
+                     ('index', int),
+                     ('overrides', Tuple[Override, ...])])
+"""A point of the grid: its position in the sweep and the fields it changes"""
+
+Batch = NamedTuple('Batch', [
+                   ('games', int),
+                   ('wins', int),
+                   ('draws', int),
+                   ('turns', int),
+                   ('seconds', float)])
+"""The outcome of a batch of games: the games played, those won by the first policy,
+those stopped without a winner, and the turns and time they took"""
+
+_cards: Optional[List[dict]] = None
+_catalogs: Dict[Tuple[Override, ...], CardCatalog] = {}
+
+
+class PreferCard(TurnPolicy):
+    """Buys a given card whenever it can afford it, and otherwise plays as ``TurnPolicy``
+
+    Parameters
+    ----------
+    name : str
+        The name of the card
+    """
+    def __init__(self, name: str):
+        self.name: str = name
+        return
+
+    def buy(self, cards: CardList, money: int) -> Optional[Card]:
+        favoured: CardList = [c for c in cards if c.name == self.name and price(c) <= money]
+        return favoured[0] if favoured else super().buy(cards, money)
+
+    def acquire(self, cards: CardList) -> Optional[Card]:
+        favoured: CardList = [c for c in cards if c.name == self.name]
+        return favoured[0] if favoured else super().acquire(cards)
+
+
+class VariantStatus(IntEnum):
+    """Whether a variant is still being simulated, and why it stopped otherwise"""
+    RUNNING = 0
+    DECIDED = 1
+    """The interval of the win rate excludes the reference rate"""
+    PRECISE = 2
+    """The interval of the win rate is narrower than the requested precision"""
+    EXHAUSTED = 3
+    """Every game allowed was played"""
+
+
+class VariantResult(object):
+    """The games played so far for a variant
+
+    Attributes
+    ----------
+    variant : Variant
+        The variant
+    games, wins, draws, turns : int
+        The games played, won by the first policy, and stopped without a winner, and
+        the turns they took
+    seconds : float
+        The time spent playing the games, summed over every worker
+    status : VariantStatus
+        Whether the variant is still being simulated
+    """
+    def __init__(self, variant: Variant, z: float):
+        self.variant: Variant = variant
+        self.games: int = 0
+        self.wins: int = 0
+        self.draws: int = 0
+        self.turns: int = 0
+        self.seconds: float = 0.0
+        self.status: VariantStatus = VariantStatus.RUNNING
+        self._z: float = z
+        return
+
+    @property
+    def decided(self) -> int:
+        """The number of games that had a winner
+        """
+        return self.games - self.draws
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.decided if self.decided else 0.5
+
+    @property
+    def interval(self) -> Tuple[float, float]:
+        """The Wilson score interval of the win rate, over the games that had a winner
+        """
+        return wilson(self.wins, self.decided, self._z)
+
+    def add(self, batch: Batch) -> None:
+        self.games += batch.games
+        self.wins += batch.wins
+        self.draws += batch.draws
+        self.turns += batch.turns
+        self.seconds += batch.seconds
+        return
+
+    def as_dict(self) -> dict:
+        low, high = self.interval
+        return {'variant': self.variant.index,
+                'overrides': [list(o) for o in self.variant.overrides],
+                'status': self.status.name.lower(),
+                'games': self.games,
+                'draws': self.draws,
+                'win_rate': round(self.win_rate, 4),
+                'interval': [round(low, 4), round(high, 4)],
+                'mean_turns': round(self.turns / self.games, 1) if self.games else 0.0,
+                'seconds': round(self.seconds, 3)}
+
+    def __repr__(self) -> str:
+        low, high = self.interval
+        changes: str = ', '.join(f"{card}.{path}={value!r}"
+                                 for card, path, value in self.variant.overrides)
+        return (f"VariantResult({changes}: {self.win_rate:.3f} [{low:.3f}, {high:.3f}] "
+                f"over {self.games} games, {self.status.name})")
+
+
+class Sweep(object):
+    """Simulates every variant of a grid of card fields, see the module documentation
+
+    Parameters
+    ----------
+    grid : {str: {str: [object]}}
+        The values to try for each field of each card, keyed by card name and then by
+        the path of the field; the variants are every combination of them
+    subject : str (Optional)
+        The card that the first policy favours, see ``PreferCard`` (Default is
+        ``grid``'s only card, if there is one)
+    policies : (PolicyFactory, PolicyFactory) (Optional)
+        Picklable callables making the two policies, the first of which is measured
+        (Default is ``PreferCard(subject)`` against ``TurnPolicy``)
+    batch : int (Optional)
+        The number of games per batch (Default is 20)
+    min_games : int (Optional)
+        The number of games before a variant may stop early (Default is 40)
+    max_games : int (Optional)
+        The number of games after which a variant stops (Default is 1000)
+    confidence : float (Optional)
+        The confidence level of the intervals (Default is 0.95)
+    reference : float (Optional)
+        The win rate against which variants are decided (Default is 0.5)
+    precision : float (Optional)
+        The half-width of an interval at which a variant stops (Default is none)
+    max_turns : int (Optional)
+        The number of turns after which a game is a draw (Default is 400)
+    cards : [dict] (Optional)
+        The card definitions to vary (Default is ``cards.json``)
+    seed : int (Optional)
+        Seeds the games, so that a sweep can be repeated (Default is 0)
+
+    Raises
+    ------
+    CatalogFormatError
+        Raised when the grid names a card or a field that does not exist
+    """
+    def __init__(self, grid: Dict[str, Dict[str, Sequence]], subject: Optional[str] = None,
+                 policies: Optional[Tuple[PolicyFactory, PolicyFactory]] = None,
+                 batch: int = 20, min_games: int = 40, max_games: int = 1000,
+                 confidence: float = 0.95, reference: float = 0.5,
+                 precision: Optional[float] = None, max_turns: int = 400,
+                 cards: Optional[List[dict]] = None, seed: int = 0):
+        if subject is None and len(grid) == 1:
+            subject = next(iter(grid))
+        if policies is None:
+            if subject is None:
+                raise ValueError("A sweep over several cards needs a subject or policies")
+            policies = (_Prefer(subject), TurnPolicy)
+        self.cards: List[dict] = cards if cards is not None else _read_cards()
+        self.variants: List[Variant] = variants(grid, self.cards)
+        self.policies: Tuple[PolicyFactory, PolicyFactory] = policies
+        self.batch: int = batch
+        self.min_games: int = min_games
+        self.max_games: int = max_games
+        self.z: float = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.reference: float = reference
+        self.precision: Optional[float] = precision
+        self.max_turns: int = max_turns
+        self.seed: int = seed
+        self._catalogs: Dict[Tuple[Override, ...], CardCatalog] = {}
+        return
+
+    def run(self, workers: Optional[int] = None) -> Iterator[VariantResult]:
+        """Simulates the variants, yielding a variant's result after each of its batches
+
+        Parameters
+        ----------
+        workers : int (Optional)
+            The number of worker processes (Default is the number of CPUs). If 0, the
+            games are played in this process.
+
+        Yields
+        ------
+        VariantResult
+            The updated result of the variant whose batch finished; its ``status``
+            tells whether the variant stopped
+        """
+        results: List[VariantResult] = [VariantResult(v, self.z) for v in self.variants]
+        if workers == 0:
+            return self._run_here(results)
+        return self._run_pool(results, workers or os.cpu_count() or 1)
+
+    def _run_here(self, results: List[VariantResult]) -> Iterator[VariantResult]:
+        scheduled: List[int] = [0] * len(results)
+        while True:
+            i: Optional[int] = self._next(results, scheduled)
+            if i is None:
+                return
+            overrides, *task = self._task(i, scheduled)
+            yield self._settle(results[i], simulate(self._catalog(overrides), *task))
+
+    def _run_pool(self, results: List[VariantResult], workers: int) -> Iterator[VariantResult]:
+        """Keeps two batches per worker in flight, cancelling those of stopped variants
+        """
+        scheduled: List[int] = [0] * len(results)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_install_cards,
+                                 initargs=(self.cards,)) as pool:
+            pending: Dict[Future, int] = {}
+            while True:
+                while len(pending) < 2 * workers:
+                    i = self._next(results, scheduled)
+                    if i is None:
+                        break
+                    pending[pool.submit(_simulate, *self._task(i, scheduled))] = i
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = pending.pop(future)
+                    if future.cancelled() or results[i].status != VariantStatus.RUNNING:
+                        continue
+                    yield self._settle(results[i], future.result())
+                    if results[i].status != VariantStatus.RUNNING:
+                        self._cancel(pending, i)
+
+    def _next(self, results: List[VariantResult], scheduled: List[int]) -> Optional[int]:
+        """The running variant with the fewest games scheduled, if any may have more
+        """
+        running: List[int] = [i for i, r in enumerate(results)
+                              if r.status == VariantStatus.RUNNING
+                              if scheduled[i] < self.max_games]
+        return min(running, key=scheduled.__getitem__) if running else None
+
+    def _task(self, i: int, scheduled: List[int]) -> tuple:
+        """The arguments of ``simulate`` for the next batch of a variant
+        """
+        games: int = min(self.batch, self.max_games - scheduled[i])
+        seed: int = hash((self.seed, i, scheduled[i])) & 0xffffffff
+        task = (self.variants[i].overrides, games, self.policies, seed, self.max_turns,
+                scheduled[i] % 2 == 1)
+        scheduled[i] += games
+        return task
+
+    def _catalog(self, overrides: Tuple[Override, ...]) -> CardCatalog:
+        catalog: Optional[CardCatalog] = self._catalogs.get(overrides)
+        if catalog is None:
+            catalog = self._catalogs[overrides] = variant_catalog(self.cards, overrides)
+        return catalog
+
+    def _settle(self, result: VariantResult, batch: Batch) -> VariantResult:
+        """Adds a batch to a result, and stops the variant if it can
+        """
+        result.add(batch)
+        low, high = result.interval
+        if result.games >= self.max_games:
+            result.status = VariantStatus.EXHAUSTED
+        elif result.decided < self.min_games:
+            pass
+        elif high < self.reference or low > self.reference:
+            result.status = VariantStatus.DECIDED
+        elif self.precision is not None and (high - low) / 2 <= self.precision:
+            result.status = VariantStatus.PRECISE
+        return result
+
+    @staticmethod
+    def _cancel(pending: Dict[Future, int], i: int) -> None:
+        """Cancels the batches of a variant that have not started
+        """
+        for future, j in list(pending.items()):
+            if j == i and future.cancel():
+                del pending[future]
+        return
+
+
+def variants(grid: Dict[str, Dict[str, Sequence]], cards: List[dict]) -> List[Variant]:
+    """Every combination of the values of a grid
+
+    Raises
+    ------
+    CatalogFormatError
+        Raised when the grid names a card or a field that does not exist
+    """
+    names = {c['name']: c for c in cards}
+    axes: List[List[Override]] = []
+    for name, fields in grid.items():
+        if name not in names:
+            raise CatalogFormatError(f"No card named {name!r}")
+        for path, values in fields.items():
+            _field(names[name], path)
+            axes.append([(name, path, v) for v in values])
+    return [Variant(i, tuple(o)) for i, o in enumerate(product(*axes))]
+
+
+def variant_catalog(cards: List[dict], overrides: Sequence[Override]) -> CardCatalog:
+    """Builds the catalog of a variant from the definitions of the cards
+
+    The definitions are left untouched.
+    """
+    cards = json.loads(json.dumps(cards))
+    names = {c['name']: c for c in cards}
+    for name, path, value in overrides:
+        container, key = _field(names[name], path)
+        container[key] = value
+    return CardCatalog.from_json(cards)
+
+
+def simulate(catalog: CardCatalog, games: int,
+             policies: Tuple[PolicyFactory, PolicyFactory], seed: int,
+             max_turns: int = 400, swap: bool = False) -> Batch:
+    """Plays a batch of games with the cards of a catalog
+
+    The catalog is installed as the process-local catalog while the games are played,
+    and the global random generator, which shuffles the decks, is seeded; both are
+    restored afterwards.
+
+    Parameters
+    ----------
+    catalog : CardCatalog
+        The cards of the variant, see ``variant_catalog``
+    games : int
+        The number of games to play
+    policies : (PolicyFactory, PolicyFactory)
+        Make the policies; the wins of the first one are counted
+    seed : int
+        Seeds the games
+    max_turns : int (Optional)
+        The number of turns after which a game is a draw (Default is 400)
+    swap : bool (Optional)
+        Whether the first policy moves second in the first game (Default is false)
+    """
+    start: float = time.perf_counter()
+    previous: CardCatalog = local_catalog()
+    state = random.getstate()
+    random.seed(seed)
+    install_catalog(catalog)
+    wins = draws = turns = 0
+    try:
+        for g in range(games):
+            subject: TurnPolicy = policies[0]()
+            seats: List[TurnPolicy] = [subject, policies[1]()]
+            if (g % 2 == 1) != swap:
+                seats.reverse()
+            game: Game = Game(catalog, policies=seats)
+            winner = game.run(max_turns=max_turns)
+            wins += winner is not None and winner.policy is subject
+            draws += winner is None
+            turns += game.turn
+    finally:
+        install_catalog(previous)
+        random.setstate(state)
+    return Batch(games, wins, draws, turns, time.perf_counter() - start)
+
+
+def wilson(successes: int, n: int, z: float = 1.96) -> Tuple[float, float]:
+    """The Wilson score interval of a proportion
+
+    Parameters
+    ----------
+    successes, n : int
+        The number of successes out of ``n`` trials
+    z : float (Optional)
+        The standard score of the confidence level (Default is 1.96, i.e. 95%)
+    """
+    if n == 0:
+        return 0.0, 1.0
+    p: float = successes / n
+    centre: float = (p + z * z / (2 * n)) / (1 + z * z / n)
+    spread: float = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return max(0.0, centre - spread), min(1.0, centre + spread)
+
+
+class _Prefer(object):
+    """A picklable factory of ``PreferCard`` policies"""
+    def __init__(self, name: str):
+        self.name: str = name
+
+    def __call__(self) -> PreferCard:
+        return PreferCard(self.name)
+
+
+def _field(card: dict, path: str) -> Tuple[object, object]:
+    """The container and the key of a field of a card definition
+
+    Raises
+    ------
+    CatalogFormatError
+        Raised when the card has no such field
+    """
+    container: object = card
+    keys: List[str] = path.split('.')
+    try:
+        for key in keys[:-1]:
+            container = container[int(key) if isinstance(container, list) else key]
+        last = int(keys[-1]) if isinstance(container, list) else keys[-1]
+        container[last]
+    except (KeyError, IndexError, ValueError, TypeError):
+        raise CatalogFormatError(f"{card['name']!r} has no field {path!r}")
+    return container, last
+
+
+def _read_cards() -> List[dict]:
+    from .cardrepo import _read_cards_json
+    return _read_cards_json()
+
+
+def _install_cards(cards: List[dict]) -> None:
+    """Pool initializer giving the workers the definitions the variants are built from
+    """
+    global _cards
+    _cards = cards
+    _catalogs.clear()
+    return
+
+
+def _simulate(overrides: Tuple[Override, ...], *args) -> Batch:
+    """Simulates a batch in a worker, which builds the catalog of each variant once
+    """
+    catalog: Optional[CardCatalog] = _catalogs.get(overrides)
+    if catalog is None:
+        catalog = _catalogs[overrides] = variant_catalog(_cards, overrides)
+    return simulate(catalog, *args)
+
+
+def main(args=None):
+    """Sweeps the values of a single field of a card, printing results as JSON lines"""
+    parser = argparse.ArgumentParser(prog='realms.sweep',
+                                     description='Simulate games over card variants')
+    parser.add_argument('card', help='the name of the card to vary')
+    parser.add_argument('field', help='the path of the field, e.g. cost or effects.0.value')
+    parser.add_argument('values', nargs='+', type=json.loads, help='the values to try')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='the number of worker processes (default: one per CPU)')
+    parser.add_argument('--max-games', type=int, default=1000,
+                        help='the games after which a variant stops (default: 1000)')
+    parser.add_argument('--precision', type=float, default=None,
+                        help='the half-width of an interval at which a variant stops')
+    options = parser.parse_args(args)
+    sweep = Sweep({options.card: {options.field: options.values}},
+                  max_games=options.max_games, precision=options.precision)
+    for result in sweep.run(options.workers):
+        print(json.dumps(result.as_dict()), flush=True)
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: sync
+    :synopsis: Delta-encoded synchronization of a player's view with web clients
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+
+A client first receives a full frame, then one small delta per change::
+
+    {"s": 1, "f": 1, "r": [[12, "9f.."], ...], "h": [[3, "a1.."], ...],
+     "p": {"undrawn": 5, "discards": 0, "main": 75}, "t": {"OWNER.MONEY": 4}}
+    {"s": 2, "b": 1, "h-": ["a1.."], "p": {"discards": 1}}
+
+Every frame carries its sequence number ``s``; a delta also carries the sequence
+number ``b`` it applies to. A client whose last sequence number is not ``b`` asks
+for a resync and is sent a full frame.
+"""
+
+import json
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from .decks import Hand, MainDeck, PlayerDeck, TradeRow
+
+CardRef = Tuple[int, str]
+"""A card as seen by a client: its template id and UUID"""
+
+PlayerView = NamedTuple('PlayerView', [
+                        ('row', Tuple[CardRef, ...]),
+                        ('hand', Dict[str, int]),
+                        ('piles', Dict[str, int]),
+                        ('totals', Dict[str, int])])
+"""The observable state of a player's view of the game
+
+``row`` holds one card per trade-row slot (the Explorer last), ``hand`` maps UUIDs to
+template ids, ``piles`` holds pile sizes and ``totals`` the hand's effect totals keyed
+by ``"TARGET.ACTION"``.
+"""
+
+
+def observe(traderow: TradeRow, hand: Hand, playerdeck: PlayerDeck,
+            maindeck: Optional[MainDeck] = None) -> PlayerView:
+    """Captures the observable state of a player's view
+
+    Parameters
+    ----------
+    traderow : TradeRow
+        The trade row of the game
+    hand : Hand
+        The player's current hand
+    playerdeck : PlayerDeck
+        The player's deck
+    maindeck : MainDeck (Optional)
+        The main deck, whose size is included when given
+
+    Note
+    ----
+    Reading the trade row tops it up from the main deck, so the trade row is read
+    before any pile sizes.
+
+    Returns
+    -------
+    PlayerView
+        The captured view
+    """
+    row: Tuple[CardRef, ...] = tuple((c.template_id, c.uuid) for c in traderow.available)
+    piles: Dict[str, int] = {'undrawn': len(playerdeck._undrawn),
+                             'discards': len(playerdeck._discards)}
+    if maindeck is not None:
+        piles['main'] = len(maindeck._cards)
+    totals: Dict[str, int] = {f"{target.name}.{action.name}": value
+                              for (target, action), value in hand.effect_totals().items()
+                              if value}
+    return PlayerView(row=row,
+                      hand={c.uuid: c.template_id for c in hand.cards},
+                      piles=piles,
+                      totals=totals)
+
+
+def diff(old: PlayerView, new: PlayerView) -> dict:
+    """Produces the minimal set of changes that turns one view into another
+
+    Only the keys that changed are present in the result: ``r`` (trade-row slots,
+    ``None`` for a slot that was emptied), ``h+``/``h-`` (cards added to or removed
+    from the hand), ``p`` (pile sizes) and ``t`` (effect totals, 0 when removed).
+    """
+    delta: dict = {}
+    slots: Dict[str, Optional[List]] = {}
+    for i in range(max(len(old.row), len(new.row))):
+        before = old.row[i] if i < len(old.row) else None
+        after = new.row[i] if i < len(new.row) else None
+        if before != after:
+            slots[str(i)] = list(after) if after is not None else None
+    if slots:
+        delta['r'] = slots
+    added = [[t, u] for u, t in new.hand.items() if u not in old.hand]
+    removed = [u for u in old.hand if u not in new.hand]
+    if added:
+        delta['h+'] = added
+    if removed:
+        delta['h-'] = removed
+    piles = {k: v for k, v in new.piles.items() if old.piles.get(k) != v}
+    if piles:
+        delta['p'] = piles
+    totals = {k: v for k, v in new.totals.items() if old.totals.get(k) != v}
+    totals.update({k: 0 for k in old.totals if k not in new.totals})
+    if totals:
+        delta['t'] = totals
+    return delta
+
+
+def _encode(frame: dict) -> bytes:
+    return json.dumps(frame, separators=(',', ':')).encode()
+
+
+class ViewSync(object):
+    """Produces the sequence of frames that keeps clients in sync with one view
+
+    The frames are encoded once and the same bytes are handed to every client
+    watching the view, so the cost of an update does not depend on the number of
+    watchers.
+    """
+    def __init__(self):
+        self.seq: int = 0
+        self._view: Optional[PlayerView] = None
+        self._delta: Optional[bytes] = None
+        self._full: Optional[bytes] = None
+        return
+
+    def update(self, view: PlayerView) -> Optional[bytes]:
+        """Records a new observation of the view
+
+        Parameters
+        ----------
+        view : PlayerView
+            The latest observation
+
+        Returns
+        -------
+        bytes
+            The encoded delta to send to clients that are up to date, or ``None`` if
+            nothing changed
+        """
+        if self._view is None:
+            self._view = view
+            self.seq = 1
+            self._delta = None
+            self._full = None
+            return self.full_frame()
+        delta: dict = diff(self._view, view)
+        if not delta:
+            return None
+        self.seq += 1
+        delta['s'] = self.seq
+        delta['b'] = self.seq - 1
+        self._view = view
+        self._delta = _encode(delta)
+        self._full = None
+        return self._delta
+
+    def full_frame(self) -> bytes:
+        """The encoded full state at the current sequence number
+        """
+        if self._full is None:
+            view: PlayerView = self._view
+            self._full = _encode({'s': self.seq,
+                                  'f': 1,
+                                  'r': [list(c) for c in view.row],
+                                  'h': [[t, u] for u, t in view.hand.items()],
+                                  'p': view.piles,
+                                  't': view.totals})
+        return self._full
+
+    def frame_for(self, client_seq: int) -> Optional[bytes]:
+        """The frame to send to a client whose last frame had the given sequence number
+
+        Returns ``None`` if the client is up to date, the latest delta if the client is
+        exactly one frame behind, and a full frame (a resync) otherwise.
+        """
+        if client_seq == self.seq:
+            return None
+        if self._delta is not None and client_seq == self.seq - 1:
+            return self._delta
+        return self.full_frame()
+
+
+class ViewMirror(object):
+    """Rebuilds a view from frames, as a client would
+
+    This is the reference implementation of the client side of the protocol.
+    """
+    def __init__(self):
+        self.seq: int = 0
+        self.row: List[Optional[List]] = []
+        self.hand: Dict[str, int] = {}
+        self.piles: Dict[str, int] = {}
+        self.totals: Dict[str, int] = {}
+        return
+
+    def apply(self, frame: bytes) -> bool:
+        """Applies a frame
+
+        Returns
+        -------
+        bool
+            ``False`` if the frame is a delta that does not follow the mirror's
+            sequence number, in which case a resync is needed
+        """
+        data: dict = json.loads(frame)
+        if data.get('f'):
+            self.row = data['r']
+            self.hand = {u: t for t, u in data['h']}
+            self.piles = dict(data['p'])
+            self.totals = dict(data['t'])
+        elif data['b'] != self.seq:
+            return False
+        else:
+            for slot, card in data.get('r', {}).items():
+                i = int(slot)
+                self.row.extend([None] * (i + 1 - len(self.row)))
+                self.row[i] = card
+            while self.row and self.row[-1] is None:
+                self.row.pop()
+            self.hand.update((u, t) for t, u in data.get('h+', []))
+            for u in data.get('h-', []):
+                del self.hand[u]
+            self.piles.update(data.get('p', {}))
+            for k, v in data.get('t', {}).items():
+                if v:
+                    self.totals[k] = v
+                else:
+                    self.totals.pop(k, None)
+        self.seq = data['s']
+        return True
+
+    def view(self) -> PlayerView:
+        return PlayerView(row=tuple(tuple(c) for c in self.row),
+                          hand=self.hand,
+                          piles=self.piles,
+                          totals=self.totals)
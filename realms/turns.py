@@ -0,0 +1,583 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: turns
+    :synopsis: Resolves a player's turn through a priority-ordered queue of effects
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+
+A turn goes through the pipeline described by ``Hand``:
+
+1. The player discards the cards an opponent forced them to, then the cards in hand
+   are played one at a time, along with the bases already in play
+2. The effects of a played card whose condition holds are applied; the others wait
+   until a later card makes their condition hold
+3. The factions in play are tallied after each card, and ally effects are applied as
+   soon as their faction is allied
+4. Effects that require a decision or change the cards in play (drawing, discarding,
+   scrapping, free acquisitions, destroying bases, forced discards) go through a heap
+   ordered by ``PRIORITIES``, which is emptied after each card, so cards drawn by an
+   effect are played, and re-evaluate allies and conditions, before the next card
+5. Commutative effects (trade, combat, authority) are only added to the pools of the
+   player's ``PlayerState`` and applied once, in a batch, at the end of the turn:
+   buying cards, attacking, then healing. The unconditional ones are added by the
+   compiled effects of the card's template (see ``realms.effects``), a single call
+   per card and slot
+6. Scrap abilities are used after the last card is played, before the batch
+
+The steps are grouped into the phases named by ``PHASES``: drawing and forced
+discards, playing cards, scrap abilities, then buying, attacking, and healing and
+clean-up. Every decision goes through a ``TurnPolicy``, which bots override.
+"""
+
+import heapq
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+from .cards import Card, CardAction, CardEffect, CardFaction, CardTarget
+from .conditions import Counts, count_card, faction_count, hand_counts
+from .decks import EffectRecord, TradeRow
+from .effects import ALLY, BASIC, POOLS, PRIORITIES, SCRAP, PlayerState, is_deferred
+from .exceptions import UUIDNotFoundError
+
+CardList = List[Card]
+
+PHASES: Tuple[str, ...] = ('draw', 'play', 'scrap', 'buy', 'attack', 'end')
+"""The phases of a turn, in the order they are played"""
+
+HAND_SIZE: int = 5
+
+EXPLORER_COST: int = 2
+"""The price of an Explorer, which ``cards.json`` lists with a cost of 0"""
+
+TurnReport = NamedTuple('TurnReport', [
+                        ('played', int),
+                        ('damage', int),
+                        ('acquired', CardList),
+                        ('scrapped', CardList),
+                        ('bases_destroyed', CardList)])
+"""What happened during a turn: the number of cards played, the damage dealt to the
+opponent's authority, and the cards acquired, scrapped and destroyed"""
+
+
+def price(card: Card) -> int:
+    """The trade needed to buy a card from the trade row
+    """
+    return EXPLORER_COST if card.name == 'Explorer' else card.cost
+
+
+class EffectQueue(object):
+    """A heap of effects waiting to be resolved, ordered by ``PRIORITIES`` and then by
+    the order in which they were queued
+    """
+    def __init__(self):
+        self._heap: List[Tuple[int, int, EffectRecord]] = []
+        self._seq: int = 0
+        return
+
+    def push(self, effect: EffectRecord) -> None:
+        self._seq += 1
+        heapq.heappush(self._heap, (PRIORITIES[(effect.target, effect.action)],
+                                    self._seq, effect))
+        return
+
+    def pop(self) -> EffectRecord:
+        """Removes and produces the effect to resolve next
+
+        Raises
+        ------
+        IndexError
+            Raised when the queue is empty
+        """
+        return heapq.heappop(self._heap)[2]
+
+    def clear(self) -> None:
+        self._heap.clear()
+        return
+
+    def copy(self) -> 'EffectQueue':
+        queue: EffectQueue = EffectQueue()
+        queue._heap = list(self._heap)
+        queue._seq = self._seq
+        return queue
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+class TurnPolicy(object):
+    """The decisions a player makes during a turn
+
+    The default implementation plays a simple greedy strategy: it gets rid of starting
+    cards first, buys and acquires the most expensive cards, and attacks outposts,
+    then bases it can destroy, then the opponent.
+
+    Attributes
+    ----------
+    blocking : bool
+        Whether a decision can take long enough to hold up an event loop, as a
+        search does; ``GameScheduler`` plays the turns of games with such a player on
+        an executor
+    remote : bool
+        Whether the player's cards are drawn and bought by a client of
+        ``GameServer`` rather than by the policy; ``GameScheduler`` waits for the
+        client instead of playing the player's turns
+    """
+    blocking: bool = False
+    remote: bool = False
+
+    def start(self, turn: 'Turn') -> None:
+        """Called at the start of each of the player's turns, before any decision
+        """
+        return
+
+    def next_card(self, hand: CardList) -> Card:
+        """Chooses the next card to play from the cards in hand
+        """
+        return hand[0]
+
+    def discard(self, hand: CardList, n: int, required: bool) -> CardList:
+        """Chooses up to ``n`` cards to discard from the cards in hand
+
+        ``required`` is true when the discards were forced by an opponent, in which
+        case the player must discard ``n`` cards if they can.
+        """
+        cards: CardList = sorted(hand, key=lambda c: c.cost)
+        return cards[:n] if required else [c for c in cards if c.cost == 0][:n]
+
+    def scrap(self, cards: CardList, n: int) -> CardList:
+        """Chooses up to ``n`` cards in play to scrap
+        """
+        return [c for c in cards if c.cost == 0][:n]
+
+    def use_scrap_abilities(self, cards: CardList) -> CardList:
+        """Chooses the cards in play to scrap for their scrap abilities
+        """
+        return [c for c in cards if c.name == 'Explorer']
+
+    def acquire(self, cards: CardList) -> Optional[Card]:
+        """Chooses a card of the trade row to acquire for free, if any
+        """
+        ships: CardList = [c for c in cards if not c.base]
+        return max(ships, key=lambda c: c.cost) if ships else None
+
+    def buy(self, cards: CardList, money: int) -> Optional[Card]:
+        """Chooses a card of the trade row to buy with the remaining trade, if any
+        """
+        affordable: CardList = [c for c in cards if price(c) <= money]
+        return max(affordable, key=price) if affordable else None
+
+    def destroy(self, bases: CardList) -> Optional[Card]:
+        """Chooses an opponent's base to destroy without spending combat, if any
+        """
+        return max(bases, key=lambda c: c.defense) if bases else None
+
+    def attack(self, bases: CardList, damage: int) -> Optional[Card]:
+        """Chooses the next base to attack, or ``None`` to attack the opponent
+
+        Outposts must be destroyed before anything else can be attacked; the turn
+        enforces it whatever the policy chooses.
+        """
+        outposts: CardList = [b for b in bases if b.outpost]
+        for base in sorted(outposts or bases, key=lambda b: b.defense):
+            if base.defense <= damage:
+                return base
+        return None
+
+
+class Turn(object):
+    """Resolves a single turn of a player against an opponent
+
+    Parameters
+    ----------
+    player : Player
+        The player whose turn it is
+    opponent : Player
+        The player on the receiving end of attacks, discards and destroy effects
+    traderow : TradeRow (Optional)
+        The trade row to buy and acquire from (Default is buying nothing)
+    game : Game (Optional)
+        The game the turn belongs to, which policies that search ahead fork (Default
+        is a turn outside of any game)
+
+    Attributes
+    ----------
+    phase : int
+        The index in ``PHASES`` of the phase being played
+    money : int
+        The trade left to spend, once the buy phase has started
+    """
+    def __init__(self, player, opponent, traderow: Optional[TradeRow] = None, game=None):
+        self.player = player
+        self.opponent = opponent
+        self.traderow: Optional[TradeRow] = traderow
+        self.game = game
+        self.policy: TurnPolicy = player.policy
+        self.state: PlayerState = player.state
+        self.queue: EffectQueue = player._queued_effects
+        self.hand: CardList = []
+        self.in_play: CardList = []
+        self.counts: Counts = hand_counts([])
+        self.acquired: CardList = []
+        self.scrapped: CardList = []
+        self.destroyed: CardList = []
+        self.played: int = 0
+        self.damage: int = 0
+        self.phase: int = 0
+        self.money: Optional[int] = None
+        self._unplayed_bases: Optional[CardList] = None
+        self._allied: Set[str] = set()
+        self._waiting: List[Tuple[CardEffect, Card]] = []
+        self._handlers = self._bind_handlers()
+        self._catalog = self.player._deck._catalog
+        return
+
+    def _bind_handlers(self) -> Dict[Tuple[CardTarget, CardAction], Callable[[int], None]]:
+        return {
+            (CardTarget.OWNER, CardAction.DRAW): self._draw,
+            (CardTarget.OWNER, CardAction.DISCARD): self._discard,
+            (CardTarget.OWNER, CardAction.SCRAP): self._scrap,
+            (CardTarget.OWNER, CardAction.ACQUIRE): self._acquire,
+            (CardTarget.OPPONENT, CardAction.DESTROY): self._destroy,
+            (CardTarget.OPPONENT, CardAction.DISCARD): self._force_discard,
+        }
+
+    def phases(self) -> List[Tuple[str, Callable[[], None]]]:
+        """The phases of the turn, named by ``PHASES``, to be called in order
+
+        ``play`` calls them one after the other; a caller that needs to act between
+        phases, such as ``Game`` timing them, calls them itself and then ``report``.
+        """
+        return [('draw', self.begin),
+                ('play', self.play_cards),
+                ('scrap', self.use_scrap_abilities),
+                ('buy', self.buy),
+                ('attack', self.attack),
+                ('end', self.end)]
+
+    def play(self) -> TurnReport:
+        """Plays the whole turn
+
+        Returns
+        -------
+        TurnReport
+            A summary of the turn
+        """
+        for _, phase in self.phases():
+            phase()
+        return self.report()
+
+    def resume(self) -> TurnReport:
+        """Plays the rest of the turn, starting over the phase in progress
+
+        Every phase picks up where it was interrupted, so a fork of a turn taken in the
+        middle of a decision can be played out, see ``fork``.
+        """
+        phases = self.phases()
+        for _, phase in phases[self.phase:]:
+            phase()
+        return self.report()
+
+    def fork(self, game) -> 'Turn':
+        """Copies the turn in progress onto a fork of its game
+
+        Parameters
+        ----------
+        game : Game
+            A fork of the game of the turn, see ``Game.fork``
+        """
+        players = self.game.players
+        turn: Turn = Turn(game.players[players.index(self.player)],
+                          game.players[players.index(self.opponent)], game.traderow, game)
+        turn.hand = list(self.hand)
+        turn.in_play = list(self.in_play)
+        turn.counts = list(self.counts)
+        turn.acquired = list(self.acquired)
+        turn.scrapped = list(self.scrapped)
+        turn.destroyed = list(self.destroyed)
+        turn.played = self.played
+        turn.damage = self.damage
+        turn.phase = self.phase
+        turn.money = self.money
+        if self._unplayed_bases is not None:
+            turn._unplayed_bases = list(self._unplayed_bases)
+        turn._allied = set(self._allied)
+        turn._waiting = list(self._waiting)
+        return turn
+
+    def __getstate__(self) -> dict:
+        """Drops the handlers, which are bound methods, the policy and the catalog
+        """
+        state: dict = dict(self.__dict__)
+        del state['_handlers'], state['policy'], state['_catalog']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.policy = self.player.policy
+        self._handlers = self._bind_handlers()
+        self._catalog = self.player._deck._catalog
+        return
+
+    def report(self) -> TurnReport:
+        """Summarizes the turn once every phase has been played
+        """
+        return TurnReport(played=self.played, damage=self.damage, acquired=self.acquired,
+                          scrapped=self.scrapped, bases_destroyed=self.destroyed)
+
+    def begin(self, hand: Optional[CardList] = None) -> None:
+        """Draws a hand, then discards the cards an opponent forced the player to
+
+        Parameters
+        ----------
+        hand : [Card] (Optional)
+            The cards the player already drew, such as a client of ``GameServer``
+            (Default is drawing ``HAND_SIZE`` cards)
+        """
+        self.phase = 0
+        self.policy.start(self)
+        self.queue.clear()
+        self.state.reset()
+        if hand is None:
+            self._draw(HAND_SIZE)
+        else:
+            self.hand = list(hand)
+        if self.state.discards_due:
+            self._discard_cards(self.state.discards_due, required=True)
+            self.state.discards_due = 0
+        return
+
+    def play_cards(self) -> None:
+        """Plays the bases in play, then every card in hand
+        """
+        self.phase = 1
+        if self._unplayed_bases is None:
+            self._unplayed_bases = list(self.player._bases)
+        self._resolve()
+        while self._unplayed_bases:
+            self._play(self._unplayed_bases.pop(0))
+        while self.hand:
+            self.play_card(self.policy.next_card(self.hand))
+        return
+
+    def play_card(self, card: Card) -> None:
+        """Plays a card from the hand
+        """
+        self.hand.remove(card)
+        self._play(card)
+        self.played += 1
+        return
+
+    def _play(self, card: Card) -> None:
+        """Puts a card in play, applies whatever it makes applicable and resolves the queue
+        """
+        self.in_play.append(card)
+        count_card(self.counts, card)
+        self._apply(card, BASIC)
+        for c in self.in_play:
+            if c.uuid not in self._allied and self._is_allied(c):
+                self._allied.add(c.uuid)
+                self._apply(c, ALLY)
+        waiting, self._waiting = self._waiting, []
+        for e, provider in waiting:
+            self._offer(e, provider)
+        self._resolve()
+        return
+
+    def _resolve(self) -> None:
+        """Resolves queued effects until the queue is empty
+        """
+        while self.queue:
+            effect: EffectRecord = self.queue.pop()
+            self._handlers[(effect.target, effect.action)](effect.value)
+        return
+
+    def use_scrap_abilities(self) -> None:
+        """Scraps the cards in play the policy chooses, for their scrap abilities
+        """
+        self.phase = 2
+        self._resolve()
+        candidates: CardList = [c for c in self.in_play
+                                if c.effects_scrap and c not in self.scrapped]
+        for card in self.policy.use_scrap_abilities(candidates):
+            self.scrapped.append(card)
+            self._apply(card, SCRAP)
+            self._resolve()
+        return
+
+    def _apply(self, card: Card, slot: int) -> None:
+        """Adds the unconditional commutative effects of one of a card's slots to the
+        pools, and offers the slot's other effects one at a time
+        """
+        compiled = self._catalog.compiled_effects(card.template_id)
+        compiled.pools[slot](self.state)
+        if compiled.deferred[slot]:
+            effects = (card.effects_basic, card.effects_ally, card.effects_scrap)[slot]
+            for e in effects:
+                if is_deferred(e):
+                    self._offer(e, card)
+        return
+
+    def _is_allied(self, card: Card) -> bool:
+        """Whether a card's ally effects are active, with the rules of ``Hand``
+        """
+        if card.faction in (CardFaction.UNALIGNED, CardFaction.ALL):
+            return False
+        if faction_count(self.counts, CardFaction.ALL) > 0:
+            return True
+        return faction_count(self.counts, card.faction) > 1
+
+    def _offer(self, effect: CardEffect, provider: Card) -> None:
+        """Applies an effect if its condition holds, otherwise keeps it for later
+        """
+        if not effect.condition.test(self.counts):
+            self._waiting.append((effect, provider))
+            return
+        key: Tuple[CardTarget, CardAction] = (effect.target, effect.action)
+        if key in PRIORITIES:
+            self.queue.push(EffectRecord(target=effect.target, action=effect.action,
+                                         value=effect.value, uuid=effect.uuid,
+                                         provider=provider.uuid))
+        else:
+            pool: str = POOLS[key]
+            setattr(self.state, pool, getattr(self.state, pool) + effect.value)
+        return
+
+    def _draw(self, n: int) -> None:
+        try:
+            self.hand += self.player._deck.draw(n)
+        except IndexError:
+            pass
+        return
+
+    def _discard_cards(self, n: int, required: bool) -> int:
+        chosen: CardList = self.policy.discard(list(self.hand), n, required)[:n]
+        for card in chosen:
+            self.hand.remove(card)
+            self.player._deck.discard(card)
+        return len(chosen)
+
+    def _discard(self, n: int) -> None:
+        """Discards up to ``n`` cards from hand, then draws as many
+        """
+        discarded: int = self._discard_cards(n, required=False)
+        if discarded:
+            self._draw(discarded)
+        return
+
+    def _scrap(self, n: int) -> None:
+        candidates: CardList = [c for c in self.in_play
+                                if not c.base and c not in self.scrapped]
+        self.scrapped += self.policy.scrap(candidates, n)[:n]
+        return
+
+    def _acquire(self, n: int) -> None:
+        for _ in range(n):
+            if self.traderow is None:
+                return
+            card: Optional[Card] = self.policy.acquire(self.traderow.cards)
+            if card is None:
+                return
+            self._take(card)
+        return
+
+    def _destroy(self, n: int) -> None:
+        for _ in range(n):
+            base: Optional[Card] = self.policy.destroy(list(self.opponent._bases))
+            if base is None:
+                return
+            self._knock_down(base)
+        return
+
+    def _force_discard(self, n: int) -> None:
+        self.opponent.state.discards_due += n
+        return
+
+    def _take(self, card: Card) -> bool:
+        """Moves a card from the trade row to the player's discard pile
+
+        Returns
+        -------
+        bool
+            Whether the card was still in the trade row
+        """
+        try:
+            card = self.traderow.acquire(card.uuid)
+        except UUIDNotFoundError:
+            return False
+        self.player._deck.discard(card)
+        self.acquired.append(card)
+        return True
+
+    def _knock_down(self, base: Card) -> None:
+        """Sends an opponent's base to their discard pile
+        """
+        self.opponent._bases.remove(base)
+        self.opponent._deck.discard(base)
+        self.destroyed.append(base)
+        return
+
+    def buy(self) -> None:
+        """Spends the trade pool on the trade row
+        """
+        self.phase = 3
+        if self.money is None:
+            self.money = self.state.owner_money
+        while self.traderow is not None:
+            card: Optional[Card] = self.policy.buy(self.traderow.available, self.money)
+            if card is None or price(card) > self.money or not self.buy_card(card):
+                break
+        return
+
+    def buy_card(self, card: Card) -> bool:
+        """Buys a card from the trade row with the trade left
+
+        Returns
+        -------
+        bool
+            Whether the card was bought; nothing is spent on a card that is no longer
+            in the trade row
+        """
+        if not self._take(card):
+            return False
+        self.money -= price(card)
+        return True
+
+    def attack(self) -> None:
+        """Spends the combat pool on the opponent's bases, then on their authority
+        """
+        self.phase = 4
+        self.damage = self._attack(self.state.opponent_attack)
+        self.opponent.state.health -= self.damage
+        return
+
+    def end(self) -> None:
+        """Applies the authority pool, then clears the cards in play
+        """
+        self.phase = 5
+        self.state.health += self.state.owner_heal
+        for card in self.in_play:
+            if card in self.scrapped:
+                continue
+            if not card.base:
+                self.player._deck.discard(card)
+            elif card not in self.player._bases:
+                self.player._bases.append(card)
+        self.player._bases = [b for b in self.player._bases if b not in self.scrapped]
+        return
+
+    def _attack(self, damage: int) -> int:
+        """Spends combat on the opponent's bases, outposts first
+
+        Returns
+        -------
+        int
+            The combat left for the opponent's authority
+        """
+        while damage > 0 and self.opponent._bases:
+            bases: CardList = self.opponent._bases
+            base: Optional[Card] = self.policy.attack(list(bases), damage)
+            outposts: bool = any(b.outpost for b in bases)
+            if base is None:
+                return 0 if outposts else damage
+            if base.defense > damage or (outposts and not base.outpost):
+                return 0
+            damage -= base.defense
+            self._knock_down(base)
+        return damage
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: zobrist
+    :synopsis: Incremental Zobrist hashes of game states, and a transposition table
+.. moduleauthor:: Zach Mitchell <zmitchell@fastmail.com>
+
+Every pile of every deck is hashed as a multiset of card templates: the ``k``-th copy
+of a template in a pile has its own 64-bit key, derived from the zone, the pile, the
+template and ``k``, and the hash of a game is the exclusive or of the keys of every
+card in every pile. Moving a card from one pile to another is then two XORs,
+whatever the size of the piles, and two states holding the same cards in the same
+piles hash alike however they were reached, e.g. by buying the same cards in a
+different order. The order of the cards in a pile is not hashed: bots cannot see it.
+
+A ``ZobristHash`` follows the decks of a game through the events they already
+report to an ``EventLog`` (see ``EventKind``), and passes the events on to the
+game's log, if any. Cards that are not in a deck (in hand, in play, bases) and the
+numbers of a turn are hashed on demand by ``ZobristHash.position``, since there are
+only a few of them.
+
+Keys are derived from a seed with BLAKE2, so every process using the same seed
+uses the same keys.
+"""
+
+from enum import Enum
+from hashlib import blake2b
+from typing import Dict, List, Optional, Tuple
+from .events import EventKind, EventLog
+
+PileKey = Tuple[str, str, int]
+"""A zone, a pile of the deck in that zone, and a template id"""
+
+_DRAW: int = EventKind.DRAW.value
+_DISCARD: int = EventKind.DISCARD.value
+_RESHUFFLE: int = EventKind.RESHUFFLE.value
+_POP: int = EventKind.POP.value
+_FILL: int = EventKind.FILL.value
+_EXPLORER: int = EventKind.EXPLORER.value
+
+
+class ZobristKeys(object):
+    """The random keys of a hash, derived on first use from a seed
+
+    Parameters
+    ----------
+    seed : int (Optional)
+        Selects the set of keys (Default is 0)
+    """
+    def __init__(self, seed: int = 0):
+        self.seed: int = seed
+        self._salt: bytes = seed.to_bytes(16, 'little', signed=True)
+        self._cards: Dict[PileKey, List[int]] = {}
+        self._other: Dict[tuple, int] = {}
+        return
+
+    def card(self, pile: PileKey, k: int) -> int:
+        """The key of the ``k``-th copy (from 0) of a template in a pile
+        """
+        keys: Optional[List[int]] = self._cards.get(pile)
+        if keys is None:
+            keys = self._cards[pile] = []
+        while len(keys) <= k:
+            keys.append(self._derive(pile + (len(keys),)))
+        return keys[k]
+
+    def key(self, *fields) -> int:
+        """The key of anything else, identified by a tuple of ints and strings
+        """
+        key: Optional[int] = self._other.get(fields)
+        if key is None:
+            key = self._other[fields] = self._derive(fields)
+        return key
+
+    def _derive(self, fields: tuple) -> int:
+        digest: bytes = blake2b(repr(fields).encode(), digest_size=8, salt=self._salt).digest()
+        return int.from_bytes(digest, 'little')
+
+
+class ZobristHash(object):
+    """The incremental hash of the decks of a game
+
+    Parameters
+    ----------
+    keys : ZobristKeys
+        The keys to hash with
+    game : Game
+        The game whose decks are hashed. The hash sits between the decks and the
+        game's log, so it must be created after the log is attached.
+
+    Attributes
+    ----------
+    value : int
+        The hash of every pile of every deck
+    """
+    def __init__(self, keys: ZobristKeys, game):
+        self.keys: ZobristKeys = keys
+        self.value: int = 0
+        self._counts: Dict[PileKey, int] = {}
+        self._log: Optional[EventLog] = game.log
+        self._zones: Dict[str, object] = {'main': game.maindeck, 'row': game.traderow}
+        self._zones.update((f"p{i}", p._deck) for i, p in enumerate(game.players))
+        self._players: Dict[int, int] = {id(p): i for i, p in enumerate(game.players)}
+        for zone, deck in self._zones.items():
+            deck._log = self
+            deck._zone = zone
+            for pile, cards in deck._piles().items():
+                for card in cards:
+                    self._add((zone, pile, card.template_id))
+        return
+
+    def full(self) -> int:
+        """Hashes every pile from scratch, which ``value`` always equals
+        """
+        value: int = 0
+        for zone, deck in self._zones.items():
+            for pile, cards in deck._piles().items():
+                seen: Dict[int, int] = {}
+                for card in cards:
+                    k: int = seen.get(card.template_id, 0)
+                    seen[card.template_id] = k + 1
+                    value ^= self.keys.card((zone, pile, card.template_id), k)
+        return value
+
+    def record(self, kind: EventKind, zone: str, *args) -> None:
+        """Updates the hash after a deck changed, then passes the event on to the log
+        """
+        k: int = kind.value
+        if k == _DRAW:
+            self._remove((zone, 'undrawn', args[0]))
+        elif k == _DISCARD:
+            self._add((zone, 'discards', args[0]))
+        elif k == _RESHUFFLE:
+            self._reshuffle(zone)
+        elif k == _POP:
+            self._remove((zone, 'cards', args[0]))
+        elif k == _FILL:
+            self._add((zone, 'cards', args[0]))
+        elif k == _EXPLORER:
+            self._add((zone, 'explorer', args[0]))
+        elif self._counts.get((zone, 'explorer', args[0])):
+            self._remove((zone, 'explorer', args[0]))
+        else:
+            self._remove((zone, 'cards', args[0]))
+        if self._log is not None:
+            self._log.record(kind, zone, *args)
+        return
+
+    def position(self, turn) -> int:
+        """The hash of the game in the middle of a turn
+
+        Besides the decks, this covers the player to move, the phase, the cards in
+        hand, in play and scrapped, the trade left, the pools of the player, and the
+        authority and bases of every player.
+        """
+        keys: ZobristKeys = self.keys
+        me: int = self._players[id(turn.player)]
+        value: int = self.value ^ keys.key('turn', me, turn.phase, turn.money)
+        value ^= self._cards(('hand', me), turn.hand)
+        value ^= self._cards(('play', me), turn.in_play)
+        value ^= self._cards(('scrapped', me), turn.scrapped)
+        for pool, amount in turn.state.totals().items():
+            value ^= keys.key('pool', pool[0].value, pool[1].value, amount)
+        for player in turn.game.players:
+            i: int = self._players[id(player)]
+            value ^= keys.key('health', i, player.state.health, player.state.discards_due)
+            value ^= self._cards(('bases', i), player._bases)
+        return value
+
+    def _cards(self, zone: Tuple[str, int], cards) -> int:
+        value: int = 0
+        seen: Dict[int, int] = {}
+        for card in cards:
+            k: int = seen.get(card.template_id, 0)
+            seen[card.template_id] = k + 1
+            value ^= self.keys.card(zone + (card.template_id,), k)
+        return value
+
+    def _add(self, pile: PileKey) -> None:
+        k: int = self._counts.get(pile, 0)
+        self._counts[pile] = k + 1
+        self.value ^= self.keys.card(pile, k)
+        return
+
+    def _remove(self, pile: PileKey) -> None:
+        k: int = self._counts[pile] - 1
+        self._counts[pile] = k
+        self.value ^= self.keys.card(pile, k)
+        return
+
+    def _reshuffle(self, zone: str) -> None:
+        """Moves the counts of the discards, which became the undrawn pile
+
+        This costs one XOR per card reshuffled, i.e. O(1) per card drawn.
+        """
+        for pile in [p for p in self._counts if p[0] == zone and p[1] == 'discards']:
+            template_id: int = pile[2]
+            for _ in range(self._counts[pile]):
+                self._remove(pile)
+                self._add((zone, 'undrawn', template_id))
+        return
+
+
+class Replacement(Enum):
+    """How a ``TranspositionTable`` chooses between an entry and a new one for a slot
+    """
+    ALWAYS = 'always'
+    """The new entry always replaces the old one"""
+    DEPTH = 'depth'
+    """The new entry replaces the old one unless the old one is deeper and from the
+    current generation"""
+    TWO_TIER = 'two-tier'
+    """Each slot holds a depth-preferred entry and an always-replaced one"""
+
+
+class TranspositionTable(object):
+    """A bounded map from position hashes to evaluations
+
+    Parameters
+    ----------
+    size : int (Optional)
+        The number of slots, rounded up to a power of two (Default is 65536)
+    replacement : Replacement (Optional)
+        The replacement policy (Default is ``DEPTH``)
+
+    Attributes
+    ----------
+    hits, misses, stores, replaced : int
+        The number of successful and failed lookups, of entries stored, and of stored
+        entries that overwrote a different position
+    """
+    def __init__(self, size: int = 1 << 16, replacement: Replacement = Replacement.DEPTH):
+        self.size: int = 1 << max(size - 1, 1).bit_length()
+        self.replacement: Replacement = replacement
+        self.generation: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.stores: int = 0
+        self.replaced: int = 0
+        tiers: int = 2 if replacement == Replacement.TWO_TIER else 1
+        self._mask: int = self.size - 1
+        self._keys: List[Optional[int]] = [None] * (self.size * tiers)
+        self._depths: List[int] = [0] * (self.size * tiers)
+        self._generations: List[int] = [0] * (self.size * tiers)
+        self._values: List[object] = [None] * (self.size * tiers)
+        return
+
+    def get(self, key: int) -> Optional[object]:
+        """The value stored for a position, or ``None``
+        """
+        slot: int = self._slot(key)
+        for i in (slot, slot + self.size) if self.replacement == Replacement.TWO_TIER else (slot,):
+            if self._keys[i] == key:
+                self.hits += 1
+                return self._values[i]
+        self.misses += 1
+        return None
+
+    def put(self, key: int, value: object, depth: int = 0) -> bool:
+        """Stores the value of a position, if the replacement policy allows it
+
+        Parameters
+        ----------
+        key : int
+            The hash of the position
+        value : object
+            The evaluation to store
+        depth : int (Optional)
+            How much work the evaluation took, e.g. the number of rollouts; deeper
+            entries are kept in preference (Default is 0)
+
+        Returns
+        -------
+        bool
+            Whether the value was stored
+        """
+        slot: int = self._slot(key)
+        if self.replacement == Replacement.TWO_TIER:
+            if self._keys[slot] != key and not self._prefer(slot, depth):
+                slot += self.size
+        elif self.replacement == Replacement.DEPTH:
+            if self._keys[slot] != key and not self._prefer(slot, depth):
+                return False
+        if self._keys[slot] is not None and self._keys[slot] != key:
+            self.replaced += 1
+        self._keys[slot] = key
+        self._depths[slot] = depth
+        self._generations[slot] = self.generation
+        self._values[slot] = value
+        self.stores += 1
+        return True
+
+    def new_generation(self) -> None:
+        """Marks every entry as stale, so that depth-preferred slots accept new entries
+        """
+        self.generation += 1
+        return
+
+    def clear(self) -> None:
+        n: int = len(self._keys)
+        self._keys = [None] * n
+        self._depths = [0] * n
+        self._generations = [0] * n
+        self._values = [None] * n
+        return
+
+    @property
+    def hit_rate(self) -> float:
+        lookups: int = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self) -> int:
+        return sum(k is not None for k in self._keys)
+
+    def _slot(self, key: int) -> int:
+        return (key ^ key >> 32) & self._mask
+
+    def _prefer(self, slot: int, depth: int) -> bool:
+        """Whether a new entry of the given depth may replace the depth-preferred entry
+        """
+        if self._keys[slot] is None or self._generations[slot] != self.generation:
+            return True
+        return depth >= self._depths[slot]
@@ -30,6 +30,7 @@ setup(
                  'realms'},
     include_package_data=True,
     install_requires=requirements,
+    python_requires='>=3.8',
     license="MIT license",
     zip_safe=False,
     keywords='realms',
@@ -39,7 +40,7 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Natural Language :: English',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6'
+        'Programming Language :: Python :: 3.8'
     ],
     test_suite='tests',
     tests_require=test_requirements,
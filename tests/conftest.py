@@ -1,8 +1,24 @@
+import os
 import pytest
 from realms.cardrepo import CardRepo
 
 
+@pytest.fixture(scope='session', autouse=True)
+def card_db(tmp_path_factory):
+    """Generates the card database in a temporary directory rather than the package;
+    worker processes started by the tests inherit the variable
+    """
+    path = str(tmp_path_factory.mktemp('cards') / 'realms-cards.sqlite')
+    previous = os.environ.get('REALMS_CARD_DB')
+    os.environ['REALMS_CARD_DB'] = path
+    yield path
+    if previous is None:
+        del os.environ['REALMS_CARD_DB']
+    else:
+        os.environ['REALMS_CARD_DB'] = previous
+
+
 @pytest.fixture(scope='session')
-def repo():
+def repo(card_db):
     repo = CardRepo()
     return repo
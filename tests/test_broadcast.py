@@ -0,0 +1,112 @@
+import asyncio
+import json
+from realms.broadcast import Broadcaster
+from realms.catalog import local_catalog
+from realms.server import GameServer, GameService
+
+
+def test_same_frame_for_every_subscriber():
+    broadcaster = Broadcaster()
+    subscriptions = [broadcaster.subscribe() for _ in range(3)]
+    frame = b'{"s":1}\n'
+    broadcaster.publish(frame)
+    frames = [asyncio.run(s.get()) for s in subscriptions]
+    assert all(f is frame for f in frames)
+
+
+def test_slow_subscriber_drops_to_latest():
+    broadcaster = Broadcaster(maxsize=4)
+    slow = broadcaster.subscribe()
+    for i in range(10):
+        broadcaster.publish(str(i).encode())
+    assert slow.pending() <= 4
+    assert slow.dropped + slow.pending() == 10
+
+    async def drain():
+        frames = []
+        while slow.pending():
+            frames.append(await slow.get())
+        return frames
+
+    assert asyncio.run(drain())[-1] == b'9'
+
+
+def test_close_ends_subscription():
+    broadcaster = Broadcaster()
+    subscription = broadcaster.subscribe()
+    broadcaster.publish(b'x')
+    broadcaster.close()
+    assert len(broadcaster) == 0
+    assert asyncio.run(subscription.get()) is None
+    broadcaster.publish(b'y')
+    assert subscription.pending() == 0
+
+
+def test_watch_receives_public_state(repo):
+    service = GameService(local_catalog())
+    game = service.handle({'op': 'new_game'})['game']
+    subscription = service.watch(game)
+    service.handle({'op': 'draw', 'game': game, 'player': 0})
+    service.handle({'op': 'state', 'game': game})
+
+    frames = [json.loads(f) for f in asyncio.run(_collect(subscription, 2))]
+    assert frames[1]['s'] == frames[0]['s'] + 1
+    assert frames[0]['players'][0]['hand'] == 0
+    assert frames[1]['players'][0]['hand'] == 5
+    assert frames[1]['players'][0]['health'] == 50
+    assert len(frames[1]['row']) == 6
+    assert subscription.pending() == 0
+
+    service.handle({'op': 'close_game', 'game': game})
+    assert subscription.closed
+
+
+def test_public_state_follows_the_game(repo):
+    service = GameService(local_catalog())
+    game = service.handle({'op': 'new_game'})['game']
+    session = service.games[game]
+    base = next(c for c in session.maindeck._cards if c.base)
+    session.game.players[0]._bases.append(base)
+    subscription = service.watch(game)
+    service.handle({'op': 'draw', 'game': game, 'player': 0, 'num': 10})
+    service.handle({'op': 'end_turn', 'game': game, 'player': 0})
+
+    frames = [json.loads(f) for f in asyncio.run(_collect(subscription, 3))]
+    assert [p['health'] for p in frames[0]['players']] == [50, 50]
+    assert frames[0]['players'][0]['bases'] == [[base.template_id, base.uuid]]
+    assert frames[2]['players'][1]['health'] == session.game.players[1].health < 50
+    assert frames[2]['players'][1]['bases'] == []
+
+
+def test_spectator_stream(repo):
+    async def session():
+        server = GameServer(GameService(local_catalog()))
+        await server.start(port=0)
+        player = await asyncio.open_connection('127.0.0.1', server.port)
+        spectator = await asyncio.open_connection('127.0.0.1', server.port)
+
+        async def call(connection, request):
+            connection[1].write(json.dumps(request).encode() + b'\n')
+            await connection[1].drain()
+            return json.loads(await connection[0].readline())
+
+        game = (await call(player, {'op': 'new_game'}))['game']
+        watched = await call(spectator, {'id': 1, 'op': 'watch', 'game': game})
+        initial = json.loads(await spectator[0].readline())
+        await call(player, {'op': 'draw', 'game': game, 'player': 0})
+        update = json.loads(await spectator[0].readline())
+        missing = await call(player, {'op': 'watch', 'game': 'nope'})
+        for _, writer in (player, spectator):
+            writer.close()
+        await server.close()
+        return watched, initial, update, missing
+
+    watched, initial, update, missing = asyncio.run(session())
+    assert watched == {'ok': True, 'id': 1}
+    assert update['s'] == initial['s'] + 1
+    assert update['players'][0]['hand'] == 5
+    assert not missing['ok']
+
+
+async def _collect(subscription, n):
+    return [await subscription.get() for _ in range(n)]
@@ -1,4 +1,10 @@
+from realms.cardrepo import CardRepo, JSONBackend, MemoryBackend, SQLiteBackend
 from realms.cards import CardFaction, CardTarget, CardAction
+from realms.exceptions import CardBackendError
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import multiprocessing
+import threading
 import pytest
 
 
@@ -127,3 +133,153 @@ def test_player_deck_cards_viper_count(player_deck_cards):
 def test_player_deck_cards_scout_count(player_deck_cards):
     scouts = [c for c in player_deck_cards if c.name == 'Scout']
     assert len(scouts) == 8
+
+
+def test_second_repo_shares_database(repo):
+    other = CardRepo()
+    assert other.db is repo.db
+    assert len(other.player_deck_cards()) == 10
+
+
+def test_repos_created_from_threads(repo):
+    results = []
+
+    def worker():
+        r = CardRepo()
+        results.append(len(r.main_deck_cards()))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [len(repo.main_deck_cards())] * 8
+
+
+def test_async_repo_methods(repo):
+    async_repo = CardRepo(max_workers=2)
+
+    async def deal():
+        return await asyncio.gather(async_repo.amain_deck_cards(),
+                                    *(async_repo.aplayer_deck_cards() for _ in range(4)),
+                                    async_repo.anew_explorer(),
+                                    async_repo.anamed_card('Cutter'))
+
+    main, *players, explorer, cutter = asyncio.run(deal())
+    async_repo.close()
+    assert len(main) == len(repo.main_deck_cards())
+    assert [len(p) for p in players] == [10] * 4
+    assert explorer.name == 'Explorer'
+    assert cutter.name == 'Cutter'
+
+
+def test_json_backend_matches_database(repo):
+    from realms.catalog import CardCatalog
+    json_repo = CardRepo(backend=JSONBackend())
+    assert json_repo.backend.catalog().templates == CardCatalog.from_db().templates
+    assert len(json_repo.main_deck_cards()) == len(repo.main_deck_cards())
+    assert json_repo.new_viper().name == 'Viper'
+    assert asyncio.run(json_repo.anamed_card('Cutter')).name == 'Cutter'
+    json_repo.close()
+
+
+def test_second_orm_backend_rejected(repo):
+    with pytest.raises(CardBackendError):
+        CardRepo(backend=MemoryBackend())
+    assert CardRepo(backend=SQLiteBackend(repo.backend.path)).backend == repo.backend
+
+
+def _memory_repo_deck_sizes(_):
+    from realms.cardrepo import db
+    repo = CardRepo(backend=MemoryBackend())
+    threaded = asyncio.run(repo.aplayer_deck_cards())
+    return db.provider_name, len(repo.main_deck_cards()), len(threaded)
+
+
+def test_memory_backend():
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(1, mp_context=context) as pool:
+        provider, main, player = pool.submit(_memory_repo_deck_sizes, None).result()
+    assert provider == 'sqlite'
+    assert main > 0
+    assert player == 10
+
+
+def _json_game(path):
+    import os
+    os.environ['REALMS_CARD_DB'] = path
+    from realms.cardrepo import db
+    from realms.catalog import catalog_of, local_catalog
+    from realms.decks import MainDeck, PlayerDeck, TradeRow
+    repo = CardRepo(backend=JSONBackend())
+    maindeck = MainDeck(repo)
+    row = TradeRow(maindeck, repo)
+    deck = PlayerDeck(repo.player_deck_cards(), catalog_of(repo))
+    return (len(row.available), len(deck.draw(5)), catalog_of(repo) is local_catalog(),
+            db.provider is None, os.path.exists(path))
+
+
+def test_json_backend_never_creates_database(tmp_path):
+    path = str(tmp_path / 'cards.sqlite')
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(1, mp_context=context) as pool:
+        assert pool.submit(_json_game, path).result() == (6, 5, True, True, False)
+    assert not (tmp_path / 'cards.sqlite').exists()
+
+
+def test_card_backends_must_bind():
+    from realms.cardrepo import CardBackend
+
+    class Unbound(CardBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Unbound()
+
+
+def test_sqlite_backend_path(tmp_path, monkeypatch):
+    monkeypatch.setenv('REALMS_CARD_DB', str(tmp_path / 'cards.sqlite'))
+    assert SQLiteBackend().path == str(tmp_path / 'cards.sqlite')
+    monkeypatch.chdir(tmp_path)
+    assert SQLiteBackend('x.sqlite').path == str(tmp_path / 'x.sqlite')
+
+
+def _sync_scenario(_):
+    import copy
+    from pony.orm import db_session
+    from realms.cardrepo import CardPrimitive, EffectPrimitive, _read_cards_json, sync_db
+    CardRepo(backend=MemoryBackend())
+    cards = _read_cards_json()
+    noop = sync_db(cards)
+    edited = copy.deepcopy(cards)
+    edited[4]['cost'] = 9
+    edited[4]['effects'][0]['value'] = 7
+    removed = edited.pop(5)['name']
+    edited.append(dict(copy.deepcopy(cards[3]), name='Blob Tester'))
+    with db_session:
+        card_id = CardPrimitive.get(name=cards[4]['name']).id
+    report = sync_db(edited)
+    with db_session:
+        changed = CardPrimitive.get(name=cards[4]['name'])
+        state = (changed.id == card_id, changed.cost,
+                 sorted(e.value for e in changed.effects),
+                 CardPrimitive.get(name=removed) is None,
+                 CardPrimitive.select().count(),
+                 EffectPrimitive.select().count() > 0)
+    return noop, report, removed, state, len(cards)
+
+
+def test_sync_db_changes_only_edited_cards():
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(1, mp_context=context) as pool:
+        noop, report, removed, state, total = pool.submit(_sync_scenario, None).result()
+    assert noop.unchanged == total and not (noop.inserted or noop.updated or noop.deleted)
+    assert report.inserted == ['Blob Tester']
+    assert len(report.updated) == 1
+    assert report.deleted == [removed]
+    assert report.unchanged == total - 2
+    same_id, cost, values, gone, count, has_effects = state
+    assert same_id and gone and has_effects
+    assert cost == 9
+    assert 7 in values
+    assert count == total
@@ -0,0 +1,105 @@
+import json
+import pickle
+from pytest import fixture, raises
+from realms.cardsets import CORE, SET_STRIDE, CardSetRegistry, card_sets
+from realms.catalog import local_catalog
+from realms.decks import MainDeck
+from realms.exceptions import CardSetNotFoundError, CatalogFormatError, TemplateNotFoundError
+from realms.server import GameService
+
+SET_CARDS = [
+    {"name": "Test Frigate", "faction": "Blob", "simplified": "false", "base": "false",
+     "outpost": "false", "defense": 0, "cost": 3, "count": 2,
+     "effects": [{"target": "owner", "action": "money", "value": 2, "condition": {}}],
+     "ally": [], "scrap": []},
+    {"name": "Test Station", "faction": "Federation", "simplified": "false", "base": "true",
+     "outpost": "true", "defense": 4, "cost": 4, "count": 1,
+     "effects": [{"target": "owner", "action": "heal", "value": 3, "condition": {}}],
+     "ally": [], "scrap": []},
+]
+
+
+def write_set(directory, name, number, version='1.0', cards=SET_CARDS):
+    path = directory / f"{number}-{name}.json"
+    path.write_text(json.dumps({'set': name, 'number': number, 'version': version,
+                                'cards': cards}))
+    return str(path)
+
+
+@fixture(scope='module')
+def expansion(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('sets')
+    write_set(directory, 'testset', 7)
+    if 'testset' not in card_sets().available:
+        card_sets().discover(str(directory))
+    return card_sets().get('testset')
+
+
+def test_sets_load_lazily(repo, tmp_path):
+    registry = CardSetRegistry()
+    registry.register('lazy', 3, write_set(tmp_path, 'lazy', 3))
+    assert registry.available == [CORE, 'lazy']
+    assert registry.loaded == []
+    lazy = registry.get('lazy')
+    assert registry.loaded == ['lazy']
+    assert registry.get('lazy') is lazy
+    assert lazy.version == '1.0'
+    assert [t.id for t in lazy.catalog.templates] == [3 * SET_STRIDE + 1, 3 * SET_STRIDE + 2]
+    assert registry.get(CORE).catalog is local_catalog()
+
+
+def test_registry_errors(tmp_path):
+    registry = CardSetRegistry()
+    registry.register('a', 1, write_set(tmp_path, 'b', 1))
+    with raises(ValueError):
+        registry.register('other', 1, 'x.json')
+    with raises(ValueError):
+        registry.register('core', 2, 'x.json')
+    with raises(ValueError):
+        registry.register('a', 2, 'x.json')
+    assert registry._names == {0: CORE, 1: 'a'}
+    with raises(CardSetNotFoundError):
+        registry.get('missing')
+    with raises(CatalogFormatError):
+        registry.get('a')
+
+
+def test_loaded_sets_keep_their_file(repo, tmp_path):
+    registry = CardSetRegistry()
+    path = write_set(tmp_path, 'kept', 4)
+    registry.register('kept', 4, path)
+    registry.register('kept', 4, str(tmp_path / 'moved.json'))
+    registry.register('kept', 4, path)
+    kept = registry.get('kept')
+    registry.register('kept', 4, path)
+    with raises(ValueError):
+        registry.register('kept', 4, str(tmp_path / 'moved.json'))
+    assert registry.get('kept') is kept
+
+
+def test_main_deck_from_sets(repo, expansion):
+    core = MainDeck(repo)
+    combined = MainDeck(repo, [CORE, 'testset'])
+    only = MainDeck(repo, ['testset'])
+    assert len(combined._cards) == len(core._cards) + 3
+    assert sorted(c.name for c in only._cards) == ['Test Frigate', 'Test Frigate', 'Test Station']
+    assert card_sets().get('testset') is expansion
+
+
+def test_expansion_cards_round_trip(repo, expansion):
+    deck = MainDeck(repo, ['testset'])
+    restored = pickle.loads(pickle.dumps(deck))
+    assert [c.uuid for c in restored._cards] == [c.uuid for c in deck._cards]
+    assert restored._cards[0].name in ('Test Frigate', 'Test Station')
+    card = deck._cards[0]
+    assert json.loads(local_catalog().card_json(card))['name'] == card.name
+    with raises(TemplateNotFoundError):
+        local_catalog().template(9 * SET_STRIDE + 1)
+
+
+def test_new_game_with_sets(repo, expansion):
+    service = GameService(local_catalog())
+    game = service.handle({'op': 'new_game', 'sets': ['testset']})['game']
+    row = service.handle({'op': 'trade_row', 'game': game})['cards']
+    assert {c['name'] for c in row} <= {'Test Frigate', 'Test Station', 'Explorer'}
+    assert not service.handle({'op': 'new_game', 'sets': ['missing']})['ok']
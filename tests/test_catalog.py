@@ -0,0 +1,78 @@
+import gc
+import json
+import pickle
+from pytest import fixture
+from realms.cardsets import CORE, card_sets
+from realms.catalog import install_catalog, live_versions, local_catalog, reload_catalog
+from realms.cardrepo import _read_cards_json
+from realms.decks import Hand
+from realms.effects import PlayerState
+from realms.game import Game
+from realms.server import GameService
+
+
+@fixture
+def restore_catalog(repo):
+    original = local_catalog()
+    yield original
+    install_catalog(original)
+
+
+@fixture
+def cheaper_cards(tmp_path):
+    cards = _read_cards_json()
+    for card in cards:
+        card['cost'] = max(0, int(card['cost']) - 1)
+    path = tmp_path / 'cards.json'
+    path.write_text(json.dumps(cards))
+    return str(path)
+
+
+def test_reload_swaps_catalog(restore_catalog, cheaper_cards):
+    original = restore_catalog
+    reloaded = reload_catalog(cheaper_cards)
+    assert local_catalog() is reloaded
+    assert reloaded.version > original.version
+    assert {original.version, reloaded.version} <= set(live_versions())
+    cutter = reloaded.named_template('Cutter')
+    assert cutter.cost == original.named_template('Cutter').cost - 1
+    assert card_sets().get(CORE).catalog is reloaded
+
+
+def test_games_keep_their_version(restore_catalog, cheaper_cards):
+    service = GameService()
+    old_game = service.handle({'op': 'new_game'})['game']
+    old_version = service.games[old_game].catalog.version
+    reload_catalog(cheaper_cards)
+    new_game = service.handle({'op': 'new_game'})['game']
+    assert service.games[new_game].catalog is local_catalog()
+    assert service.games[old_game].catalog.version == old_version
+    assert service.games[old_game].traderow._repo.version == old_version
+    assert old_version in service.handle({'op': 'stats'})['catalog_versions']
+
+
+def test_pickled_games_keep_their_version(restore_catalog, cheaper_cards):
+    game = Game(restore_catalog)
+    reload_catalog(cheaper_cards)
+    copy = pickle.loads(pickle.dumps(game))
+    assert copy.maindeck._catalog.version == restore_catalog.version
+    costs = {t.id: t.cost for t in restore_catalog.templates}
+    assert all(c.cost == costs[c.template_id] for c in copy.maindeck._cards)
+    deck = copy.players[0]._deck
+    hand = pickle.loads(pickle.dumps(Hand(5, [], deck)))
+    assert hand._catalog.version == restore_catalog.version
+    assert hand.resolve(PlayerState()).totals() == hand.effect_totals()
+
+
+def test_unused_versions_are_reclaimed(restore_catalog, cheaper_cards):
+    service = GameService()
+    reload_catalog(cheaper_cards)
+    game = service.handle({'op': 'new_game'})['game']
+    version = service.games[game].catalog.version
+    install_catalog(restore_catalog)
+    gc.collect()
+    assert version in live_versions()
+    service.handle({'op': 'close_game', 'game': game})
+    gc.collect()
+    assert version not in live_versions()
+    assert restore_catalog.version in live_versions()
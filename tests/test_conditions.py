@@ -0,0 +1,108 @@
+import pickle
+import sqlite3
+from pytest import mark, raises
+from realms.cardrepo import _add_missing_columns
+from realms.cards import CardAction, CardFaction, CardTarget
+from realms.catalog import CardCatalog
+from realms.conditions import (
+    COUNTERS,
+    FACTIONS,
+    compile_condition,
+    condition_from_codes,
+    evaluate_codes,
+    hand_counts,
+    parse_condition
+)
+from realms.decks import Hand, PlayerDeck
+from realms.exceptions import CatalogFormatError
+from realms.sharedcatalog import CatalogArrays
+
+CARDS = [
+    {"name": "Picket", "faction": "Blob", "simplified": "false", "base": "false",
+     "outpost": "false", "defense": 0, "cost": 2, "count": 3,
+     "effects": [{"target": "opponent", "action": "attack", "value": 2, "condition": {}},
+                 {"target": "owner", "action": "money", "value": 3,
+                  "condition": {"bases": 1}}],
+     "ally": [{"target": "opponent", "action": "attack", "value": 4,
+               "condition": {"not": {"faction": {"Federation": 1}}}}],
+     "scrap": []},
+    {"name": "Hive", "faction": "Blob", "simplified": "false", "base": "true",
+     "outpost": "false", "defense": 5, "cost": 5, "count": 1,
+     "effects": [{"target": "owner", "action": "draw", "value": 1,
+                  "condition": {"any": [{"ships": 3}, {"outposts": 1}]}}],
+     "ally": [], "scrap": []},
+]
+
+
+def counts(**kwargs):
+    result = [0] * (len(COUNTERS) + len(FACTIONS))
+    for name, n in kwargs.items():
+        result[COUNTERS.index(name)] = n
+    return result
+
+
+@mark.parametrize('condition, holds', [
+    ({}, True),
+    ({'bases': 2}, True),
+    ({'bases': 3}, False),
+    ({'bases': 1, 'ships': 4}, False),
+    ({'all': [{'bases': 1}, {'cards': 5}]}, True),
+    ({'any': [{'outposts': 1}, {'ships': 3}]}, True),
+    ({'not': {'outposts': 1}}, True),
+])
+def test_compiled_and_encoded_conditions_agree(condition, holds):
+    compiled = compile_condition(condition)
+    hand = counts(cards=5, ships=3, bases=2)
+    assert compiled(hand) is holds
+    assert evaluate_codes(compiled.codes, hand) is holds
+    assert parse_condition(compiled.source) is compiled
+    assert condition_from_codes(compiled.codes) is compiled
+    assert pickle.loads(pickle.dumps(compiled)) is compiled
+
+
+@mark.parametrize('condition', [
+    [], {'bases': -1}, {'bases': True}, {'colour': 1}, {'faction': {'Pirates': 1}},
+    {'any': {'bases': 1}}, {'not': 3},
+])
+def test_invalid_conditions_are_rejected(condition):
+    with raises(CatalogFormatError):
+        compile_condition(condition)
+
+
+def test_hand_applies_effects_whose_condition_holds(repo):
+    catalog = CardCatalog.from_json(CARDS)
+    picket, hive = catalog.named_template('Picket'), catalog.named_template('Hive')
+    deck = PlayerDeck(repo.player_deck_cards())
+    deck._undrawn = [catalog.new_card(picket.id) for _ in range(4)]
+    assert hand_counts(deck._undrawn)[len(COUNTERS) + FACTIONS.index(CardFaction.BLOB)] == 4
+
+    hand = Hand(2, [], deck)
+    totals = hand.effect_totals()
+    assert totals == {(CardTarget.OPPONENT, CardAction.ATTACK): 12}
+
+    hand = Hand(2, [catalog.new_card(hive.id)], deck)
+    totals = hand.effect_totals()
+    assert totals[(CardTarget.OWNER, CardAction.MONEY)] == 6
+    assert (CardTarget.OWNER, CardAction.DRAW) not in totals
+
+
+def test_conditions_survive_the_array_encoding():
+    catalog = CardCatalog.from_json(CARDS)
+    arrays = CatalogArrays(CatalogArrays.encode(catalog))
+    assert arrays.catalog().templates == catalog.templates
+    money = catalog.named_template('Picket').effects_basic[1]
+    assert tuple(arrays.condition_codes_of(1)) == money.condition.codes
+
+
+def test_missing_condition_column_is_added(tmp_path):
+    path = str(tmp_path / 'old.sqlite')
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE EffectPrimitive (id INTEGER PRIMARY KEY, value INTEGER)')
+    connection.execute('CREATE TABLE CardDigest (name TEXT PRIMARY KEY, digest TEXT)')
+    connection.execute('INSERT INTO EffectPrimitive VALUES (1, 2)')
+    connection.commit()
+    _add_missing_columns(path)
+    assert connection.execute('SELECT condition FROM EffectPrimitive').fetchall() == [('{}',)]
+    tables = connection.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
+    assert ('CardDigest',) not in tables
+    connection.close()
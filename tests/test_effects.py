@@ -0,0 +1,63 @@
+import random
+from pytest import raises
+from realms.cards import CardAction, CardTarget
+from realms.catalog import CardCatalog, local_catalog
+from realms.conditions import hand_counts
+from realms.decks import Hand, PlayerDeck
+from realms.effects import ALLY, BASIC, SCRAP, PlayerState, compile_effects, is_deferred
+from tests.test_conditions import CARDS
+
+
+def test_unconditional_effects_are_folded():
+    catalog = CardCatalog.from_json(CARDS)
+    compiled = compile_effects(catalog.named_template('Picket'))
+    assert 'state.opponent_attack += 2' in compiled.source
+    assert 'if c0(counts):' in compiled.source
+    state = PlayerState()
+    compiled.play(state, hand_counts([]), True)
+    assert state.totals() == {(CardTarget.OPPONENT, CardAction.ATTACK): 6}
+
+
+def test_state_has_no_dict():
+    state = PlayerState()
+    with raises(AttributeError):
+        state.mana = 1
+    state.owner_money = 3
+    state.reset()
+    assert state.totals() == {} and state.health == 50
+
+
+def test_resolve_matches_effect_totals(repo):
+    rng = random.Random(7)
+    cards = repo.main_deck_cards()
+    deck = PlayerDeck(repo.player_deck_cards())
+    for _ in range(200):
+        deck._undrawn = rng.sample(cards, 5)
+        hand = Hand(5, [], deck)
+        assert hand.resolve(PlayerState()).totals() == hand.effect_totals()
+
+
+def test_scrap_effects(repo):
+    catalog = local_catalog()
+    explorer = catalog.named_template('Explorer')
+    state = PlayerState()
+    catalog.compiled_effects(explorer.id).scrap(state, hand_counts([]))
+    assert state.totals() == {(e.target, e.action): e.value for e in explorer.effects_scrap}
+    assert catalog.compiled_effects(explorer.id) is catalog.compiled_effects(explorer.id)
+
+
+def test_pools_skip_queued_and_conditional_effects(repo):
+    catalog = local_catalog()
+    for template in catalog.templates:
+        compiled = catalog.compiled_effects(template.id)
+        slots = (template.effects_basic, template.effects_ally, template.effects_scrap)
+        for slot, effects in zip((BASIC, ALLY, SCRAP), slots):
+            state = PlayerState()
+            compiled.pools[slot](state)
+            expected = {}
+            for e in effects:
+                if not is_deferred(e):
+                    key = (e.target, e.action)
+                    expected[key] = expected.get(key, 0) + e.value
+            assert state.totals() == {k: v for k, v in expected.items() if v}
+            assert compiled.deferred[slot] == any(map(is_deferred, effects))
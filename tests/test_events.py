@@ -0,0 +1,201 @@
+import io
+import random
+from pytest import fixture, raises
+from realms.decks import MainDeck, PlayerDeck, TradeRow, Hand
+from realms.events import ArchiveReader, ArchiveWriter, EventKind, EventLog, read_log
+from realms.exceptions import ReplayMismatch
+from realms.replay import ReplayEngine, verify_archive, verify_game
+
+
+def _digest(zones):
+    return {name: {pile: [c.uuid for c in cards] for pile, cards in zone._piles().items()}
+            for name, zone in zones.items()}
+
+
+def _play(zones, turns, rng):
+    """Plays a crude game: draw a hand, acquire a card, discard everything"""
+    row = zones['row']
+    decks = [zones['p0'], zones['p1']]
+    for turn in range(turns):
+        deck = decks[turn % 2]
+        hand = Hand(5, [], deck)
+        available = row.available
+        bought = row.acquire(rng.choice(available).uuid)
+        if rng.random() < 0.2:
+            row.scrap(rng.choice(row.available).uuid)
+        for card in hand.cards + [bought]:
+            deck.discard(card)
+
+
+@fixture
+def zones(repo):
+    maindeck = MainDeck(repo)
+    return {'main': maindeck,
+            'row': TradeRow(maindeck, repo),
+            'p0': PlayerDeck(repo.player_deck_cards()),
+            'p1': PlayerDeck(repo.player_deck_cards())}
+
+
+def test_events_are_recorded(zones):
+    log = EventLog()
+    log.attach(**zones)
+    zones['p0'].draw(5)
+    kinds = [e[0] for e in log.events]
+    assert kinds == [EventKind.DRAW.value] * 5
+    assert all(e[1] == 'p0' for e in log.events)
+
+
+def test_reshuffle_records_seed(zones):
+    log = EventLog()
+    log.attach(**zones)
+    deck = zones['p0']
+    for card in deck.draw(10):
+        deck.discard(card)
+    deck.draw(1)
+    reshuffles = [e for e in log.events if e[0] == EventKind.RESHUFFLE.value]
+    assert len(reshuffles) == 1
+    assert isinstance(reshuffles[0][2], int)
+
+
+def test_snapshots_taken_after_each_event(zones):
+    log = EventLog(snapshot_every=1)
+    log.attach(**zones)
+    _play(zones, 6, random.Random(11))
+    engine = ReplayEngine.from_log(log)
+    for snap in log.snapshots:
+        expected = {name: {pile: packed[1] for pile, packed in piles.items()}
+                    for name, (kind, piles) in snap['zones'].items()}
+        assert engine.restore(snap).digest() == expected
+        assert ReplayEngine(log.events, log.snapshots[:1]).replay(snap['seq']).digest() == expected
+
+
+def test_replay_matches_live_state(zones):
+    log = EventLog(snapshot_every=50)
+    log.attach(**zones)
+    _play(zones, 40, random.Random(3))
+    state = ReplayEngine.from_log(log).replay()
+    assert state.seq == log.seq
+    assert state.digest() == _digest(zones)
+    assert len(log.snapshots) > 1
+
+
+def test_replay_to_intermediate_point(zones):
+    log = EventLog(snapshot_every=16)
+    log.attach(**zones)
+    _play(zones, 10, random.Random(5))
+    midpoint = log.seq // 2
+    engine = ReplayEngine.from_log(log)
+    from_start = ReplayEngine(log.events, log.snapshots[:1]).replay(midpoint)
+    from_snapshot = engine.replay(midpoint)
+    assert from_snapshot.digest() == from_start.digest()
+    assert set(from_snapshot.limbo) == set(from_start.limbo)
+
+
+def test_replay_from_stream(zones):
+    stream = io.StringIO()
+    log = EventLog(stream, snapshot_every=32)
+    log.attach(**zones)
+    _play(zones, 20, random.Random(7))
+    log.flush()
+    lines = stream.getvalue().splitlines()
+    lines.append('[0,"p0",')  # truncated by a crash
+    events, snapshots = read_log(lines)
+    assert len(events) == log.seq
+    state = ReplayEngine.from_lines(lines).replay()
+    assert state.digest() == _digest(zones)
+
+
+def test_replay_detects_mismatch(zones):
+    log = EventLog()
+    log.attach(**zones)
+    zones['p0'].draw(1)
+    kind, zone, template_id, uuid = log.events[0]
+    log.events[0] = (kind, zone, template_id, 'not-a-uuid')
+    with raises(ReplayMismatch):
+        ReplayEngine.from_log(log).replay()
+
+
+def test_replay_detects_unrecorded_reshuffle(zones):
+    log = EventLog()
+    log.attach(**zones)
+    deck = zones['p0']
+    for card in deck.draw(10):
+        deck.discard(card)
+    deck.draw(1)
+    log.events = [e for e in log.events if e[0] != EventKind.RESHUFFLE.value]
+    with raises(ReplayMismatch):
+        ReplayEngine.from_log(log).replay()
+
+
+@fixture
+def archive(tmpdir, repo):
+    path = str(tmpdir.join('games.jsonl.gz'))
+    with ArchiveWriter(path) as writer:
+        for n in range(4):
+            maindeck = MainDeck(repo)
+            zones = {'main': maindeck,
+                     'row': TradeRow(maindeck, repo),
+                     'p0': PlayerDeck(repo.player_deck_cards()),
+                     'p1': PlayerDeck(repo.player_deck_cards())}
+            log = EventLog(snapshot_every=32)
+            log.attach(**zones)
+            _play(zones, 10 + n, random.Random(n))
+            writer.write_game(f'game-{n}', log)
+    return path
+
+
+def test_archive_reader_streams_events(archive):
+    reader = ArchiveReader(archive)
+    game_ids = [g for g, _ in reader.games()]
+    assert game_ids == ['game-0', 'game-1', 'game-2', 'game-3']
+    events = reader.events()
+    game_id, event = next(events)
+    assert game_id == 'game-0'
+    assert isinstance(event, tuple)
+
+
+def test_verify_archive_in_process(archive):
+    report = verify_archive(archive, workers=0)
+    assert len(report.results) == 4
+    assert report.mismatches == []
+    assert report.events == sum(1 for _ in ArchiveReader(archive).events())
+
+
+def test_verify_archive_process_pool(archive):
+    report = verify_archive(archive, workers=2, max_pending=1)
+    assert sorted(r.game_id for r in report.results) == [f'game-{n}' for n in range(4)]
+    assert report.mismatches == []
+    assert report.latency(99) >= report.latency(50) > 0
+
+
+def test_verify_game_reports_mismatch(archive):
+    game_id, lines = next(ArchiveReader(archive).games())
+    lines = [line.replace('"p0"', '"p1"') if line.startswith('[0,') else line
+             for line in lines]
+    result = verify_game(game_id, lines)
+    assert result.mismatch is not None
+
+
+def test_verify_game_reports_malformed_events(archive):
+    game_id, lines = next(ArchiveReader(archive).games())
+    first = next(i for i, line in enumerate(lines) if line.startswith('[0,'))
+    lines[first] = '[0,"p0"]'
+    result = verify_game(game_id, lines)
+    assert result.mismatch.startswith('TypeError')
+
+
+def test_verify_trimmed_log(tmpdir, repo):
+    from realms.catalog import local_catalog
+    from realms.game import Game
+    log = EventLog(snapshot_every=16)
+    game = Game(local_catalog(), log=log)
+    game.run(max_turns=15)
+    log.trim()
+    game.run(max_turns=30)
+    assert log.first > 0 and len(log.snapshots) > 1
+    path = str(tmpdir.join('trimmed.jsonl.gz'))
+    with ArchiveWriter(path) as writer:
+        writer.write_game('trimmed', log)
+    report = verify_archive(path, workers=0)
+    assert report.mismatches == []
+    assert report.events == log.seq - log.first
@@ -0,0 +1,72 @@
+from pytest import fixture, raises
+from realms.catalog import local_catalog
+from realms.events import EventLog
+from realms.exceptions import GameOver
+from realms.game import Game, PhaseTimings
+from realms.turns import PHASES
+
+
+@fixture
+def catalog(repo):
+    return local_catalog()
+
+
+def test_two_player_game_has_a_winner(catalog):
+    game = Game(catalog, ['alice', 'bob'])
+    winner = game.run(max_turns=2000)
+    assert game.over and winner is not None
+    assert game.alive == [winner]
+    assert all(not p.alive for p in game.players if p is not winner)
+    with raises(GameOver):
+        game.step()
+
+
+def test_turn_order_and_opponents(catalog):
+    game = Game(catalog, ['a', 'b', 'c'])
+    steps = [game.step() for _ in range(6)]
+    assert [s.player.name for s in steps] == ['a', 'b', 'c', 'a', 'b', 'c']
+    assert [s.opponent.name for s in steps[:3]] == ['b', 'c', 'a']
+    assert [s.turn for s in steps] == list(range(6))
+    assert game.maindeck._cards is game.traderow._maindeck._cards
+
+
+def test_eliminated_players_leave_the_turn_order(catalog):
+    game = Game(catalog, ['a', 'b', 'c', 'd'])
+    a, b, c, d = game.players
+    c.state.health = 0
+    step = game.step()
+    assert step.eliminated == [c]
+    assert game.alive == [a, b, d]
+    assert game.current is b and game.opponent_of(b) is d
+    b.state.health = 0
+    assert game.step().player is b
+    assert game.current is d and game.opponent_of(d) is a
+
+
+def test_needs_two_players(catalog):
+    with raises(ValueError):
+        Game(catalog, ['solo'])
+
+
+def test_phase_hooks(catalog):
+    game = Game(catalog)
+    calls = []
+    timings = PhaseTimings()
+    game.add_hook(lambda phase, seconds: calls.append(phase))
+    game.add_hook(timings)
+    game.step()
+    game.step()
+    assert calls == list(PHASES) * 2
+    assert all(n == 2 for n in timings.count.values())
+    assert timings.total > 0
+    assert abs(sum(v['share'] for v in timings.as_dict().values()) - 1) < 0.01
+    game.remove_hook(timings)
+    game.step()
+    assert timings.count['draw'] == 2 and len(calls) == 3 * len(PHASES)
+
+
+def test_logged_game(catalog):
+    log = EventLog()
+    game = Game(catalog, ['a', 'b'], log=log)
+    game.step()
+    assert log.seq > 0
@@ -0,0 +1,86 @@
+import random
+from array import array
+from itertools import combinations
+from pytest import fixture
+from realms.cards import CardAction, CardTarget
+from realms.catalog import CardCatalog, local_catalog
+from realms.decks import Hand
+from realms.handbatch import hand_table
+
+
+def card(name, faction, effects=(), ally=(), base=False, outpost=False):
+    return {"name": name, "faction": faction, "simplified": "false",
+            "base": str(base).lower(), "outpost": str(outpost).lower(), "defense": 3,
+            "cost": 2, "count": 1, "effects": list(effects), "ally": list(ally), "scrap": []}
+
+
+def effect(target, action, value, condition=None):
+    return {"target": target, "action": action, "value": value, "condition": condition or {}}
+
+
+CARDS = [
+    card("Raider", "Blob", [effect("opponent", "attack", 3)],
+         [effect("opponent", "attack", 2), effect("owner", "draw", 1, {"ships": 3})]),
+    card("Hive", "Blob", [effect("owner", "draw", 1, {"any": [{"ships": 3}, {"outposts": 1}]})],
+         base=True),
+    card("Cutter", "Federation", [effect("owner", "money", 2), effect("owner", "heal", 4)],
+         [effect("opponent", "attack", 4, {"not": {"faction": {"Blob": 1}}})]),
+    card("Bastion", "All", [effect("owner", "heal", 2)], [effect("owner", "money", 9)],
+         base=True, outpost=True),
+    card("Drifter", "Unaligned", [effect("owner", "money", 1)], [effect("owner", "money", 5)]),
+    card("Seer", "Star Empire", [], [effect("opponent", "discard", 1)]),
+]
+
+
+@fixture
+def catalog(repo):
+    return local_catalog()
+
+
+def scalar(catalog, hands):
+    hand = Hand.__new__(Hand)
+    cards = {t.id: catalog.new_card(t.id) for t in catalog.templates}
+    results = []
+    for ids in hands:
+        hand.cards = [cards[t] for t in ids]
+        results.append(hand.effect_totals())
+    return results
+
+
+def test_batch_matches_the_scalar_path(catalog):
+    rng = random.Random(0)
+    ids = [t.id for t in catalog.templates]
+    hands = [[rng.choice(ids) for _ in range(rng.randint(0, 8))] for _ in range(500)]
+    totals = Hand.batch_totals(hands)
+    assert len(totals) == len(hands)
+    assert [totals[i] for i in range(len(hands))] == scalar(catalog, hands)
+
+
+def test_conditions_and_every_faction_match_the_scalar_path(repo):
+    catalog = CardCatalog.from_json(CARDS)
+    ids = [t.id for t in catalog.templates]
+    hands = [list(h) for k in range(7) for h in combinations(ids * 2, k)]
+    totals = Hand.batch_totals(hands, catalog=catalog)
+    assert [totals[i] for i in range(len(hands))] == scalar(catalog, hands)
+    bastion = catalog.named_template('Bastion').id
+    raider = catalog.named_template('Raider').id
+    assert totals.totals(hands.index([raider, bastion])) == {
+        (CardTarget.OPPONENT, CardAction.ATTACK): 5, (CardTarget.OWNER, CardAction.HEAL): 2}
+
+
+def test_flat_arrays_and_columns(catalog):
+    scout, viper = catalog.new_scout().template_id, catalog.new_viper().template_id
+    flat = array('H', [scout, scout, viper, viper, viper, scout])
+    totals = Hand.batch_totals(flat, width=3)
+    assert len(totals) == 2
+    assert list(totals.column(CardTarget.OWNER, CardAction.MONEY)) == [2, 1]
+    assert list(totals.column(CardTarget.OPPONENT, CardAction.ATTACK)) == [1, 2]
+    assert Hand.batch_totals([[]])[0] == {}
+
+
+def test_lanes_widen_for_long_hands(catalog):
+    viper = catalog.new_viper().template_id
+    totals = Hand.batch_totals([[viper] * 5, [viper] * 300])
+    assert totals.data.itemsize > 1
+    assert [totals[0], totals[1]] == scalar(catalog, [[viper] * 5, [viper] * 300])
+    assert hand_table(catalog) is hand_table(catalog)
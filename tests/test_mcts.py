@@ -0,0 +1,111 @@
+import pickle
+from pytest import fixture
+from realms.cards import CardAction, CardTarget
+from realms.catalog import local_catalog
+from realms.game import Game
+from realms.mcts import MCTSPolicy, _distinct, _order_matters, search
+from realms.player import Player
+from realms.turns import TurnPolicy, price
+
+
+@fixture
+def catalog(repo):
+    return local_catalog()
+
+
+def piles(game):
+    players = [(p.health, len(p._deck._undrawn), len(p._deck._discards), len(p._bases))
+               for p in game.players]
+    return [len(game.maindeck._cards), [c.uuid for c in game.traderow.cards]] + players
+
+
+class Probe(TurnPolicy):
+    """Searches the first buy decision it meets, checking that the game is left intact"""
+    results = None
+
+    def start(self, turn):
+        self.turn = turn
+
+    def buy(self, cards, money):
+        affordable = [c for c in cards if price(c) <= money]
+        if self.results is None and affordable:
+            game = self.turn.game
+            before = piles(game)
+            actions = [None] + [c.uuid for c in affordable]
+            args = ('buy', actions, 24, None, 'seed', 4, 1.4, 0)
+            self.results = [search(game, self.turn, *args), search(game, self.turn, *args)]
+            fork = game.fork([TurnPolicy(), TurnPolicy()])
+            game_copy, turn_copy = pickle.loads(pickle.dumps((fork, self.turn.fork(fork))))
+            self.results.append(search(game_copy, turn_copy, *args))
+            assert piles(game) == before
+        return super().buy(cards, money)
+
+
+def test_search_is_reproducible_and_leaves_the_game_alone(catalog):
+    probe = Probe()
+    game = Game(catalog, policies=[probe, None])
+    while probe.results is None:
+        game.step()
+    first, second, unpickled = probe.results
+    assert first == second == unpickled
+    assert sum(visits for visits, _ in first) == 24
+    assert all(0 <= total <= visits for visits, total in first)
+
+
+def test_forks_are_independent(catalog):
+    game = Game(catalog, ['a', 'b', 'c'])
+    game.step()
+    before = piles(game)
+    fork = game.fork()
+    fork.run(max_turns=30)
+    assert piles(game) == before
+    assert game.turn == 1 and fork.turn == 30
+    assert [p.name for p in fork.players] == ['a', 'b', 'c']
+    assert fork.players[0].policy is game.players[0].policy
+
+
+def test_bot_plays_full_games(catalog):
+    bot = MCTSPolicy(rollouts=8, horizon=2, seed=3)
+    game = Game(catalog, policies=[bot, None])
+    assert game.run(max_turns=400) is not None
+    assert bot.stats.decisions > 0
+    assert bot.stats.rollouts == 8 * bot.stats.decisions
+    assert bot.stats.rollouts_per_second > 0
+
+
+def test_time_budget(catalog):
+    bot = MCTSPolicy(seconds=0.02, horizon=2)
+    game = Game(catalog, policies=[bot, None])
+    while not bot.stats.decisions:
+        game.step()
+    assert bot.stats.seconds < 0.02 * bot.stats.decisions + 0.05
+
+
+def test_parallel_rollouts(catalog):
+    bot = MCTSPolicy(rollouts=6, horizon=2, workers=2, seed=5)
+    try:
+        game = Game(catalog, policies=[bot, None])
+        while bot.stats.decisions < 2:
+            game.step()
+    finally:
+        bot.close()
+    assert bot.stats.rollouts == 6 * bot.stats.decisions
+
+
+def test_outside_of_a_game_plays_like_the_default(repo):
+    alice, bob = Player.table(['alice', 'bob'], repo, [MCTSPolicy(), None])
+    assert alice.take_turn(bob).played == 5
+    assert alice.policy.stats.decisions == 0
+
+
+def test_candidates(catalog):
+    cards = catalog.player_deck_cards()
+    assert [c.name for c in _distinct(cards)] in (['Scout', 'Viper'], ['Viper', 'Scout'])
+    assert not _order_matters(cards)
+    discarders = [t for t in catalog.templates
+                  if any((e.target, e.action) == (CardTarget.OWNER, CardAction.DISCARD)
+                         for e in t.effects_basic)]
+    assert discarders
+    card = catalog.new_card(discarders[0].id, 'x')
+    assert _order_matters(cards + [card])
+
@@ -0,0 +1,92 @@
+import sqlite3
+from realms.catalog import local_catalog
+from realms.persistence import GameStore
+from realms.replay import ReplayEngine
+from realms.server import GameService
+
+
+def play(service, game, turns=6):
+    for turn in range(turns):
+        player = turn % 2
+        service.handle({'op': 'draw', 'game': game, 'player': player})
+        row = service.handle({'op': 'trade_row', 'game': game})['cards']
+        service.handle({'op': 'acquire', 'game': game, 'player': player,
+                        'uuid': row[0]['uuid']})
+        service.handle({'op': 'end_turn', 'game': game, 'player': player})
+
+
+def test_store_round_trip(repo, tmp_path):
+    path = str(tmp_path / 'games.sqlite')
+    service = GameService(local_catalog(), GameStore(path, interval=60))
+    game = service.handle({'op': 'new_game'})['game']
+    play(service, game)
+    live = service.games[game]
+    expected = {'p0': {'undrawn': [c.uuid for c in live.decks[0]._undrawn],
+                       'discards': [c.uuid for c in live.decks[0]._discards]},
+                'main': {'cards': [c.uuid for c in live.maindeck._cards]}}
+    assert service.store.games() == []
+    service.close()
+
+    store = GameStore(path)
+    events, snapshots = store.load(game)
+    assert len(events) == live.log.seq
+    state = ReplayEngine(events, snapshots).replay()
+    digest = state.digest()
+    assert {k: digest[k] for k in expected} == expected
+    assert store.games(finished=False) == [game]
+    store.close()
+
+
+def test_staged_records_leave_the_log(repo, tmp_path):
+    service = GameService(local_catalog(), GameStore(str(tmp_path / 'games.sqlite'),
+                                                     interval=60))
+    game = service.handle({'op': 'new_game'})['game']
+    log = service.games[game].log
+    log.snapshot_every = 16
+    play(service, game, turns=10)
+    assert service.store.flush()
+    assert len(log.snapshots) == 1 and log.first_snapshot > 1
+    assert log.first == log.snapshots[0]['seq'] > 0
+    assert len(log.events) == log.seq - log.first < 16
+    live = ReplayEngine.from_log(log).replay().digest()
+    events, snapshots = service.store.load(game)
+    assert len(events) == log.seq and len(snapshots) == log.first_snapshot + 1
+    assert ReplayEngine(events, snapshots).replay().digest() == live
+    service.close()
+
+
+def test_store_flushes_in_background(tmp_path):
+    from realms.events import EventLog, EventKind
+    path = str(tmp_path / 'games.sqlite')
+    store = GameStore(path, interval=0.01)
+    log = EventLog()
+    log.record(EventKind.RESHUFFLE, 'p0', 1)
+    store.stage('a', log)
+    store._wake.set()
+    for _ in range(500):
+        if store.flushes:
+            break
+        store._thread.join(0.01)
+    assert store.flushes
+    log.record(EventKind.RESHUFFLE, 'p0', 2)
+    store.stage('a', log, finished=True)
+    store.close()
+
+    with GameStore(path) as reopened:
+        events, snapshots = reopened.load('a')
+        assert events == [(2, 'p0', 1), (2, 'p0', 2)]
+        assert snapshots[-1]['seq'] == 2
+        assert reopened.games(finished=True) == ['a']
+    mode = sqlite3.connect(path).execute('PRAGMA journal_mode').fetchone()[0]
+    assert mode == 'wal'
+
+
+def test_game_ids_continue_after_restart(repo, tmp_path):
+    path = str(tmp_path / 'games.sqlite')
+    service = GameService(local_catalog(), GameStore(path))
+    first = service.handle({'op': 'new_game'})['game']
+    service.handle({'op': 'close_game', 'game': first})
+    service.close()
+    service = GameService(local_catalog(), GameStore(path))
+    assert service.handle({'op': 'new_game'})['game'] != first
+    service.close()
@@ -0,0 +1,100 @@
+import pickle
+from pytest import fixture
+from realms.catalog import local_catalog, CardCatalog
+from realms.decks import (
+    MainDeck,
+    PlayerDeck,
+    TradeRow,
+    Hand
+)
+from realms.player import Player
+
+
+def _summary(card):
+    return (card.template_id, card.uuid, card.name, card.faction, card.cost,
+            sorted((e.target.value, e.action.value, e.value) for e in card.effects_basic),
+            sorted((e.target.value, e.action.value, e.value) for e in card.effects_ally),
+            sorted((e.target.value, e.action.value, e.value) for e in card.effects_scrap))
+
+
+@fixture
+def maindeck(repo):
+    return MainDeck(repo)
+
+
+@fixture
+def playerdeck(repo):
+    return PlayerDeck(repo.player_deck_cards())
+
+
+def test_local_catalog_matches_repo(repo):
+    catalog = local_catalog()
+    assert isinstance(catalog, CardCatalog)
+    card = repo._named_card('Cutter')
+    template = catalog.template(card.template_id)
+    assert template.name == 'Cutter'
+    assert template.cost == card.cost
+
+
+def test_card_round_trip(repo):
+    for card in repo.main_deck_cards():
+        copy = pickle.loads(pickle.dumps(card))
+        assert _summary(copy) == _summary(card)
+
+
+def test_card_payload_excludes_names(repo):
+    card = repo._named_card('Battle Station')
+    payload = pickle.dumps(card)
+    assert b'Battle Station' not in payload
+
+
+def test_playerdeck_round_trip(playerdeck):
+    playerdeck.discard(playerdeck._undrawn.pop())
+    copy = pickle.loads(pickle.dumps(playerdeck))
+    assert [c.uuid for c in copy._undrawn] == [c.uuid for c in playerdeck._undrawn]
+    assert [c.uuid for c in copy._discards] == [c.uuid for c in playerdeck._discards]
+    assert len(copy.draw(5)) == 5
+
+
+def test_maindeck_round_trip(maindeck):
+    copy = pickle.loads(pickle.dumps(maindeck))
+    assert [_summary(c) for c in copy._cards] == [_summary(c) for c in maindeck._cards]
+    assert copy.next_card().uuid == maindeck.next_card().uuid
+
+
+def test_traderow_round_trip(maindeck, repo):
+    traderow = TradeRow(maindeck, repo)
+    available = [c.uuid for c in traderow.available]
+    copy = pickle.loads(pickle.dumps(traderow))
+    assert [c.uuid for c in copy.available] == available
+    copy.acquire(available[-1])
+    assert copy.explorer.uuid not in available
+
+
+def test_traderow_shares_maindeck(maindeck, repo):
+    traderow = TradeRow(maindeck, repo)
+    deck_copy, row_copy = pickle.loads(pickle.dumps((maindeck, traderow)))
+    assert row_copy._maindeck is deck_copy
+
+
+def test_hand_round_trip(playerdeck):
+    hand = Hand(5, [], playerdeck)
+    copy = pickle.loads(pickle.dumps(hand))
+    assert [c.uuid for c in copy.cards] == [c.uuid for c in hand.cards]
+    assert len(copy._collect_effects()) == len(hand._collect_effects())
+    assert copy._playerdeck.cards_remaining == playerdeck.cards_remaining
+
+
+def test_catalog_with_compiled_effects_round_trip(repo):
+    catalog = CardCatalog.from_db()
+    template = catalog.named_template('Viper')
+    catalog.compiled_effects(template.id)
+    copy = pickle.loads(pickle.dumps(catalog))
+    assert copy.compiled_effects(template.id).source == catalog.compiled_effects(template.id).source
+
+
+def test_player_round_trip(repo):
+    player = Player('alice', repo)
+    copy = pickle.loads(pickle.dumps(player))
+    assert copy._cards is local_catalog()
+    assert [c.uuid for c in copy._deck._undrawn] == [c.uuid for c in player._deck._undrawn]
@@ -0,0 +1,32 @@
+from collections import Counter
+from pytest import mark
+from realms.catalog import local_catalog
+from realms.player import Player
+
+
+@mark.parametrize('source', ['repo', 'catalog'])
+def test_batched_starting_decks(repo, source):
+    cards = repo if source == 'repo' else local_catalog()
+    decks = cards.player_deck_cards(8)
+    assert len(decks) == 8
+    for deck in decks:
+        assert Counter(c.name for c in deck) == {'Scout': 8, 'Viper': 2}
+    uuids = [c.uuid for deck in decks for c in deck]
+    assert len(set(uuids)) == 80
+    effects = [id(e) for deck in decks for c in deck for e in c.effects_basic]
+    assert len(set(effects)) == 80
+    assert len(cards.player_deck_cards()) == 10
+
+
+def test_player_deals_its_own_deck(repo):
+    player = Player('alice', repo)
+    assert player._deck.cards_remaining == 10
+    assert player.health == 50 and player.alive
+
+
+def test_table_shares_the_source(repo):
+    catalog = local_catalog()
+    players = Player.table(['a', 'b', 'c'], catalog)
+    assert [p.name for p in players] == ['a', 'b', 'c']
+    assert all(p._cards is catalog for p in players)
+    assert len({c.uuid for p in players for c in p._deck._undrawn}) == 30
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from pytest import fixture
+from realms.catalog import local_catalog
+from realms.game import Game
+from realms.mcts import MCTSPolicy
+from realms.scheduler import GameScheduler, GameStatus, Priority
+from realms.turns import TurnPolicy
+
+
+class SlowPolicy(TurnPolicy):
+    def next_card(self, hand):
+        time.sleep(0.0005)
+        return hand[0]
+
+
+@fixture
+def catalog(repo):
+    return local_catalog()
+
+
+def test_games_run_to_completion(catalog):
+    scheduler = GameScheduler(slice=1.0)
+    entries = [scheduler.submit(Game(catalog)) for _ in range(5)]
+    while scheduler.run_slice():
+        pass
+    assert all(e.status == GameStatus.FINISHED for e in entries)
+    assert all(e.game.winner is not None for e in entries)
+    assert all(e.latency.count == e.game.turn for e in entries)
+    assert scheduler.pending == 0
+    assert len(scheduler.forget()) == 5 and not scheduler.games
+
+
+def test_live_games_go_first(catalog):
+    scheduler = GameScheduler(slice=1.0)
+    background = scheduler.submit(Game(catalog), max_turns=10)
+    live = scheduler.submit(Game(catalog), Priority.LIVE, max_turns=10)
+    scheduler._step(live)
+    scheduler.slice = 0.0
+    scheduler.run_slice()
+    assert live.latency.count == 2 and background.latency.count == 0
+    while scheduler.run_slice():
+        pass
+    assert live.status == background.status == GameStatus.OUT_OF_BUDGET
+    assert background.latency.count == 10
+
+
+def endless(game):
+    for p in game.players:
+        p.state.health = 10 ** 6
+    return game
+
+
+def test_fair_share_of_time(catalog):
+    scheduler = GameScheduler(slice=0.05)
+    slow = scheduler.submit(endless(Game(catalog, policies=[SlowPolicy(), SlowPolicy()])))
+    fast = scheduler.submit(endless(Game(catalog)))
+    scheduler.run_slice()
+    assert fast.latency.count > 2 * slow.latency.count > 0
+    assert abs(fast.used - slow.used) <= slow.latency.max
+
+
+def test_budgets_and_cancellation(catalog):
+    scheduler = GameScheduler(slice=1.0)
+    timed = scheduler.submit(Game(catalog, policies=[SlowPolicy(), SlowPolicy()]),
+                             max_seconds=0.01)
+    cancelled = scheduler.submit(Game(catalog))
+    scheduler.cancel(cancelled)
+    scheduler.run_slice()
+    assert timed.status == GameStatus.OUT_OF_BUDGET and timed.used >= 0.01
+    assert cancelled.status == GameStatus.CANCELLED and cancelled.latency.count == 0
+    assert scheduler.stats()[str(timed.id)]['status'] == 'out_of_budget'
+
+
+def test_run_on_event_loop(catalog):
+    async def main():
+        scheduler = GameScheduler()
+        runner = asyncio.ensure_future(scheduler.run())
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while not runner.done():
+                ticks += 1
+                await asyncio.sleep(0)
+
+        ticking = asyncio.ensure_future(ticker())
+        entries = [scheduler.submit(Game(catalog)) for _ in range(20)]
+        winners = await asyncio.gather(*(e.wait() for e in entries))
+        scheduler.stop()
+        await runner
+        await ticking
+        return winners, ticks
+
+    winners, ticks = asyncio.run(main())
+    assert all(w is not None for w in winners)
+    assert ticks > 1
+
+
+def test_blocking_policies_leave_the_loop_responsive(catalog):
+    async def main():
+        scheduler = GameScheduler()
+        runner = asyncio.ensure_future(scheduler.run())
+        thinking = scheduler.submit(Game(catalog, policies=[MCTSPolicy(seconds=0.2, seed=1),
+                                                            MCTSPolicy(seconds=0.2, seed=2)]),
+                                    max_turns=1)
+        await asyncio.sleep(0.05)
+        live = scheduler.submit(Game(catalog), Priority.LIVE, max_turns=10)
+        gaps = []
+        while not live.done:
+            before = time.perf_counter()
+            await asyncio.sleep(0)
+            gaps.append(time.perf_counter() - before)
+        assert not thinking.done
+        await thinking.wait()
+        scheduler.stop()
+        await runner
+        return live, thinking, max(gaps)
+
+    live, thinking, gap = asyncio.run(main())
+    assert thinking.blocking and not live.blocking
+    assert live.status == thinking.status == GameStatus.OUT_OF_BUDGET
+    assert thinking.latency.max >= 0.2
+    assert live.latency.count == 10
+    assert gap < 0.1
+
+
+def test_cancelled_games_stay_cancelled(catalog):
+    class Remote(TurnPolicy):
+        remote = True
+
+    scheduler = GameScheduler(slice=1.0)
+    entry = scheduler.submit(Game(catalog, policies=[TurnPolicy(), Remote()]))
+    scheduler.cancel(entry)
+    # A turn played on the executor is recorded after the game was cancelled
+    entry.game.step()
+    scheduler._finish(entry, 0.01)
+    assert entry.status == GameStatus.CANCELLED and entry.done
+    scheduler.resume(entry)
+    assert scheduler.run_slice() == 0
+    assert entry.status == GameStatus.CANCELLED and entry.game.turn == 1
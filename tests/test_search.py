@@ -0,0 +1,59 @@
+from pytest import raises
+from realms.cards import CardAction, CardFaction, CardTarget
+from realms.catalog import CardCatalog, local_catalog
+from realms.cardrepo import _read_cards_json
+from realms.search import SLOTS, CardIndex, card_index
+
+
+def scan(predicate):
+    return sorted(t.id for t in local_catalog().templates if predicate(t))
+
+
+def test_filters_match_a_scan(repo):
+    index = card_index()
+    assert index.faction(CardFaction.BLOB).ids() == scan(lambda t: t.faction == CardFaction.BLOB)
+    assert index.cost(min=2, max=4).ids() == scan(lambda t: 2 <= t.cost <= 4)
+    assert index.cost(max=-1).ids() == []
+    assert index.outposts().ids() == scan(lambda t: t.outpost)
+    assert (index.bases() | index.ships()).ids() == index.all().ids()
+    for slot, field in zip(SLOTS, ('effects_basic', 'effects_ally', 'effects_scrap')):
+        match = index.effect(CardAction.ATTACK, CardTarget.OPPONENT, slot=slot)
+        assert match.ids() == scan(lambda t: any(
+            e.action == CardAction.ATTACK and e.target == CardTarget.OPPONENT
+            for e in getattr(t, field)))
+
+
+def test_filters_compose(repo):
+    index = card_index()
+    cheap_blob_ships = index.faction(CardFaction.BLOB) & index.ships() & index.cost(max=4)
+    match = cheap_blob_ships & index.effect(CardAction.ATTACK, slot='ally')
+
+    def predicate(t):
+        if t.faction != CardFaction.BLOB or t.base or t.cost > 4:
+            return False
+        return any(e.action == CardAction.ATTACK for e in t.effects_ally)
+
+    expected = scan(predicate)
+    assert match.ids() == expected
+    assert len(match) == len(expected) > 0
+    assert all(i in match for i in expected)
+    assert (~match).ids() == scan(lambda t: t.id not in expected)
+
+
+def test_results_are_sorted(repo):
+    index = card_index()
+    costs = [t.cost for t in index.all().templates('cost')]
+    assert costs == sorted(costs)
+    names = index.bases().templates('name', reverse=True)
+    assert [t.name for t in names] == sorted((t.name for t in names), reverse=True)
+    with raises(KeyError):
+        index.all().templates('colour')
+    with raises(ValueError):
+        index.effect(slot='hand')
+
+
+def test_index_is_built_once_per_catalog(repo):
+    assert card_index() is card_index(local_catalog())
+    other = CardCatalog.from_json(_read_cards_json())
+    assert card_index(other) is not card_index()
+    assert isinstance(card_index(other), CardIndex)
@@ -0,0 +1,207 @@
+import asyncio
+import json
+from pytest import fixture
+from realms.catalog import local_catalog
+from realms.server import Fragment, GameServer, GameService, LatencyStats, encode_response
+
+
+@fixture
+def service(repo):
+    return GameService(local_catalog())
+
+
+@fixture
+def game(service):
+    return service.handle({'op': 'new_game', 'players': 2})['game']
+
+
+def test_new_game(service, game):
+    state = service.handle({'op': 'state', 'game': game})
+    assert state['ok']
+    assert [p['undrawn'] for p in state['players']] == [10, 10]
+
+
+def test_draw_and_end_turn(service, game):
+    response = service.handle({'id': 7, 'op': 'draw', 'game': game, 'player': 0})
+    assert response['id'] == 7
+    assert len(response['cards']) == 5
+    service.handle({'op': 'end_turn', 'game': game, 'player': 0})
+    state = service.handle({'op': 'state', 'game': game})
+    assert state['players'][0] == {'undrawn': 5, 'discards': 5, 'hand': 0}
+
+
+def test_discard_unknown_card(service, game):
+    response = service.handle({'op': 'discard', 'game': game, 'player': 0, 'uuid': 'x'})
+    assert response == {'ok': False, 'error': 'UUIDNotFoundError'}
+
+
+def test_acquire_from_trade_row(service, game):
+    row = service.handle({'op': 'trade_row', 'game': game})['cards']
+    assert len(row) == 6
+    response = service.handle({'op': 'acquire', 'game': game, 'player': 0,
+                               'uuid': row[0]['uuid']})
+    assert response['card']['uuid'] == row[0]['uuid']
+    state = service.handle({'op': 'state', 'game': game})
+    assert state['players'][0]['discards'] == 1
+
+
+def test_players_take_turns(service, game):
+    response = service.handle({'op': 'draw', 'game': game, 'player': 1})
+    assert response['error'] == 'NotYourTurn: It is the turn of p0, not p1'
+    service.handle({'op': 'draw', 'game': game, 'player': 0})
+    service.handle({'op': 'end_turn', 'game': game, 'player': 0})
+    state = service.handle({'op': 'state', 'game': game})
+    assert (state['turn'], state['current'], state['winner']) == (1, 1, None)
+    assert service.handle({'op': 'draw', 'game': game, 'player': 1})['ok']
+
+
+def test_end_turn_eliminates_players(service, game):
+    service.games[game].game.players[1].state.health = 1
+    service.handle({'op': 'draw', 'game': game, 'player': 0, 'num': 10})
+    service.handle({'op': 'end_turn', 'game': game, 'player': 0})
+    state = service.handle({'op': 'state', 'game': game})
+    assert (state['current'], state['winner']) == (None, 0)
+    response = service.handle({'op': 'draw', 'game': game, 'player': 0})
+    assert response['error'].startswith('GameOver')
+
+
+def test_bots_play_after_clients(service):
+    game = service.handle({'op': 'new_game', 'players': 3, 'bots': 2})['game']
+    service.handle({'op': 'draw', 'game': game, 'player': 0})
+    service.handle({'op': 'end_turn', 'game': game, 'player': 0})
+    state = service.handle({'op': 'state', 'game': game})
+    assert (state['turn'], state['current']) == (3, 0)
+    assert state['players'][1]['undrawn'] == 5
+    assert not service.handle({'op': 'new_game', 'players': 2, 'bots': 2})['ok']
+
+
+def test_scheduled_bots(repo):
+    from realms.scheduler import GameScheduler, GameStatus, Priority
+
+    async def run():
+        scheduler = GameScheduler()
+        service = GameService(local_catalog(), scheduler=scheduler)
+        runner = asyncio.ensure_future(scheduler.run())
+        game = service.handle({'op': 'new_game', 'players': 3, 'bots': 2})['game']
+        watcher = service.watch(game)
+        await watcher.get()
+        entry = service.games[game].scheduled
+        assert entry.priority == Priority.LIVE
+        service.handle({'op': 'draw', 'game': game, 'player': 0})
+        service.handle({'op': 'end_turn', 'game': game, 'player': 0})
+        for _ in range(3):
+            await asyncio.wait_for(watcher.get(), 1)
+        state = service.handle({'op': 'state', 'game': game})
+        assert (state['turn'], state['current']) == (3, 0)
+        assert entry.status == GameStatus.WAITING and entry.latency.count == 2
+        service.handle({'op': 'close_game', 'game': game})
+        assert entry.status == GameStatus.CANCELLED
+        scheduler.stop()
+        await runner
+
+    asyncio.run(run())
+
+
+def test_games_share_catalog(service):
+    ids = [service.handle({'op': 'new_game'})['game'] for _ in range(3)]
+    assert len(set(ids)) == 3
+    assert all(g.traderow._repo is service.catalog for g in service.games.values())
+
+
+def test_bad_requests(service):
+    assert not service.handle({'op': 'nope'})['ok']
+    for op in (['x'], {'op': 1}, None, 3):
+        assert service.handle({'id': 2, 'op': op}) == {'ok': False, 'id': 2,
+                                                       'error': f"Unknown op {op!r}"}
+    assert 'None' not in service.latency
+    assert not service.handle({'op': 'state', 'game': 'missing'})['ok']
+    assert not service.handle({'op': 'new_game', 'players': 20})['ok']
+
+
+def test_invalid_players(service, game):
+    for player in (-1, 2, '0x', None, [0]):
+        for op in ('draw', 'discard', 'end_turn', 'acquire', 'scrap'):
+            response = service.handle({'op': op, 'game': game, 'player': player, 'uuid': 'x'})
+            assert not response['ok'] and response['error'].startswith('ValueError')
+    response = service.handle({'op': 'draw', 'game': game})
+    assert response['error'] == "ValueError: Invalid player None"
+    state = service.handle({'op': 'state', 'game': game})
+    assert [p['undrawn'] for p in state['players']] == [10, 10]
+
+
+def test_latency_stats(service, game):
+    service.handle({'op': 'state', 'game': game})
+    stats = service.handle({'op': 'stats'})
+    assert stats['games'] == 1
+    assert stats['latency']['state']['count'] == 1
+    assert stats['latency']['new_game']['p99_us'] > 0
+
+
+def test_latency_percentiles():
+    stats = LatencyStats()
+    for us in range(1, 101):
+        stats.record(us / 1e6)
+    assert stats.percentile(50) <= stats.percentile(99) <= stats.max
+    assert stats.as_dict()['count'] == 100
+
+
+def test_server_round_trip(repo):
+    async def session():
+        server = GameServer(GameService(local_catalog()))
+        await server.start(port=0)
+        reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+        requests = [{'id': 1, 'op': 'new_game'},
+                    {'id': 3, 'op': ['x']},
+                    {'id': 2, 'op': 'draw', 'game': '1', 'player': 0}]
+        responses = []
+        for request in requests:
+            writer.write(json.dumps(request).encode() + b'\n')
+            await writer.drain()
+            responses.append(json.loads(await reader.readline()))
+        writer.write(b'not json\n')
+        await writer.drain()
+        responses.append(json.loads(await reader.readline()))
+        writer.close()
+        await server.close()
+        return responses
+
+    new_game, bad_op, draw, malformed = asyncio.run(session())
+    assert new_game == {'id': 1, 'ok': True, 'game': '1'}
+    assert bad_op == {'id': 3, 'ok': False, 'error': "Unknown op ['x']"}
+    assert len(draw['cards']) == 5
+    assert not malformed['ok']
+
+
+def test_card_json_matches_card(repo):
+    catalog = local_catalog()
+    card = catalog.named_template('Blob Wheel')
+    card = catalog.new_card(card.id)
+    payload = json.loads(catalog.card_json(card))
+    assert payload['uuid'] == card.uuid
+    assert payload['template'] == card.template_id
+    assert payload['faction'] == card.faction.value
+    assert payload['defense'] == card.defense
+    effects = sorted((e.target.name, e.action.name, e.value) for e in card.effects_basic)
+    assert sorted(tuple(e) for e in payload['effects']['basic']) == effects
+    cards = catalog.main_deck_cards()[:3]
+    assert json.loads(catalog.cards_json(cards)) == [json.loads(catalog.card_json(c))
+                                                     for c in cards]
+    assert json.loads(catalog.cards_json([])) == []
+
+
+def test_trade_row_encoded_once(service, game):
+    session = service.games[game]
+    first = session.row_json()
+    assert session.row_json() is first
+    row = service.handle({'op': 'trade_row', 'game': game})['cards']
+    assert not service.handle({'op': 'scrap', 'game': game, 'uuid': row[0]['uuid']})['ok']
+    assert not service.handle({'op': 'scrap', 'game': game, 'player': 1,
+                               'uuid': row[0]['uuid']})['ok']
+    assert session.row_json() is first
+    service.handle({'op': 'scrap', 'game': game, 'player': 0, 'uuid': row[0]['uuid']})
+    assert session.row_json() is not first
+
+
+def test_encode_response_splices_fragments():
+    encoded = encode_response({'cards': Fragment('[{"a":1}]'), 'ok': True})
+    assert json.loads(encoded) == {'cards': [{'a': 1}], 'ok': True}
@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from pytest import fixture, raises
+from realms.cardrepo import CardRepo, db
+from realms.catalog import local_catalog
+from realms.exceptions import CatalogFormatError
+from realms.sharedcatalog import CatalogArrays, SharedCatalog, attach_catalog
+
+
+@fixture
+def catalog(repo):
+    return local_catalog()
+
+
+def _main_deck_size(_):
+    from realms.catalog import local_catalog
+    return len(local_catalog().main_deck_cards())
+
+
+def _child_connection_state(_):
+    size = len(CardRepo().main_deck_cards())
+    return db.provider.pool.pid == os.getpid(), size
+
+
+def test_arrays_round_trip(catalog):
+    arrays = CatalogArrays(CatalogArrays.encode(catalog))
+    assert arrays.size == len(catalog)
+    assert arrays.catalog().templates == catalog.templates
+
+
+def test_arrays_columns(catalog):
+    arrays = CatalogArrays(CatalogArrays.encode(catalog))
+    cutter = catalog.named_template('Cutter')
+    row = arrays.row(cutter.id)
+    assert arrays.cost[row] == cutter.cost
+    start, end = arrays.slot_offsets[3 * row], arrays.slot_offsets[3 * row + 1]
+    assert end - start == len(cutter.effects_basic)
+
+
+def test_arrays_reject_bad_buffer():
+    with raises(CatalogFormatError):
+        CatalogArrays(bytes(64))
+
+
+def test_lazy_catalog_decodes_on_demand(catalog):
+    lazy = CatalogArrays(CatalogArrays.encode(catalog)).lazy_catalog()
+    assert lazy.named_template('Scout') == catalog.named_template('Scout')
+    assert len(lazy._templates._decoded) == 1
+    assert len(lazy) == len(catalog) and catalog.templates[0].id in lazy
+    cards = catalog.main_deck_cards()[:5]
+    assert lazy.cards_json(cards) == catalog.cards_json(cards)
+    assert pickle.loads(pickle.dumps(lazy)) is lazy
+
+
+def test_attach_shared_catalog(catalog):
+    with SharedCatalog(catalog) as shared:
+        attached = attach_catalog(shared.name)
+        try:
+            assert attached.templates == catalog.templates
+            assert attached.arrays is not None
+            assert attached.encoded() == CatalogArrays.encode(catalog)
+        finally:
+            from realms.catalog import install_catalog
+            install_catalog(catalog)
+
+
+def test_workers_attach_shared_catalog(catalog):
+    expected = len(catalog.main_deck_cards())
+    context = multiprocessing.get_context('spawn')
+    with SharedCatalog(catalog) as shared:
+        with ProcessPoolExecutor(2, mp_context=context, initializer=attach_catalog,
+                                 initargs=(shared.name,)) as pool:
+            assert list(pool.map(_main_deck_size, range(4))) == [expected] * 4
+
+
+def test_fork_drops_inherited_connection(repo):
+    expected = len(repo.main_deck_cards())  # opens a connection in the parent
+    assert db.provider.pool.pid == os.getpid()
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(1, mp_context=context) as pool:
+        fresh, size = pool.submit(_child_connection_state, None).result()
+    assert fresh
+    assert size == expected
@@ -0,0 +1,65 @@
+import random
+from pytest import approx, fixture, raises
+from realms.catalog import local_catalog
+from realms.exceptions import CatalogFormatError
+from realms.sweep import Sweep, VariantStatus, simulate, variant_catalog, variants, wilson
+from realms.turns import TurnPolicy
+
+
+@fixture
+def cards(repo):
+    from realms.cardrepo import _read_cards_json
+    return _read_cards_json()
+
+
+def test_wilson_interval():
+    assert wilson(0, 0) == (0.0, 1.0)
+    low, high = wilson(50, 100)
+    assert low == approx(0.4038, abs=1e-4) and high == approx(0.5962, abs=1e-4)
+    low, high = wilson(10, 10)
+    assert high == 1.0 and low == approx(0.7225, abs=1e-4)
+
+
+def test_grid_variants(cards):
+    grid = {'Trade Pod': {'cost': [2, 3]}, 'Blob Fighter': {'effects.0.value': [1, 2, 3]}}
+    points = variants(grid, cards)
+    assert len(points) == 6
+    assert points[0].overrides == (('Trade Pod', 'cost', 2), ('Blob Fighter', 'effects.0.value', 1))
+    with raises(CatalogFormatError):
+        variants({'Trade Pods': {'cost': [1]}}, cards)
+    with raises(CatalogFormatError):
+        variants({'Trade Pod': {'effects.7.value': [1]}}, cards)
+
+
+def test_variant_catalog_leaves_the_definitions_alone(cards):
+    catalog = variant_catalog(cards, [('Trade Pod', 'cost', 9)])
+    assert catalog.named_template('Trade Pod').cost == 9
+    assert next(c for c in cards if c['name'] == 'Trade Pod')['cost'] != 9
+
+
+def test_simulate_is_seeded_and_restores_the_process(cards):
+    catalog = variant_catalog(cards, [])
+    before, state = local_catalog(), random.getstate()
+    policies = (TurnPolicy, TurnPolicy)
+    first = simulate(catalog, 4, policies, seed=7)
+    assert local_catalog() is before and random.getstate() == state
+    assert first[:4] == simulate(catalog, 4, policies, seed=7)[:4]
+    assert first.games == 4 and first.wins + first.draws <= 4
+
+
+def test_sweep_stops_decided_variants_early(cards):
+    grid = {'Blob Fighter': {'effects.0.value': [0, 3]}}
+    sweep = Sweep(grid, batch=10, min_games=20, max_games=60, reference=0.9, cards=cards)
+    updates = list(sweep.run(workers=0))
+    final = {r.variant.index: r for r in updates if r.status != VariantStatus.RUNNING}
+    assert set(final) == {0, 1}
+    assert all(r.status == VariantStatus.DECIDED and r.games < 60 for r in final.values())
+    assert len(updates) == sum(r.games for r in final.values()) // 10
+
+
+def test_sweep_over_workers_matches_in_process(cards):
+    grid = {'Trade Pod': {'cost': [1, 8]}}
+    runs = [{r.variant.index: (r.games, r.wins) for r in Sweep(grid, batch=5, max_games=10,
+                                                               cards=cards).run(workers=w)}
+            for w in (0, 2)]
+    assert runs[0] == runs[1]
@@ -0,0 +1,85 @@
+import json
+from pytest import fixture
+from realms.decks import MainDeck, PlayerDeck, TradeRow, Hand
+from realms.sync import ViewMirror, ViewSync, diff, observe
+
+
+@fixture
+def table(repo):
+    maindeck = MainDeck(repo)
+    traderow = TradeRow(maindeck, repo)
+    playerdeck = PlayerDeck(repo.player_deck_cards())
+    return maindeck, traderow, playerdeck
+
+
+def _view(table, hand):
+    maindeck, traderow, playerdeck = table
+    return observe(traderow, hand, playerdeck, maindeck)
+
+
+def test_observe(table):
+    hand = Hand(5, [], table[2])
+    view = _view(table, hand)
+    assert len(view.row) == 6
+    assert len(view.hand) == 5
+    assert view.piles == {'undrawn': 5, 'discards': 0, 'main': len(table[0]._cards)}
+    assert sum(view.totals.values()) == 5
+
+
+def test_diff_of_identical_views_is_empty(table):
+    hand = Hand(5, [], table[2])
+    assert diff(_view(table, hand), _view(table, hand)) == {}
+
+
+def test_diff_trade_row_slot(table):
+    maindeck, traderow, playerdeck = table
+    hand = Hand(0, [], playerdeck)
+    before = _view(table, hand)
+    traderow.acquire(traderow.cards[2].uuid)
+    delta = diff(before, _view(table, hand))
+    assert set(delta) == {'r', 'p'}
+    assert delta['p'] == {'main': len(maindeck._cards)}
+
+
+def test_mirror_follows_updates(table):
+    maindeck, traderow, playerdeck = table
+    sync, mirror = ViewSync(), ViewMirror()
+    hand = Hand(5, [], playerdeck)
+    assert mirror.apply(sync.update(_view(table, hand)))
+    for turn in range(6):
+        for card in hand.cards:
+            playerdeck.discard(card)
+        hand.cards = []
+        frame = sync.update(_view(table, hand))
+        assert mirror.apply(frame)
+        bought = traderow.acquire(traderow.available[turn % 6].uuid)
+        playerdeck.discard(bought)
+        hand = Hand(5, [], playerdeck)
+        frame = sync.update(_view(table, hand))
+        assert json.loads(frame)['b'] == sync.seq - 1
+        assert mirror.apply(frame)
+        assert mirror.view() == _view(table, hand)
+        assert len(frame) < len(sync.full_frame())
+
+
+def test_unchanged_view_produces_no_frame(table):
+    sync = ViewSync()
+    hand = Hand(5, [], table[2])
+    sync.update(_view(table, hand))
+    assert sync.update(_view(table, hand)) is None
+    assert sync.frame_for(sync.seq) is None
+
+
+def test_resync_after_missed_frame(table):
+    maindeck, traderow, playerdeck = table
+    sync, mirror = ViewSync(), ViewMirror()
+    hand = Hand(5, [], playerdeck)
+    mirror.apply(sync.update(_view(table, hand)))
+    traderow.scrap(traderow.cards[0].uuid)
+    sync.update(_view(table, hand))  # lost in transit
+    traderow.scrap(traderow.cards[0].uuid)
+    assert not mirror.apply(sync.update(_view(table, hand)))
+    frame = sync.frame_for(mirror.seq)
+    assert json.loads(frame)['f'] == 1
+    assert mirror.apply(frame)
+    assert mirror.view() == _view(table, hand)
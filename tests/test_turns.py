@@ -0,0 +1,110 @@
+from pytest import fixture
+from realms.cards import CardAction, CardTarget
+from realms.catalog import CardCatalog, install_catalog, local_catalog
+from realms.decks import EffectRecord, MainDeck, TradeRow
+from realms.player import Player
+from realms.turns import EffectQueue, Turn, TurnPolicy, price
+
+
+@fixture
+def players(repo):
+    return tuple(Player.table(['alice', 'bob'], repo))
+
+
+@fixture
+def traderow(repo):
+    return TradeRow(MainDeck(repo), repo)
+
+
+def record(target, action, uuid):
+    return EffectRecord(target=target, action=action, value=1, uuid=uuid, provider='p')
+
+
+def test_queue_orders_by_priority_then_arrival():
+    queue = EffectQueue()
+    queue.push(record(CardTarget.OPPONENT, CardAction.DISCARD, 'a'))
+    queue.push(record(CardTarget.OWNER, CardAction.DRAW, 'b'))
+    queue.push(record(CardTarget.OWNER, CardAction.SCRAP, 'c'))
+    queue.push(record(CardTarget.OWNER, CardAction.DRAW, 'd'))
+    assert [queue.pop().uuid for _ in range(len(queue))] == ['b', 'd', 'c', 'a']
+
+
+def test_starting_hand_turn(players):
+    alice, bob = players
+    report = alice.take_turn(bob)
+    assert report.played == 5
+    assert bob.health == 50 - report.damage
+    assert report.damage == sum(c.name == 'Viper' for c in alice._deck._discards)
+    assert len(alice._deck._discards) == 5
+
+
+def test_trade_is_spent_on_the_trade_row(players, traderow):
+    alice, bob = players
+    report = alice.take_turn(bob, traderow)
+    money = sum(c.name == 'Scout' for c in alice._deck._discards if c not in report.acquired)
+    assert sum(price(c) for c in report.acquired) <= money
+    assert all(c in alice._deck._discards for c in report.acquired)
+
+
+def test_failed_buys_cost_nothing(players, traderow):
+    alice, bob = players
+    turn = Turn(alice, bob, traderow)
+    turn.money = 10
+    card = traderow.cards[0]
+    assert turn.buy_card(card)
+    assert turn.money == 10 - price(card) and turn.acquired == [card]
+    assert not turn.buy_card(card)
+    assert turn.money == 10 - price(card) and turn.acquired == [card]
+
+
+def test_drawn_cards_are_played_and_allies_reevaluated(players):
+    alice, bob = players
+    original = local_catalog()
+    extra = CardCatalog.from_json([
+        {"name": "Drawer", "faction": "Blob", "simplified": "false", "base": "false",
+         "outpost": "false", "defense": 0, "cost": 3, "count": 1,
+         "effects": [{"target": "owner", "action": "draw", "value": 1, "condition": {}}],
+         "ally": [{"target": "opponent", "action": "attack", "value": 5, "condition": {}}],
+         "scrap": []},
+        {"name": "Partner", "faction": "Blob", "simplified": "false", "base": "false",
+         "outpost": "false", "defense": 0, "cost": 1, "count": 1,
+         "effects": [], "ally": [], "scrap": []},
+    ])
+    first = max(t.id for t in original.templates) + 1
+    catalog = CardCatalog(original.templates + [t._replace(id=first + i)
+                                                for i, t in enumerate(extra.templates)])
+    install_catalog(catalog)
+    try:
+        scouts = [catalog.new_scout() for _ in range(4)]
+        alice._deck._undrawn = [catalog.new_card(first + 1), catalog.new_card(first)] + scouts
+        report = alice.take_turn(bob)
+    finally:
+        install_catalog(original)
+    assert report.played == 6
+    assert report.damage == 5
+
+
+def test_outposts_are_attacked_first(players, repo):
+    alice, bob = players
+    catalog = local_catalog()
+    outpost = next(t for t in catalog.templates if t.outpost)
+    bob._bases = [catalog.new_card(outpost.id)]
+    alice.state.opponent_attack = 0
+
+    class Aggressive(TurnPolicy):
+        def attack(self, bases, damage):
+            return None
+
+    alice.policy = Aggressive()
+    alice._deck._undrawn = [catalog.new_viper() for _ in range(5)]
+    report = alice.take_turn(bob)
+    assert report.damage == 0 and bob.health == 50
+    assert bob._bases
+
+
+def test_forced_discards_apply_next_turn(players):
+    alice, bob = players
+    bob.state.discards_due = 1
+    report = bob.take_turn(alice)
+    assert report.played == 4
+    assert bob.state.discards_due == 0
@@ -0,0 +1,99 @@
+from pytest import fixture
+from realms.catalog import local_catalog
+from realms.events import EventLog
+from realms.game import Game
+from realms.mcts import MCTSPolicy
+from realms.zobrist import Replacement, TranspositionTable, ZobristKeys
+
+
+@fixture
+def catalog(repo):
+    return local_catalog()
+
+
+def test_incremental_hash_matches_a_full_rehash(catalog):
+    game = Game(catalog, ['a', 'b', 'c'], zobrist=ZobristKeys())
+    assert game.zobrist.value == game.zobrist.full() != 0
+    for _ in range(40):
+        if game.over:
+            break
+        game.step()
+        assert game.zobrist.value == game.zobrist.full()
+
+
+def test_hash_passes_events_on_to_the_log(catalog):
+    log = EventLog()
+    game = Game(catalog, log=log, zobrist=ZobristKeys())
+    game.run(max_turns=4)
+    assert log.seq > 0
+    assert game.zobrist.value == game.zobrist.full()
+
+
+def test_order_within_a_pile_is_not_hashed(catalog):
+    game = Game(catalog, zobrist=ZobristKeys())
+    before = game.zobrist.full()
+    game.maindeck._cards.reverse()
+    game.players[0]._deck._undrawn.reverse()
+    assert game.zobrist.full() == before
+
+
+def test_keys_depend_on_the_seed():
+    pile = ('main', 'cards', 3)
+    assert ZobristKeys(1).card(pile, 0) == ZobristKeys(1).card(pile, 0)
+    assert ZobristKeys(1).card(pile, 0) != ZobristKeys(2).card(pile, 0)
+    assert ZobristKeys().card(pile, 0) != ZobristKeys().card(pile, 1)
+
+
+def test_always_replaces():
+    table = TranspositionTable(size=4, replacement=Replacement.ALWAYS)
+    assert table.put(1, 'a', depth=10)
+    assert table.put(5, 'b', depth=0)
+    assert table.get(1) is None and table.get(5) == 'b'
+    assert (table.hits, table.misses, table.replaced) == (1, 1, 1)
+
+
+def test_depth_keeps_deeper_entries_of_the_current_generation():
+    table = TranspositionTable(size=4, replacement=Replacement.DEPTH)
+    table.put(1, 'a', depth=10)
+    assert not table.put(5, 'b', depth=3)
+    assert table.get(1) == 'a'
+    assert table.put(1, 'c', depth=1)
+    table.put(1, 'a', depth=10)
+    table.new_generation()
+    assert table.put(5, 'b', depth=3)
+    assert table.get(5) == 'b' and table.get(1) is None
+
+
+def test_two_tier_keeps_both_entries():
+    table = TranspositionTable(size=4, replacement=Replacement.TWO_TIER)
+    table.put(1, 'a', depth=10)
+    table.put(5, 'b', depth=3)
+    table.put(9, 'c', depth=2)
+    assert table.get(1) == 'a' and table.get(9) == 'c' and table.get(5) is None
+    assert len(table) == 2
+    table.clear()
+    assert len(table) == 0
+
+
+class Twice(MCTSPolicy):
+    """Searches every buy decision twice"""
+    def buy(self, cards, money):
+        super().buy(cards, money)
+        return super().buy(cards, money)
+
+
+def test_search_reuses_the_table(catalog):
+    table = TranspositionTable()
+    policy = Twice(rollouts=8, horizon=2, seed=1, table=table)
+    game = Game(catalog, policies=[policy, None], zobrist=ZobristKeys())
+    game.run(max_turns=6)
+    assert table.stores > 0 and table.hits > 0
+    assert policy.stats.reused > 0
+    assert policy.stats.rollouts <= 8 * (policy.stats.decisions - policy.stats.reused)
+
+
+def test_search_without_hashing_ignores_the_table(catalog):
+    table = TranspositionTable()
+    policy = MCTSPolicy(rollouts=8, horizon=2, seed=1, table=table)
+    Game(catalog, policies=[policy, None]).run(max_turns=4)
+    assert table.hits + table.misses == 0